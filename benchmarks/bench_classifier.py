@@ -0,0 +1,113 @@
+"""
+Benchmark: device_classifier gegen die bisherige Schleifen-Klassifizierung.
+
+Erzeugt synthetische Einträge der Device Registry (Domain, Hersteller,
+Modell) mit realistischer Wiederholung – viele Geräte teilen sich Hersteller
+und Modell – und misst beide Varianten. Der kompilierte Klassifizierer wird
+einmal mit leerem Cache (jede Kombination neu) und einmal mit warmem Cache
+gemessen.
+
+Aufruf (aus dem Repository-Wurzelverzeichnis):
+    python3 benchmarks/bench_classifier.py [--entries 50000] [--models 2000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from device_classifier import DeviceClassifier  # noqa: E402
+
+DOMAINS = ['light', 'switch', 'sensor', 'binary_sensor', 'climate', 'media_player',
+           'update', 'button', 'select', 'number', '', '', '', '']
+MANUFACTURERS = ['Philips', 'IKEA of Sweden', 'Shelly', 'Aqara', 'Xiaomi', 'Tuya', 'AVM',
+                 'Sonos', 'Eve Systems', 'Bosch', 'Homematic', 'Signify Netherlands B.V.',
+                 'Espressif', 'Reolink', 'Tado', 'Unbekannt']
+MODEL_WORDS = ['Hue', 'White', 'Ambiance', 'Bulb', 'E27', 'Plug', 'Smart', 'Motion', 'Door',
+               'Window', 'Thermostat', 'Radiator', 'Cam', 'Pro', 'Mini', 'Gen3', 'Controller',
+               'Bridge', 'Remote', 'Strip', 'LED', 'Hub', 'Repeater', 'Mesh', 'Sensor', 'Fenster',
+               'Tür', 'Heizkörper', 'Steckdose', 'Rollo', 'Speaker', 'Play:1', 'FRITZ!DECT', '200']
+
+
+def legacy_device_type(domain, manufacturer, model):
+    """Bisherige Implementierung aus HomeAssistantAPI._device_type."""
+    domain_map = {
+        'light':               'Beleuchtung',
+        'switch':              'Schalter',
+        'climate':             'Klima / Heizung',
+        'media_player':        'Medienplayer',
+        'camera':              'Kamera',
+        'vacuum':              'Staubsauger',
+        'cover':               'Rollladen / Jalousie',
+        'fan':                 'Lüfter',
+        'lock':                'Schloss',
+        'sensor':              'Sensor',
+        'binary_sensor':       'Sensor',
+        'alarm_control_panel': 'Alarm',
+    }
+    if domain in domain_map:
+        return domain_map[domain]
+
+    combined = (manufacturer + ' ' + model).lower()
+    if any(k in combined for k in ['bulb', 'light', 'lamp', 'led', 'leuchte']):
+        return 'Beleuchtung'
+    if any(k in combined for k in ['plug', 'socket', 'steckdose', 'switch']):
+        return 'Schalter'
+    if any(k in combined for k in ['thermostat', 'heater', 'heizung', 'climate']):
+        return 'Klima / Heizung'
+    if any(k in combined for k in ['camera', 'cam', 'kamera']):
+        return 'Kamera'
+    if any(k in combined for k in ['sensor', 'motion', 'door', 'window', 'tür', 'fenster']):
+        return 'Sensor'
+    return 'Sonstiges'
+
+
+def make_entries(count, models, seed):
+    rnd = random.Random(seed)
+    catalog = [(rnd.choice(MANUFACTURERS), ' '.join(rnd.sample(MODEL_WORDS, rnd.randint(1, 4))))
+               for _ in range(models)]
+    return [(rnd.choice(DOMAINS),) + rnd.choice(catalog) for _ in range(count)]
+
+
+def _time(func, entries):
+    start = time.perf_counter()
+    result = [func(*e) for e in entries]
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--entries', type=int, default=50000)
+    parser.add_argument('--models', type=int, default=2000,
+                        help='Anzahl verschiedener Hersteller/Modell-Kombinationen')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    entries = make_entries(args.entries, args.models, args.seed)
+
+    legacy, legacy_t = _time(legacy_device_type, entries)
+
+    uncached = DeviceClassifier()
+    uncached._keywords = uncached._match_keywords
+    compiled, compiled_t = _time(uncached.classify, entries)
+
+    cached = DeviceClassifier()
+    _, cold_t = _time(cached.classify, entries)
+    _, warm_t = _time(cached.classify, entries)
+
+    mismatches = sum(1 for a, b in zip(legacy, compiled) if a != b)
+    print("{} Einträge, {} Modelle, Abweichungen: {}".format(len(entries), args.models, mismatches))
+    print("{:<34} {:>10} {:>10}".format('Variante', 'ms', 'Faktor'))
+    for name, elapsed in (('bisher (Schleifen)', legacy_t),
+                          ('kompiliert, ohne Cache', compiled_t),
+                          ('kompiliert, Cache kalt', cold_t),
+                          ('kompiliert, Cache warm', warm_t)):
+        print("{:<34} {:>10.1f} {:>9.1f}x".format(name, elapsed * 1000, legacy_t / elapsed))
+    print("Cache: {}".format(cached.cache_info()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+"""
+Benchmark: Link-Auswertung der Suchseiten mit html_links gegen BeautifulSoup.
+
+Vergleicht die bisherige Auswertung (BeautifulSoup-Baum, mehrere
+find_all-Durchläufe mit re.match/re.search je Link) mit den Parse-Funktionen
+aus manual_downloader (ein Durchlauf über html_links.iter_links) – CPU-Zeit
+und Spitzenspeicher (tracemalloc) je Seite. Die Ergebnisse beider Varianten
+werden verglichen.
+
+Zusätzlich wird iter_links() für eine Reihe von Randfällen (doppelte
+Attribute, <a/href>, <a href> ohne Wert, Kommentare, script-Blöcke ...) mit
+den Links verglichen, die BeautifulSoup liefert.
+
+Ohne --fixtures werden synthetische Seiten im Aufbau von manualslib.com
+(Suche, Manual-Seite) und DuckDuckGo Lite erzeugt. Mit --fixtures werden
+gespeicherte Seiten verwendet: *search*.html, *manual*.html und *ddg*.html.
+
+Aufruf (aus dem Repository-Wurzelverzeichnis; benötigt beautifulsoup4):
+    python3 benchmarks/bench_html_extract.py [--repeat 50] [--fixtures DIR]
+"""
+
+import argparse
+import glob
+import os
+import random
+import re
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bs4 import BeautifulSoup  # noqa: E402
+
+import manual_downloader as md  # noqa: E402
+from html_links import iter_links  # noqa: E402
+
+MANUALSLIB = md.MANUALSLIB
+
+
+# -----------------------------------------------------------------------
+# Bisherige Auswertung (BeautifulSoup)
+# -----------------------------------------------------------------------
+
+def legacy_search(text):
+    soup = BeautifulSoup(text, 'html.parser')
+    for a in soup.find_all('a', href=True):
+        if re.match(r'^/manual-\d+/', a['href']):
+            return a['href']
+    return None
+
+
+def legacy_manual_page(text):
+    soup = BeautifulSoup(text, 'html.parser')
+    for iframe in soup.find_all('iframe', src=True):
+        if 'manualslib' in iframe['src']:
+            return iframe['src']
+    for a in soup.find_all('a', href=True):
+        href = a['href']
+        if re.search(r'\.pdf(\?|$)', href, re.I):
+            return href if href.startswith('http') else MANUALSLIB + href
+    return None
+
+
+def legacy_ddg(text):
+    soup = BeautifulSoup(text, 'html.parser')
+    for a in soup.find_all('a', href=True):
+        href = a['href']
+        if re.search(r'\.pdf(\?|$)', href, re.I) and href.startswith('http'):
+            return href, None
+    for a in soup.find_all('a', href=True):
+        if 'manualslib.com/manual-' in a['href']:
+            return None, a['href']
+    return None, None
+
+
+def legacy_links(text):
+    soup = BeautifulSoup(text, 'html.parser')
+    links = []
+    for tag in soup.find_all(['a', 'iframe']):
+        attr = 'href' if tag.name == 'a' else 'src'
+        if tag.has_attr(attr):
+            links.append((tag.name, tag[attr]))
+    return links
+
+
+# Randfälle, in denen sich eine einfache Attribut-Suche von html.parser unterscheiden kann
+EDGE_CASES = [
+    '<a href="x" href="y">',
+    '<a href="1" HREF="2">',
+    '<iframe src="s" src="t"></iframe>',
+    '<a/href="x">',
+    '<a //href="p">',
+    '<a href>',
+    '<a href/>',
+    '<a href=>',
+    '<a href = "x" >',
+    '<a href==x>',
+    '<A HREF=\'x\'>',
+    '<a\nhref\n=\n"x">',
+    '<a title="href=z" href="y">',
+    '<a title=it\'s href="q">',
+    '<a href="x"/>',
+    '<a href=x/>',
+    '<a href="a>b">',
+    '<abbr href="n"><a href="a&amp;b">',
+    '<a data-x=1 href=/manual-1/a.html?x=1>',
+    '<!-- <a href="c"> --><a href="d">',
+    '<script><a href="s"></script><a href="e">',
+    '<a href="x" <b>',
+]
+
+
+def check_edge_cases():
+    """Gibt die Randfälle zurück, in denen iter_links() von BeautifulSoup abweicht."""
+    return [(case, legacy_links(case), list(iter_links(case)))
+            for case in EDGE_CASES if legacy_links(case) != list(iter_links(case))]
+
+
+# -----------------------------------------------------------------------
+# Synthetische Seiten
+# -----------------------------------------------------------------------
+
+def _page(body, rnd):
+    script = "<script>var links = ['<a href=\"/manual-0/fake.html\">'];</script>"
+    nav = ''.join('<li class="nav"><a href="/brand/{0}/" title="{0} &amp; more">{0}</a></li>'.format(
+        rnd.choice(['philips', 'ikea', 'bosch', 'sony', 'aeg'])) for _ in range(120))
+    return ('<!DOCTYPE html><html><head><title>x</title>{}<style>a>b{{color:red}}</style></head>'
+            '<body><!-- <a href="/manual-1/comment.html"> --><ul>{}</ul>{}</body></html>').format(script, nav, body)
+
+
+def make_search_page(rnd):
+    rows = ''.join(
+        '<div class="row"><div class="col"><a class="img" href="/products/{0}-{1}.html">'
+        '<img src="/img/{1}.jpg" alt="{0}"></a></div><div class="col"><span>{0} {1}</span>'
+        '<a href="/brand/{0}/">Brand</a></div></div>'.format('brand%d' % i, rnd.randint(1000, 9999))
+        for i in range(200))
+    hit = '<div class="resultname"><a href="/manual-{}/Philips-Hue-White.html?page=1#manual">Philips Hue</a></div>'.format(
+        rnd.randint(10000, 99999))
+    return _page(rows + hit + rows[:len(rows) // 4], rnd)
+
+
+def make_manual_page(rnd):
+    pages = ''.join(
+        '<a href="/manual-{0}/Philips-Hue.html?page={1}#manual" data-page="{1}">Seite {1}</a>'.format(
+            12345, p) for p in range(1, 600))
+    text = ''.join('<p class="t">{}</p>'.format('Lorem ipsum dolor sit amet ' * 4) for _ in range(400))
+    iframe = '<iframe id="viewer" src="https://pdf.manualslib.com/manual-12345/Philips-Hue.pdf?token=a&amp;b=c"></iframe>'
+    return _page(pages + text + iframe + '<a href="/download/12345/Philips-Hue.pdf">PDF</a>', rnd)
+
+
+def make_ddg_page(rnd):
+    rows = ''.join(
+        '<tr><td valign="top">{0}.&nbsp;</td><td><a rel="nofollow" href="https://example{0}.com/products/hue-{1}.html" '
+        'class=\'result-link\'>Result {0}</a></td></tr><tr><td>&nbsp;</td><td class=\'result-snippet\'>'
+        'Snippet mit <b>Hue</b> Bedienungsanleitung</td></tr>'.format(i, rnd.randint(1, 999))
+        for i in range(30))
+    hit = ('<tr><td><a rel="nofollow" href="https://www.manualslib.com/manual-4711/Philips-Hue.html" '
+           'class=\'result-link\'>manualslib</a></td></tr>')
+    return '<html><body><form action="/lite/" method="post"><input name="q"></form><table>{}{}</table></body></html>'.format(
+        rows, hit)
+
+
+def load_fixtures(directory):
+    fixtures = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.html'))):
+        name = os.path.basename(path).lower()
+        kind = 'ddg' if 'ddg' in name else 'search' if 'search' in name else 'manual'
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            fixtures.append((os.path.basename(path), kind, f.read()))
+    return fixtures
+
+
+# -----------------------------------------------------------------------
+# Messung
+# -----------------------------------------------------------------------
+
+PARSERS = {
+    'search': (legacy_search, md._parse_manualslib_search),
+    'manual': (legacy_manual_page, md._parse_manualslib_page),
+    'ddg':    (legacy_ddg, md._parse_duckduckgo),
+}
+
+
+def measure(func, text, repeat):
+    start = time.process_time()
+    for _ in range(repeat):
+        result = func(text)
+    cpu = (time.process_time() - start) / repeat
+
+    tracemalloc.start()
+    func(text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, cpu, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--fixtures', help='Verzeichnis mit gespeicherten HTML-Seiten')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.fixtures:
+        fixtures = load_fixtures(args.fixtures)
+    else:
+        rnd = random.Random(args.seed)
+        fixtures = [('manualslib-suche', 'search', make_search_page(rnd)),
+                    ('manualslib-manual', 'manual', make_manual_page(rnd)),
+                    ('duckduckgo-lite', 'ddg', make_ddg_page(rnd))]
+
+    print("{:<20} {:>8} {:>13} {:>13} {:>8} {:>12} {:>12} {:>8}  {}".format(
+        'Seite', 'KB', 'bs4 ms', 'neu ms', 'Faktor', 'bs4 KB', 'neu KB', 'Faktor', 'gleich'))
+    for name, kind, text in fixtures:
+        legacy, fast = PARSERS[kind]
+        old_result, old_cpu, old_peak = measure(legacy, text, args.repeat)
+        new_result, new_cpu, new_peak = measure(fast, text, args.repeat)
+        print("{:<20} {:>8.0f} {:>13.2f} {:>13.3f} {:>7.0f}x {:>12.0f} {:>12.1f} {:>7.0f}x  {}".format(
+            name[:20], len(text) / 1024, old_cpu * 1000, new_cpu * 1000, old_cpu / max(new_cpu, 1e-9),
+            old_peak / 1024, new_peak / 1024, old_peak / max(new_peak, 1),
+            'ja' if old_result == new_result else 'NEIN: {!r} / {!r}'.format(old_result, new_result)))
+
+    differences = check_edge_cases()
+    print("\nRandfälle: {} von {} gleich".format(len(EDGE_CASES) - len(differences), len(EDGE_CASES)))
+    for case, old, new in differences:
+        print("  NEIN: {!r}: bs4 {!r} / neu {!r}".format(case, old, new))
+
+
+if __name__ == '__main__':
+    main()
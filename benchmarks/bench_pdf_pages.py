@@ -0,0 +1,149 @@
+"""
+Benchmark: pdf_pages.count_pages() gegen den bisherigen PyPDF2-Weg.
+
+Erzeugt einen Korpus synthetischer PDFs (klassische Xref-Tabelle und
+Xref-Stream mit Objekt-Stream, mit großen "Scan"-Inhaltsstreams) und misst
+Laufzeit und Spitzen-Speicher beider Varianten.
+
+Aufruf (aus dem Repository-Wurzelverzeichnis):
+    python3 benchmarks/bench_pdf_pages.py [--pages 20 200 1000] [--stream-kb 256]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import PyPDF2  # noqa: E402
+from pdf_pages import count_pages  # noqa: E402
+
+
+def _write_classic(path, pages, stream_bytes):
+    out = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    offsets = {}
+    kids = ' '.join('{} 0 R'.format(3 + 2 * i) for i in range(pages))
+
+    offsets[1] = len(out)
+    out += b'1 0 obj\n<< /Type /Catalog /Pages 2 0 R >>\nendobj\n'
+    offsets[2] = len(out)
+    out += ('2 0 obj\n<< /Type /Pages /Kids [{}] /Count {} >>\nendobj\n'.format(kids, pages)).encode()
+    for i in range(pages):
+        page_num, content_num = 3 + 2 * i, 4 + 2 * i
+        offsets[page_num] = len(out)
+        out += (
+            '{} 0 obj\n<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {} 0 R >>\nendobj\n'
+            .format(page_num, content_num)
+        ).encode()
+        offsets[content_num] = len(out)
+        out += b'%d 0 obj\n<< /Length %d >>\nstream\n' % (content_num, len(stream_bytes))
+        out += stream_bytes + b'\nendstream\nendobj\n'
+
+    size = 3 + 2 * pages
+    xref_pos = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % size
+    for n in range(1, size):
+        out += b'%010d 00000 n \n' % offsets[n]
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (size, xref_pos)
+    with open(path, 'wb') as f:
+        f.write(out)
+
+
+def _write_xref_stream(path, pages, stream_bytes):
+    out = bytearray(b'%PDF-1.5\n%\xe2\xe3\xcf\xd3\n')
+    offsets = {}
+    kids = ' '.join('{} 0 R'.format(10 + 2 * i) for i in range(pages))
+
+    # Katalog und Seitenbaum liegen komprimiert im Objekt-Stream 3
+    header, body = b'', b''
+    for num, obj in ((1, b'<< /Type /Catalog /Pages 2 0 R >>'),
+                     (2, '<< /Type /Pages /Kids [{}] /Count {} >>'.format(kids, pages).encode())):
+        header += b'%d %d ' % (num, len(body))
+        body += obj + b'\n'
+    stm = zlib.compress(header + body)
+    offsets[3] = len(out)
+    out += b'3 0 obj\n<< /Type /ObjStm /N 2 /First %d /Length %d /Filter /FlateDecode >>\nstream\n' % (
+        len(header), len(stm))
+    out += stm + b'\nendstream\nendobj\n'
+
+    for i in range(pages):
+        page_num, content_num = 10 + 2 * i, 11 + 2 * i
+        offsets[page_num] = len(out)
+        out += (
+            '{} 0 obj\n<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {} 0 R >>\nendobj\n'
+            .format(page_num, content_num)
+        ).encode()
+        offsets[content_num] = len(out)
+        out += b'%d 0 obj\n<< /Length %d >>\nstream\n' % (content_num, len(stream_bytes))
+        out += stream_bytes + b'\nendstream\nendobj\n'
+
+    xref_num = 10 + 2 * pages
+    size = xref_num + 1
+    offsets[xref_num] = len(out)
+    rows = bytearray()
+    for n in range(size):
+        if n in (1, 2):
+            rows += bytes([2]) + (3).to_bytes(4, 'big') + bytes([n - 1])
+        elif n in offsets:
+            rows += bytes([1]) + offsets[n].to_bytes(4, 'big') + b'\x00'
+        else:
+            rows += bytes(6)
+    data = zlib.compress(bytes(rows))
+    out += (b'%d 0 obj\n<< /Type /XRef /Size %d /W [1 4 1] /Root 1 0 R /Filter /FlateDecode /Length %d >>\nstream\n'
+            % (xref_num, size, len(data)))
+    out += data + b'\nendstream\nendobj\nstartxref\n%d\n%%%%EOF\n' % offsets[xref_num]
+    with open(path, 'wb') as f:
+        f.write(out)
+
+
+def _pypdf2_pages(path):
+    with open(path, 'rb') as f:
+        return len(PyPDF2.PdfReader(f).pages)
+
+
+def _measure(func, path, repeat):
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func(path)
+    elapsed = (time.perf_counter() - start) / repeat
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--pages', type=int, nargs='+', default=[20, 200, 1000])
+    parser.add_argument('--stream-kb', type=int, default=256,
+                        help='Größe des Inhaltsstreams pro Seite in KB')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    stream_bytes = os.urandom(args.stream_kb * 1024)
+    print("{:<28} {:>8} {:>10} {:>12} {:>12} {:>10} {:>10}".format(
+        'Datei', 'Seiten', 'MB', 'pdf_pages', 'PyPDF2', 'Faktor', 'Peak KB'))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for pages in args.pages:
+            for kind, writer in (('klassisch', _write_classic), ('xref-stream', _write_xref_stream)):
+                path = os.path.join(tmp, '{}_{}.pdf'.format(kind, pages))
+                writer(path, pages, stream_bytes)
+                size_mb = os.path.getsize(path) / (1024 * 1024)
+
+                fast_count, fast_t, fast_peak = _measure(count_pages, path, args.repeat)
+                slow_count, slow_t, slow_peak = _measure(_pypdf2_pages, path, args.repeat)
+                if fast_count != slow_count:
+                    print("ABWEICHUNG bei {}: {} != {}".format(path, fast_count, slow_count))
+
+                print("{:<28} {:>8} {:>10.1f} {:>10.2f}ms {:>10.2f}ms {:>9.0f}x {:>5}/{:<5}".format(
+                    os.path.basename(path), pages, size_mb, fast_t * 1000, slow_t * 1000,
+                    slow_t / fast_t if fast_t else 0, fast_peak // 1024, slow_peak // 1024))
+
+
+if __name__ == '__main__':
+    main()
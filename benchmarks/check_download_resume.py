@@ -0,0 +1,210 @@
+"""
+Prüfung: fortgesetzte PDF-Downloads (Range/If-Range) gegen einen lokalen Server.
+
+Startet einen http.server auf 127.0.0.1, der die Verbindung mitten im Inhalt
+abbricht, und lädt über manual_downloader._download_pdf() so lange, bis die
+Datei vollständig ist. Geprüft wird je Fall:
+
+  - der Folgeversuch sendet Range ab der Größe des Teils und If-Range mit
+    dem ETag (bzw. ohne Range, wenn der Server keine Bereiche kann),
+  - die fertige Datei ist byte-identisch mit dem Original,
+  - der Index-Callback erhält den SHA-256 der ganzen Datei,
+  - es bleiben keine .part-Dateien liegen.
+
+Abgedeckt sind ein Abbruch innerhalb des ersten Blocks (40 KB), mehrere
+Abbrüche, Chunked-Übertragung, ein Server ohne Range-Unterstützung, eine
+Datei, die sich zwischen den Versuchen ändert, sowie Folgeversuche, bei denen
+der Server nicht antwortet oder HTTP 503 liefert – der Teil muss dann
+erhalten bleiben.
+
+Aufruf (aus dem Repository-Wurzelverzeichnis):
+    python3 benchmarks/check_download_resume.py
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import manual_downloader as md  # noqa: E402
+
+
+def make_pdf(padding):
+    """Minimale gültige PDF mit einer Seite; padding bläht sie auf."""
+    objects = [b'<< /Type /Catalog /Pages 2 0 R >>',
+               b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+               b'<< /Type /Page /Parent 2 0 R >>']
+    out = b'%PDF-1.4\n%' + padding + b'\n'
+    offsets = []
+    for num, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n' % num + body + b'\nendobj\n'
+    xref = len(out)
+    out += b'xref\n0 4\n0000000000 65535 f \n' + b''.join(b'%010d 00000 n \n' % o for o in offsets)
+    return out + b'trailer\n<< /Size 4 /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % xref
+
+
+# Fehlversuche: Zahl = Abbruch nach so vielen Bytes des Antwortinhalts,
+# WEG = Verbindung ohne Antwort geschlossen, 503 = Serverfehler
+WEG = 'weg'
+
+# name: (Fehlversuche, Range-Unterstützung, chunked, ETag wechselt)
+CASES = {
+    'frueh':      ([40 * 1024], True, False, False),
+    'mitte':      ([120000], True, False, False),
+    'zweimal':    ([90000, 50000], True, False, False),
+    'chunked':    ([40 * 1024], True, True, False),
+    'ohne-range': ([40 * 1024], False, False, False),
+    'geaendert':  ([40 * 1024], True, False, True),
+    'weg':        ([40 * 1024, WEG, 60000], True, False, False),
+    '503':        ([90000, 503], True, False, False),
+}
+
+
+class Server:
+    def __init__(self, original, changed):
+        self.original = original
+        self.changed = changed
+        self.cuts = {}
+        self.etags = {}
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server.handle(self)
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self.base = 'http://127.0.0.1:{}/'.format(self.httpd.server_port)
+
+    def handle(self, req):
+        name = req.path.strip('/')[:-len('.pdf')]
+        _, ranges, chunked, changes = CASES[name]
+        etag = self.etags.setdefault(name, '"v1"')
+        body = self.changed if etag == '"v2"' else self.original
+        range_header, if_range = req.headers.get('Range'), req.headers.get('If-Range')
+        self.requests.append((name, range_header, if_range))
+        cuts = self.cuts.get(name)
+        cut = cuts.pop(0) if cuts else None
+        if cut == WEG:
+            req.close_connection = True
+            return
+        if cut == 503:
+            req.send_error(503)
+            return
+
+        start = 0
+        match = re.match(r'bytes=(\d+)-$', range_header or '')
+        if ranges and match and if_range in (None, etag):
+            start = int(match.group(1))
+            req.send_response(206)
+            req.send_header('Content-Range', 'bytes {}-{}/{}'.format(start, len(body) - 1, len(body)))
+        else:
+            req.send_response(200)
+        req.send_header('Content-Type', 'application/pdf')
+        req.send_header('ETag', etag)
+        if ranges:
+            req.send_header('Accept-Ranges', 'bytes')
+        if chunked:
+            req.send_header('Transfer-Encoding', 'chunked')
+        else:
+            req.send_header('Content-Length', str(len(body) - start))
+        req.send_header('Connection', 'close')
+        req.end_headers()
+        req.close_connection = True
+
+        data = body[start:]
+        if cut is not None:
+            data = data[:cut]
+            if changes:
+                self.etags[name] = '"v2"'
+        if chunked:
+            for i in range(0, len(data), 16 * 1024):
+                block = data[i:i + 16 * 1024]
+                req.wfile.write(b'%x\r\n' % len(block) + block + b'\r\n')
+            if cut is None:
+                req.wfile.write(b'0\r\n\r\n')
+        else:
+            req.wfile.write(data)
+        req.wfile.flush()
+
+
+def run_case(server, name, folder, hook):
+    cuts, ranges, _, changes = CASES[name]
+    server.cuts[name] = list(cuts)
+    server.requests.clear()
+    dest = os.path.join(folder, name + '.pdf')
+    url = server.base + name + '.pdf'
+
+    results = [md._download_pdf(url, dest) for _ in range(len(cuts) + 1)]
+    expected = server.changed if changes else server.original
+    errors = []
+
+    if results != [False] * len(cuts) + [True]:
+        errors.append("Ergebnisse {}".format(results))
+    offset = 0
+    for (_, range_header, if_range), cut in zip(server.requests[1:], cuts):
+        if isinstance(cut, int) and cut != 503:
+            offset += cut
+        if ranges:
+            if range_header != 'bytes={}-'.format(offset) or if_range != '"v1"':
+                errors.append("erwartet Range bytes={}- / If-Range \"v1\", gesendet {!r} / {!r}".format(
+                    offset, range_header, if_range))
+        elif range_header is not None:
+            errors.append("Range ohne Server-Unterstützung gesendet: {!r}".format(range_header))
+    if not os.path.exists(dest):
+        errors.append("Datei fehlt")
+    else:
+        with open(dest, 'rb') as f:
+            if f.read() != expected:
+                errors.append("Inhalt weicht vom Original ab")
+    if not hook or hook[-1][2] != hashlib.sha256(expected).hexdigest():
+        errors.append("SHA-256 im Callback falsch")
+    leftovers = [n for n in os.listdir(folder) if n.startswith('.' + name + '.pdf.part')]
+    if leftovers:
+        errors.append("Teil-Dateien übrig: {}".format(leftovers))
+    return server.requests[:], errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--size-kb', type=int, default=300, help='Größe der Test-PDF')
+    args = parser.parse_args()
+
+    rnd = random.Random(1)
+    original = make_pdf(bytes(rnd.getrandbits(8) for _ in range(args.size_kb * 512)).hex().encode())
+    changed = make_pdf(b'x' * (args.size_kb * 700))
+    server = Server(original, changed)
+    md.HOST_RATE_LIMITS['127.0.0.1'] = (1000.0, 1000)
+    hook = []
+    md.configure(on_download=lambda *a: hook.append(a))
+
+    failed = 0
+    with tempfile.TemporaryDirectory() as folder:
+        for name in CASES:
+            requests_seen, errors = run_case(server, name, folder, hook)
+            print("{:<12} {:<5} {}".format(name, 'OK' if not errors else 'FEHLER',
+                                           ', '.join('{}/{}'.format(r, i) for _, r, i in requests_seen)))
+            for error in errors:
+                print("    " + error)
+            failed += bool(errors)
+    server.httpd.shutdown()
+    print("{} von {} Fällen fehlgeschlagen".format(failed, len(CASES)) if failed else "Alle Fälle bestanden")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Prüfung: home_assistant_api._iter_json_array() bei beliebig geteilten Blöcken.
+
+Zerlegt dieselbe JSON-Antwort an jeder Byte-Position in zwei Blöcke (und mit
+--paare an jedem Paar von Positionen in drei) und vergleicht das Ergebnis mit
+json.loads(). Die Nutzlast enthält Zahlen mit Nachkommastellen, Exponenten
+und Vorzeichen, Zeichenketten mit Escapes und mehrbyteigem UTF-8, verschachtelte
+Objekte sowie true/false/null, jeweils auch als oberste Array-Elemente.
+
+Aufruf (aus dem Repository-Wurzelverzeichnis):
+    python3 benchmarks/check_json_stream.py [--paare]
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from home_assistant_api import _iter_json_array  # noqa: E402
+
+PAYLOAD = (
+    ' [ 4500.0, -12, 1e5,2.5E-3 , 0,'
+    '"Küche \\"oben\\" – 温度 🌡", '
+    '{"entity_id": "sensor.temp", "state": "21.5", "attributes": {"unit": "°C", "werte": [1, 2.0, -3e2]}},'
+    '[], {}, true,false , null, 123456789012345678901234567890, -0.0 ] \n'
+).encode('utf-8')
+
+
+def check(chunks, expected):
+    try:
+        result = list(_iter_json_array(chunks))
+    except ValueError as exc:
+        return "Fehler: {}".format(exc)
+    if json.dumps(result) != json.dumps(expected):
+        return "Ergebnis weicht ab: {!r}".format(result)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--paare', action='store_true', help='zusätzlich an jedem Paar von Positionen teilen')
+    args = parser.parse_args()
+
+    expected = json.loads(PAYLOAD)
+    splits = [[PAYLOAD[:i], PAYLOAD[i:]] for i in range(len(PAYLOAD) + 1)]
+    splits.append([PAYLOAD[i:i + 1] for i in range(len(PAYLOAD))])
+    if args.paare:
+        splits += [[PAYLOAD[:i], PAYLOAD[i:j], PAYLOAD[j:]]
+                   for i in range(len(PAYLOAD) + 1) for j in range(i, len(PAYLOAD) + 1)]
+
+    failed = 0
+    for chunks in splits:
+        error = check(chunks, expected)
+        if error:
+            failed += 1
+            if failed <= 10:
+                print("Blöcke {!r}: {}".format([len(c) for c in chunks], error))
+
+    # Abgeschnittene Antworten müssen weiterhin als unvollständig erkannt werden
+    for cut in (len(PAYLOAD) - 4, PAYLOAD.index(b'4500') + 4, PAYLOAD.index(b'null') + 2):
+        if check([PAYLOAD[:cut]], expected) is None:
+            failed += 1
+            print("Abgeschnitten bei Byte {} nicht erkannt".format(cut))
+
+    print("{} von {} Zerlegungen fehlgeschlagen".format(failed, len(splits)) if failed
+          else "Alle {} Zerlegungen bestanden".format(len(splits)))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
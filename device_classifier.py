@@ -0,0 +1,142 @@
+"""
+Einordnung von HA-Geräten in Gerätearten (Beleuchtung, Schalter, ...).
+
+Zuerst entscheidet die Domain der ersten Entität des Geräts. Passt sie nicht,
+wird in Hersteller + Modell nach Stichwörtern gesucht; die Regeln werden in
+Prioritätsreihenfolge geprüft, wie bisher gewinnt die erste passende Regel.
+
+Alle Stichwort-Regeln sind in einem einzigen regulären Ausdruck
+zusammengefasst (eine Alternative ".*?(stichwort|...)" pro Regel, in
+Prioritätsreihenfolge) – ein C-Aufruf statt bis zu sechs Python-Schleifen.
+Das Ergebnis der Stichwortsuche wird je (Hersteller, Modell) zwischengespeichert;
+die Domain ist ohnehin nur ein Dict-Zugriff.
+
+Die Regeltabelle lässt sich per JSON-Datei anpassen:
+
+    {
+      "domains":  {"water_heater": "Klima / Heizung"},
+      "keywords": [{"type": "Beleuchtung", "keywords": ["bulb", "lamp"]}, ...],
+      "fallback": "Sonstiges"
+    }
+
+"domains" ergänzt bzw. überschreibt die Standard-Domains, "keywords" ersetzt
+die Standard-Stichwortregeln vollständig.
+"""
+
+import json
+import re
+from functools import lru_cache
+
+DEFAULT_DOMAIN_TYPES = {
+    'light':               'Beleuchtung',
+    'switch':              'Schalter',
+    'climate':             'Klima / Heizung',
+    'media_player':        'Medienplayer',
+    'camera':              'Kamera',
+    'vacuum':              'Staubsauger',
+    'cover':               'Rollladen / Jalousie',
+    'fan':                 'Lüfter',
+    'lock':                'Schloss',
+    'sensor':              'Sensor',
+    'binary_sensor':       'Sensor',
+    'alarm_control_panel': 'Alarm',
+}
+
+# Reihenfolge = Priorität
+DEFAULT_KEYWORD_RULES = [
+    ('Beleuchtung',     ['bulb', 'light', 'lamp', 'led', 'leuchte']),
+    ('Schalter',        ['plug', 'socket', 'steckdose', 'switch']),
+    ('Klima / Heizung', ['thermostat', 'heater', 'heizung', 'climate']),
+    ('Kamera',          ['camera', 'cam', 'kamera']),
+    ('Sensor',          ['sensor', 'motion', 'door', 'window', 'tür', 'fenster']),
+]
+
+FALLBACK_TYPE = 'Sonstiges'
+CACHE_SIZE = 8192
+
+
+class DeviceClassifier:
+    def __init__(self, domain_types=None, keyword_rules=None, fallback=FALLBACK_TYPE):
+        self.domain_types = dict(DEFAULT_DOMAIN_TYPES if domain_types is None else domain_types)
+        self.keyword_rules = [(t, list(k)) for t, k in
+                              (DEFAULT_KEYWORD_RULES if keyword_rules is None else keyword_rules)]
+        self.fallback = fallback
+        self._types = [t for t, _ in self.keyword_rules]
+        self._pattern = self._compile(self.keyword_rules)
+        self._keywords = lru_cache(maxsize=CACHE_SIZE)(self._match_keywords)
+
+    @staticmethod
+    def _compile(rules):
+        """Ein Ausdruck für alle Regeln; die Gruppe r<i> zeigt die passende Regel an.
+
+        Die Alternativen werden von links nach rechts versucht, d.h. Regel 0
+        wird im ganzen Text gesucht, bevor Regel 1 zum Zug kommt – genau die
+        Semantik der früheren Schleifen mit "stichwort in text".
+        """
+        parts = []
+        for i, (_, keywords) in enumerate(rules):
+            words = sorted({k.lower() for k in keywords if k}, key=len, reverse=True)
+            if words:
+                parts.append('.*?(?P<r{}>{})'.format(i, '|'.join(map(re.escape, words))))
+        if not parts:
+            return None
+        return re.compile('|'.join(parts), re.DOTALL)
+
+    def classify(self, domain, manufacturer, model):
+        device_type = self.domain_types.get(domain)
+        if device_type is not None:
+            return device_type
+        return self._keywords(manufacturer, model)
+
+    def _match_keywords(self, manufacturer, model):
+        if self._pattern is None:
+            return self.fallback
+        match = self._pattern.match((manufacturer + ' ' + model).lower())
+        if match is None:
+            return self.fallback
+        return self._types[int(match.lastgroup[1:])]
+
+    def cache_info(self):
+        return self._keywords.cache_info()
+
+
+def load_classifier(path):
+    """Klassifizierer aus einer JSON-Regeldatei; fehlt sie, gelten die Standardregeln."""
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return DeviceClassifier()
+    except (OSError, ValueError) as e:
+        print("Geräteart-Regeln: {} nicht lesbar ({}), nutze Standardregeln".format(path, e))
+        return DeviceClassifier()
+
+    try:
+        domains = dict(DEFAULT_DOMAIN_TYPES)
+        domains.update(data.get('domains') or {})
+        keywords = None
+        if data.get('keywords'):
+            keywords = [(rule['type'], rule.get('keywords', [])) for rule in data['keywords']]
+        classifier = DeviceClassifier(domains, keywords, data.get('fallback', FALLBACK_TYPE))
+    except (AttributeError, KeyError, TypeError) as e:
+        print("Geräteart-Regeln: {} ungültig ({}), nutze Standardregeln".format(path, e))
+        return DeviceClassifier()
+    print("Geräteart-Regeln aus {} geladen".format(path))
+    return classifier
+
+
+# Prozessweiter Klassifizierer; main.py ersetzt ihn ggf. per configure()
+_classifier = DeviceClassifier()
+
+
+def configure(classifier):
+    global _classifier
+    _classifier = classifier
+
+
+def classify(domain, manufacturer, model):
+    return _classifier.classify(domain, manufacturer, model)
+
+
+def cache_info():
+    return _classifier.cache_info()
@@ -0,0 +1,289 @@
+"""
+Ereignisgesteuerter Abgleich der HA-Geräte mit dem eigenen Bestand.
+
+HASync abonniert device_registry_updated und area_registry_updated über die
+dauerhafte WebSocket-Sitzung. Events werden kurz gesammelt (Entprellung) und
+dann nur für die betroffenen Geräte bzw. Bereiche übernommen:
+
+- neue HA-Geräte werden angelegt (wie beim manuellen Import),
+- Umbenennungen, Bereichswechsel, Hersteller/Modell werden übernommen,
+- deaktivierte oder aus HA entfernte Geräte werden markiert (ha_disabled /
+  ha_removed), aber nicht gelöscht – Anleitungszuordnungen bleiben erhalten,
+- umbenannte Bereiche benennen den Standort samt Geräten um.
+
+Die HA-API kennt keine Abfrage einzelner Geräte. Für Geräte-Events wird
+daher nur die Device Registry geladen (ohne Entity-Registry), für
+Bereichs-Events nur die Bereichsliste.
+
+Welche HA-Werte zuletzt übernommen wurden, steht in device['ha_state']. Ein
+Feld wird nur überschrieben, wenn es sich in HA seitdem geändert hat – lokale
+Änderungen in der App bleiben sonst erhalten.
+"""
+
+import threading
+import time
+
+# Felder, die aus HA übernommen werden, und die Registry-Schlüssel, deren
+# Änderung sie betrifft (Event-Feld "changes")
+SYNC_FIELDS = {
+    'name':         ('name', 'name_by_user'),
+    'location':     ('area_id',),
+    'manufacturer': ('manufacturer',),
+    'model':        ('model',),
+}
+
+DEBOUNCE_SECONDS = 2
+SUBSCRIBE_RETRY_MIN = 5      # Sekunden bis zum nächsten Abo-Versuch, verdoppelt bis
+SUBSCRIBE_RETRY_MAX = 300
+
+
+class HASync:
+    def __init__(self, api, store, slugify, debounce=DEBOUNCE_SECONDS):
+        self.api = api
+        self.store = store
+        self.slugify = slugify
+        self.debounce = debounce
+        self._cond = threading.Condition()
+        self._devices = {}          # Geräte-ID → {'action', 'keys'}
+        self._areas_dirty = False
+        self._full = True           # Beim Start und nach Neuverbindung alles abgleichen
+        self._area_map = None
+        self._thread = None
+        self.ready = False
+        self.events = 0
+        self.applied = 0
+        self.last_sync = None
+
+    def start(self):
+        """Startet den Abgleich im Hintergrund (idempotent)."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='ha-sync', daemon=True)
+        self._thread.start()
+
+    def stats(self):
+        return {
+            'ready':     self.ready,
+            'events':    self.events,
+            'applied':   self.applied,
+            'last_sync': self.last_sync,
+        }
+
+    # ------------------------------------------------------------------
+    # Event-Callbacks (laufen im Lese-Thread der WebSocket-Sitzung)
+    # ------------------------------------------------------------------
+
+    def _on_device(self, event):
+        data = event.get('data') or {}
+        device_id = data.get('device_id')
+        if not device_id:
+            return
+        action = data.get('action')
+        changes = data.get('changes')
+        self.api.invalidate_cache()
+        with self._cond:
+            self.events += 1
+            entry = self._devices.setdefault(device_id, {'action': action, 'keys': set()})
+            if action == 'remove' or entry['action'] != 'remove':
+                entry['action'] = action
+            if action == 'update' and isinstance(changes, dict) and entry['keys'] is not None:
+                entry['keys'].update(changes)
+            else:
+                entry['keys'] = None        # unbekannt → alle Felder prüfen
+            self._cond.notify()
+
+    def _on_area(self, event):
+        self.api.invalidate_cache()
+        with self._cond:
+            self.events += 1
+            self._areas_dirty = True
+            self._cond.notify()
+
+    def _on_reconnect(self):
+        with self._cond:
+            self._full = True
+            self._cond.notify()
+
+    # ------------------------------------------------------------------
+    # Ablauf
+    # ------------------------------------------------------------------
+
+    def _run(self):
+        # Fehlgeschlagene Abos registriert die WebSocket-Sitzung nicht; hier
+        # erneut versuchen (bereits bestehende Abos werden nicht verdoppelt)
+        delay = SUBSCRIBE_RETRY_MIN
+        while True:
+            try:
+                self.api.subscribe_registry_updates(self._on_device, self._on_area, self._on_reconnect)
+                break
+            except Exception as e:
+                print("HA-Sync: Abonnieren fehlgeschlagen, nächster Versuch in {} s: {}".format(delay, e))
+                time.sleep(delay)
+                delay = min(delay * 2, SUBSCRIBE_RETRY_MAX)
+        print("HA-Sync: Registry-Events abonniert")
+
+        while True:
+            with self._cond:
+                while not (self._devices or self._areas_dirty or self._full):
+                    self._cond.wait()
+            # Weitere Events desselben Vorgangs abwarten und gemeinsam verarbeiten
+            time.sleep(self.debounce)
+            with self._cond:
+                devices, self._devices = self._devices, {}
+                areas_dirty, self._areas_dirty = self._areas_dirty, False
+                full, self._full = self._full, False
+            try:
+                self._apply(devices, areas_dirty or full, full)
+                self.ready = True
+                self.last_sync = time.time()
+            except Exception as e:
+                print("HA-Sync: Abgleich fehlgeschlagen, wird wiederholt: {}".format(e))
+                with self._cond:
+                    for device_id, entry in devices.items():
+                        self._devices.setdefault(device_id, entry)
+                    self._areas_dirty = self._areas_dirty or areas_dirty
+                    self._full = self._full or full
+                time.sleep(30)
+
+    def _apply(self, pending, refresh_areas, full):
+        # Alle HA-Abfragen vor dem Batch: store.batch() hält beim JSON-Backend
+        # die Speicher-Sperre, Netzwerkzugriffe würden alle Leser blockieren
+        area_map = None
+        if refresh_areas or self._area_map is None:
+            area_map = self.api.get_area_map()
+
+        removed = [d for d, e in pending.items() if e['action'] == 'remove']
+        changed = {d: e for d, e in pending.items() if e['action'] != 'remove'}
+        registry = None
+        domains = {}
+        if changed or full:
+            registry = {raw.get('id'): raw for raw in self.api.get_device_registry()}
+            # Domain (für die Geräteart) nur laden, wenn wirklich neue Geräte anstehen
+            if any(self._is_new(registry.get(d), e) and self.store.get_device(d) is None
+                   for d, e in changed.items()):
+                domains = self.api.get_device_domains()
+
+        with self.store.batch():
+            if area_map is not None:
+                self._apply_areas(area_map)
+
+            updates = {}
+            for device_id in removed:
+                device = self.store.get_device(device_id)
+                if device is not None and not device.get('ha_removed'):
+                    updates[device_id] = {'ha_removed': True}
+
+            new_devices = []
+            if registry is not None:
+                if full:
+                    for device in self.store.list_devices():
+                        if device.get('ha_imported') and device['id'] not in changed:
+                            changed[device['id']] = {'action': 'reconcile', 'keys': None}
+                new_devices = self._apply_devices(changed, registry, domains, updates)
+
+            if updates:
+                self.store.update_devices(updates)
+            if new_devices:
+                self.store.add_devices(new_devices)
+
+        count = len(updates) + len(new_devices)
+        self.applied += count
+        if count:
+            print("HA-Sync: {} Gerät(e) aktualisiert, {} neu".format(len(updates), len(new_devices)))
+
+    def _apply_areas(self, area_map):
+        old_map = self._area_map or {}
+        for area_id, name in area_map.items():
+            old_name = old_map.get(area_id)
+            if old_name is not None and old_name != name:
+                self._rename_location(old_name, name)
+            else:
+                self.store.ensure_location(name, self.slugify(name))
+        self._area_map = area_map
+
+    def _rename_location(self, old_name, new_name):
+        locations = self.store.load_locations()
+        names_lower = {l['name'].strip().lower() for l in locations}
+        entry = next((l for l in locations if l['name'].strip().lower() == old_name.strip().lower()), None)
+        if entry is not None and new_name.strip().lower() not in names_lower:
+            entry['name'] = new_name
+            entry['slug'] = self.slugify(new_name)
+            self.store.save_locations(locations)
+        else:
+            self.store.ensure_location(new_name, self.slugify(new_name))
+        self.store.rename_location(old_name, new_name)
+        print("HA-Sync: Bereich '{}' → '{}'".format(old_name, new_name))
+
+    @staticmethod
+    def _is_new(raw, entry):
+        """Ob ein lokal unbekanntes HA-Gerät angelegt werden soll."""
+        return (raw is not None and entry['action'] != 'reconcile'
+                and raw.get('entry_type') != 'service' and raw.get('disabled_by') is None)
+
+    def _apply_devices(self, changed, registry, domains, updates):
+        """Trägt Änderungen in updates ein und gibt neu anzulegende Geräte zurück."""
+        new_raw = []
+        for device_id, entry in changed.items():
+            raw = registry.get(device_id)
+            device = self.store.get_device(device_id)
+
+            if raw is None:
+                if device is not None and not device.get('ha_removed'):
+                    updates[device_id] = {'ha_removed': True}
+                continue
+            if device is None:
+                if self._is_new(raw, entry):
+                    new_raw.append(raw)
+                continue
+
+            record = self.api.device_from_registry(raw, self._area_map, {})
+            fields = self._changed_fields(device, record, entry, raw.get('disabled_by') is not None)
+            if fields.get('location'):
+                self.store.ensure_location(fields['location'], self.slugify(fields['location']))
+            if updates.get(device_id):
+                fields.update(updates[device_id])
+            if fields:
+                updates[device_id] = fields
+
+        new_devices = []
+        for raw in new_raw:
+            record = self.api.device_from_registry(raw, self._area_map, domains)
+            self.store.ensure_location(record['location'], self.slugify(record['location']))
+            new_devices.append({
+                'id':           record['id'],
+                'name':         record['name'],
+                'type':         record['type'],
+                'location':     record['location'],
+                'manual':       None,
+                'manufacturer': record['manufacturer'],
+                'model':        record['model'],
+                'ha_imported':  True,
+                'ha_state':     {f: record[f] for f in SYNC_FIELDS},
+            })
+        return new_devices
+
+    @staticmethod
+    def _changed_fields(device, record, entry, disabled):
+        """Felder, die sich in HA geändert haben und lokal abweichen."""
+        base = device.get('ha_state')
+        keys = entry['keys']
+        fields = {}
+
+        for field, registry_keys in SYNC_FIELDS.items():
+            if base is not None:
+                changed_in_ha = record[field] != base.get(field)
+            elif entry['action'] == 'reconcile':
+                changed_in_ha = False   # Ohne Vergleichsbasis lokale Werte nicht überschreiben
+            else:
+                changed_in_ha = keys is None or any(k in keys for k in registry_keys)
+            if changed_in_ha and record[field] != device.get(field):
+                fields[field] = record[field]
+
+        state = {f: record[f] for f in SYNC_FIELDS}
+        if base != state:
+            fields['ha_state'] = state
+        if bool(device.get('ha_disabled')) != disabled:
+            fields['ha_disabled'] = disabled
+        if device.get('ha_removed'):
+            fields['ha_removed'] = False
+        return fields
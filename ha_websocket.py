@@ -0,0 +1,296 @@
+"""
+Dauerhafte WebSocket-Sitzung zur Home Assistant Core API über den Supervisor.
+
+Statt für jede Abfrage eine neue Verbindung aufzubauen und sich neu zu
+authentifizieren, hält HAWebSocket eine Verbindung offen. Mehrere Aufrufer
+teilen sie sich: jede Anfrage erhält eine eigene Nachrichten-ID, ein
+Lese-Thread ordnet die Antworten anhand dieser ID wieder zu.
+
+Bricht die Verbindung ab, schlagen laufende Anfragen mit ConnectionError fehl;
+die nächste Anfrage baut die Verbindung automatisch neu auf. Bestehen
+Event-Abonnements, verbindet ein Hintergrund-Thread mit wachsender Wartezeit
+neu und meldet sie erneut an. Jedes Abo ist pro Verbindung höchstens einmal
+angemeldet, auch wenn subscribe() und das Neuverbinden gleichzeitig laufen.
+"""
+
+import itertools
+import json
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+
+# Wartezeiten für das automatische Neuverbinden (Sekunden)
+RECONNECT_MIN = 2
+RECONNECT_MAX = 60
+
+
+class HAWebSocketError(RuntimeError):
+    """HA hat eine Anfrage mit success=false beantwortet."""
+
+
+class HAWebSocket:
+    def __init__(self, url, token, timeout=15):
+        self.url = url
+        self.token = token
+        self.timeout = timeout
+        self._ws = None
+        self._reader = None
+        self._ids = itertools.count(1)
+        self._pending = {}               # Nachrichten-ID → Future
+        self._lock = threading.Lock()    # Verbindungsauf- und -abbau
+        self._send_lock = threading.Lock()
+        self._subscriptions = []         # (event_type, callback)
+        self._event_handlers = {}        # Nachrichten-ID des Abos → callback
+        self._active = set()             # auf der aktuellen Verbindung angemeldete (event_type, callback)
+        self._subscribe_lock = threading.Lock()
+        self._reconnect_listeners = []
+        self._reconnecting = False
+        self.connects = 0
+
+    # ------------------------------------------------------------------
+    # Verbindung
+    # ------------------------------------------------------------------
+
+    @property
+    def connected(self):
+        return self._ws is not None
+
+    def _connect(self):
+        """Verbindung aufbauen und authentifizieren (mit self._lock aufrufen)."""
+        import websocket  # erst beim ersten Verbindungsaufbau laden
+        ws = websocket.create_connection(self.url, timeout=self.timeout)
+        try:
+            msg = json.loads(ws.recv())
+            if msg.get('type') != 'auth_required':
+                raise RuntimeError("Unerwartete Nachricht: {}".format(msg))
+
+            ws.send(json.dumps({"type": "auth", "access_token": self.token}))
+            msg = json.loads(ws.recv())
+            if msg.get('type') != 'auth_ok':
+                raise RuntimeError("Auth fehlgeschlagen: {}".format(msg))
+        except Exception:
+            ws.close()
+            raise
+
+        # Der Lese-Thread wartet ohne Timeout; hängende Anfragen laufen über
+        # den Timeout des jeweiligen Futures ab.
+        ws.settimeout(None)
+        self._ws = ws
+        self.connects += 1
+        self._reader = threading.Thread(target=self._read_loop, args=(ws,),
+                                        name='ha-websocket', daemon=True)
+        self._reader.start()
+        print("HA-WebSocket: verbunden ({}. Verbindung)".format(self.connects))
+
+    def _ensure_connected(self):
+        with self._lock:
+            if self._ws is None:
+                self._connect()
+            return self._ws
+
+    def _drop(self, ws, reason):
+        """Verbindung verwerfen und alle offenen Anfragen abbrechen."""
+        with self._lock:
+            if self._ws is not ws:
+                return
+            self._ws = None
+            pending, self._pending = self._pending, {}
+            self._event_handlers = {}
+            self._active = set()
+        try:
+            ws.close()
+        except Exception:
+            pass
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError("HA-WebSocket getrennt: {}".format(reason)))
+        self._schedule_reconnect()
+
+    def close(self):
+        with self._lock:
+            self._subscriptions = []
+        ws = self._ws
+        if ws is not None:
+            self._drop(ws, 'geschlossen')
+
+    def _schedule_reconnect(self):
+        with self._lock:
+            if not self._subscriptions or self._reconnecting:
+                return
+            self._reconnecting = True
+        threading.Thread(target=self._reconnect_loop, name='ha-websocket-reconnect', daemon=True).start()
+
+    def _reconnect_loop(self):
+        """Neu verbinden und Abos erneuern, bis es klappt."""
+        delay = RECONNECT_MIN
+        while True:
+            time.sleep(delay)
+            try:
+                self._ensure_connected()
+                self._resubscribe()
+                break
+            except Exception as e:
+                print("HA-WebSocket: Neuverbindung fehlgeschlagen ({}), nächster Versuch in {} s".format(e, delay))
+                ws = self._ws
+                if ws is not None:
+                    # Halb erneuerte Abos verwerfen und beim nächsten Versuch komplett neu anmelden
+                    self._drop(ws, e)
+                delay = min(delay * 2, RECONNECT_MAX)
+        with self._lock:
+            self._reconnecting = False
+        # Während der Unterbrechung verpasste Events müssen die Abonnenten selbst nachholen
+        for listener in list(self._reconnect_listeners):
+            try:
+                listener()
+            except Exception as e:
+                print("HA-WebSocket: Fehler nach Neuverbindung: {}".format(e))
+
+    def _resubscribe(self):
+        for event_type, callback in list(self._subscriptions):
+            self._subscribe(event_type, callback)
+
+    # ------------------------------------------------------------------
+    # Lesen
+    # ------------------------------------------------------------------
+
+    def _read_loop(self, ws):
+        try:
+            while True:
+                raw = ws.recv()
+                if not raw:
+                    raise ConnectionError('Verbindung vom Server geschlossen')
+                self._dispatch(json.loads(raw))
+        except Exception as e:
+            if self._ws is ws:
+                print("HA-WebSocket: Verbindung verloren: {}".format(e))
+            self._drop(ws, e)
+
+    def _dispatch(self, msg):
+        if msg.get('type') == 'event':
+            handler = self._event_handlers.get(msg.get('id'))
+            if handler is not None:
+                try:
+                    handler(msg.get('event') or {})
+                except Exception as e:
+                    print("HA-WebSocket: Event-Handler fehlgeschlagen: {}".format(e))
+            return
+        with self._lock:
+            future = self._pending.pop(msg.get('id'), None)
+        if future is None:
+            return
+        if msg.get('success', False):
+            future.set_result(msg.get('result'))
+        else:
+            future.set_exception(HAWebSocketError("WS-Fehler: {}".format(msg.get('error', msg))))
+
+    # ------------------------------------------------------------------
+    # Anfragen
+    # ------------------------------------------------------------------
+
+    def _send(self, payload, on_event=None):
+        """Sendet payload mit neuer ID und gibt das zugehörige Future zurück.
+
+        on_event wird vor dem Senden für diese ID registriert, damit kein
+        frühes Event eines Abos verloren geht.
+        """
+        ws = self._ensure_connected()
+        future = Future()
+        future.ws = ws
+        with self._send_lock:
+            msg_id = future.msg_id = next(self._ids)
+            with self._lock:
+                self._pending[msg_id] = future
+                if on_event is not None:
+                    self._event_handlers[msg_id] = on_event
+            try:
+                ws.send(json.dumps(dict(payload, id=msg_id)))
+            except Exception as e:
+                self._drop(ws, e)
+                raise ConnectionError("Senden fehlgeschlagen: {}".format(e))
+        return future
+
+    def _wait(self, future, timeout=None):
+        try:
+            return future.result(timeout or self.timeout)
+        except FutureTimeout:
+            # Keine Antwort – Verbindung gilt als hängend und wird neu aufgebaut
+            self._drop(future.ws, 'Zeitüberschreitung')
+            raise TimeoutError("Keine Antwort auf Nachricht {}".format(future.msg_id))
+
+    def call(self, payload, timeout=None):
+        """Sendet eine Anfrage und gibt deren result zurück.
+
+        Ist die gehaltene Verbindung inzwischen tot, wird einmal neu verbunden.
+        """
+        try:
+            future = self._send(payload)
+        except ConnectionError:
+            future = self._send(payload)
+        return self._wait(future, timeout)
+
+    def call_many(self, payloads, timeout=None):
+        """Sendet alle Anfragen ohne Warten und sammelt dann die Antworten.
+
+        Die Antworten werden über ihre ID zugeordnet, die Reihenfolge auf der
+        Leitung spielt keine Rolle. Während noch gesendet wird, kann der
+        Lese-Thread bereits die ersten Antworten parsen. Gibt die Ergebnisse
+        in der Reihenfolge von payloads zurück; schlägt eine Anfrage fehl,
+        wird deren Fehler ausgelöst.
+        """
+        payloads = list(payloads)
+        try:
+            futures = [self._send(payloads[0])] if payloads else []
+        except ConnectionError:
+            futures = [self._send(payloads[0])]
+        futures.extend(self._send(payload) for payload in payloads[1:])
+        return [self._wait(future, timeout) for future in futures]
+
+    # ------------------------------------------------------------------
+    # Events
+    # ------------------------------------------------------------------
+
+    def subscribe(self, event_type, callback):
+        """Abonniert ein HA-Event; callback(event) läuft im Lese-Thread.
+
+        Der Callback darf nicht blockieren und keine weiteren Anfragen über
+        diese Verbindung abwarten. Das Abo wird nach jedem Neuverbinden
+        automatisch erneuert. Schlägt die Anmeldung fehl, wird der Fehler
+        ausgelöst und nichts registriert – der Aufrufer kann es erneut
+        versuchen. Ein bereits bestehendes Abo wird nicht doppelt angelegt.
+        """
+        subscription = (event_type, callback)
+        with self._lock:
+            if subscription in self._subscriptions:
+                return
+            self._subscriptions.append(subscription)
+        try:
+            self._subscribe(event_type, callback)
+        except Exception:
+            with self._lock:
+                if subscription in self._subscriptions:
+                    self._subscriptions.remove(subscription)
+            raise
+
+    def _subscribe(self, event_type, callback):
+        # Gleichzeitige Anmeldungen (subscribe() und _resubscribe()) nacheinander,
+        # damit dasselbe Abo auf einer Verbindung nicht zweimal angemeldet wird
+        with self._subscribe_lock:
+            with self._lock:
+                if (event_type, callback) in self._active:
+                    return
+            future = self._send({"type": "subscribe_events", "event_type": event_type}, on_event=callback)
+            try:
+                self._wait(future)
+            except Exception:
+                with self._lock:
+                    self._event_handlers.pop(future.msg_id, None)
+                raise
+            with self._lock:
+                if self._ws is future.ws:
+                    self._active.add((event_type, callback))
+
+    def add_reconnect_listener(self, listener):
+        """listener() wird nach jedem automatischen Neuverbinden aufgerufen."""
+        if listener not in self._reconnect_listeners:
+            self._reconnect_listeners.append(listener)
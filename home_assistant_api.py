@@ -1,26 +1,112 @@
 import os
 import json
-import requests
-
-# WebSocket optional – erst nach Docker-Rebuild verfügbar
-try:
-    import websocket
-    HAS_WEBSOCKET = True
-except ImportError:
-    HAS_WEBSOCKET = False
+import codecs
+import hashlib
+import importlib.util
+import threading
+import time
+
+import device_classifier
+from ha_websocket import HAWebSocket
+
+# WebSocket optional – erst nach Docker-Rebuild verfügbar.
+# Nur prüfen, ob das Paket vorhanden ist; geladen wird es beim ersten Verbindungsaufbau.
+HAS_WEBSOCKET = importlib.util.find_spec('websocket') is not None
+if not HAS_WEBSOCKET:
     print("WARNUNG: websocket-client nicht installiert. Nutze REST-Fallback.")
 
 SUPERVISOR_WS   = "ws://supervisor/core/websocket"
 SUPERVISOR_REST = "http://supervisor/core/api"
 
+# Wie lange Registry-Antworten ohne erneute Abfrage wiederverwendet werden (Sekunden)
+DEFAULT_CACHE_TTL = 60
+
+
+# Aus /api/states werden nur diese Attribute behalten
+STATE_ATTRIBUTES = ('friendly_name', 'manufacturer', 'model')
+STREAM_CHUNK_SIZE = 256 * 1024
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+
+
+def _iter_json_array(chunks):
+    """Elemente eines JSON-Arrays einzeln aus einem Byte-Strom parsen.
+
+    Es liegt immer nur das aktuelle Element als Python-Objekt im Speicher,
+    nicht die ganze Antwort.
+    """
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    chunks = iter(chunks)
+    buf = ''
+    pos = 0
+    started = False
+
+    while True:
+        # Trennzeichen überspringen
+        while pos < len(buf) and (buf[pos] in _WHITESPACE or (started and buf[pos] == ',')):
+            pos += 1
+        if pos < len(buf):
+            if not started:
+                if buf[pos] != '[':
+                    raise ValueError("JSON-Array erwartet, gefunden: {!r}".format(buf[pos]))
+                started = True
+                pos += 1
+                continue
+            if buf[pos] == ']':
+                return
+            try:
+                item, end = _decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                pass    # Element unvollständig – weitere Daten lesen
+            else:
+                # Nur übernehmen, wenn danach "," oder "]" folgt: eine am Block-
+                # ende geteilte Zahl ("4500." + "0") liefert sonst nur ihren Anfang
+                follow = end
+                while follow < len(buf) and buf[follow] in _WHITESPACE:
+                    follow += 1
+                if follow < len(buf) and buf[follow] in ',]':
+                    yield item
+                    pos = end
+                    if pos > STREAM_CHUNK_SIZE:
+                        buf, pos = buf[pos:], 0
+                    continue
+
+        chunk = next(chunks, None)
+        if chunk is None:
+            raise ValueError("JSON-Array unvollständig")
+        buf += utf8.decode(chunk)
+
+
+def _slim_state(state):
+    """Nur entity_id und die benötigten Attribute eines Zustands behalten."""
+    attrs = state.get('attributes') or {}
+    slim = {'entity_id': state.get('entity_id', '')}
+    for key in STATE_ATTRIBUTES:
+        if key in attrs:
+            slim[key] = attrs[key]
+    return slim
+
+
+def _digest(raw):
+    """Inhalts-Hash einer Registry-Antwort (schneller C-Encoder statt Python-Schleife)."""
+    return hashlib.sha1(json.dumps(raw, separators=(',', ':')).encode('utf-8')).hexdigest()
+
 
 class HomeAssistantAPI:
-    def __init__(self):
+    def __init__(self, cache_ttl=DEFAULT_CACHE_TTL):
         self.token = os.environ.get('SUPERVISOR_TOKEN', '')
         self.headers = {
             "Authorization": "Bearer {}".format(self.token),
             "Content-Type": "application/json",
         }
+        # Eine dauerhafte, gemeinsam genutzte Verbindung für alle WS-Abfragen
+        self._ws = HAWebSocket(SUPERVISOR_WS, self.token) if HAS_WEBSOCKET else None
+        # Aufbereitete Registry-Daten: Schlüssel → (Abrufzeit, Inhalts-Hash, Ergebnis)
+        self.cache_ttl = cache_ttl
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+        self._cache_stats = {'hits': 0, 'unchanged': 0, 'misses': 0}
         print("Supervisor-Token vorhanden: {}".format(bool(self.token)))
         print("WebSocket-Client verfügbar: {}".format(HAS_WEBSOCKET))
 
@@ -29,29 +115,59 @@ class HomeAssistantAPI:
     # ------------------------------------------------------------------
 
     def _ws_query(self, *messages):
-        """Sendet mehrere Nachrichten über eine WebSocket-Verbindung."""
-        ws = websocket.create_connection(SUPERVISOR_WS, timeout=15)
+        """Sendet mehrere Nachrichten gebündelt über die gemeinsame WebSocket-Sitzung.
+
+        Alle Anfragen gehen sofort hinaus; die Antworten werden anschließend
+        anhand ihrer ID eingesammelt (ein Round-Trip statt einer pro Anfrage).
+        """
         try:
-            msg = json.loads(ws.recv())
-            if msg.get('type') != 'auth_required':
-                raise RuntimeError("Unerwartete Nachricht: {}".format(msg))
-
-            ws.send(json.dumps({"type": "auth", "access_token": self.token}))
-            msg = json.loads(ws.recv())
-            if msg.get('type') != 'auth_ok':
-                raise RuntimeError("Auth fehlgeschlagen: {}".format(msg))
-
-            results = []
-            for i, payload in enumerate(messages, start=1):
-                payload['id'] = i
-                ws.send(json.dumps(payload))
-                resp = json.loads(ws.recv())
-                if not resp.get('success', False):
-                    raise RuntimeError("WS-Fehler bei {}: {}".format(payload.get('type'), resp))
-                results.append(resp.get('result', []))
-            return results
-        finally:
-            ws.close()
+            results = self._ws.call_many(messages)
+        except RuntimeError as e:
+            types = ', '.join(m.get('type', '?') for m in messages)
+            raise RuntimeError("WS-Fehler bei {}: {}".format(types, e))
+        return [result if result is not None else [] for result in results]
+
+    # ------------------------------------------------------------------
+    # Registry-Cache
+    # ------------------------------------------------------------------
+
+    def _cached(self, key, fetch, process):
+        """Ergebnis von process(fetch()) mit TTL und Inhalts-Hash zwischenspeichern.
+
+        Innerhalb der TTL wird gar nicht abgefragt. Danach wird neu geladen,
+        die Aufbereitung (Domain-Zuordnung, Klassifizierung) aber nur
+        wiederholt, wenn sich der Inhalt der Registry tatsächlich geändert hat.
+        """
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is not None and time.monotonic() - entry[0] < self.cache_ttl:
+                self._cache_stats['hits'] += 1
+                return entry[2]
+
+        raw = fetch()
+        digest = _digest(raw)
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[1] == digest:
+                self._cache[key] = (time.monotonic(), digest, entry[2])
+                self._cache_stats['unchanged'] += 1
+                return entry[2]
+
+        value = process(raw)
+        with self._cache_lock:
+            self._cache[key] = (time.monotonic(), digest, value)
+            self._cache_stats['misses'] += 1
+        return value
+
+    def invalidate_cache(self):
+        """Nächste Abfrage wieder an HA stellen (z.B. nach Registry-Events)."""
+        with self._cache_lock:
+            self._cache = {key: (float('-inf'), digest, value)
+                           for key, (_, digest, value) in self._cache.items()}
+
+    def cache_stats(self):
+        with self._cache_lock:
+            return dict(self._cache_stats, ttl=self.cache_ttl, entries=len(self._cache))
 
     # ------------------------------------------------------------------
     # Öffentliche Methoden
@@ -60,23 +176,24 @@ class HomeAssistantAPI:
     def get_devices(self):
         """Physische Geräte aus der HA Device Registry laden."""
         if HAS_WEBSOCKET:
-            return self._get_devices_via_websocket()
+            devices = self._get_devices_via_websocket()
         else:
             print("Nutze REST-Fallback (physische Geräte mit Hersteller/Modell aus Attributen)")
-            return self._get_devices_via_rest()
+            devices = self._get_devices_via_rest()
+        # Kopien, damit Aufrufer den Cache nicht verändern
+        return [dict(d) for d in devices]
 
     def get_areas(self):
         """Bereiche/Räume aus HA laden."""
         if HAS_WEBSOCKET:
             try:
-                areas_raw, = self._ws_query({"type": "config/area_registry/list"})
-                areas = [{'id': a['area_id'], 'name': a['name']} for a in areas_raw]
-                return sorted(areas, key=lambda x: x['name'])
+                areas = self._cached('areas', self._fetch_area_registry, self._areas_from_registry)
+                return [dict(a) for a in areas]
             except Exception as e:
                 print("WebSocket-Bereiche fehlgeschlagen: {}".format(e))
 
         # REST-Fallback: Bereiche aus Entity-Attributen raten
-        return self._get_areas_via_rest()
+        return [dict(a) for a in self._get_areas_via_rest()]
 
     # ------------------------------------------------------------------
     # WebSocket-Implementierung
@@ -84,22 +201,22 @@ class HomeAssistantAPI:
 
     def _get_devices_via_websocket(self):
         try:
-            devices_raw, areas_raw, entities_raw = self._ws_query(
-                {"type": "config/device_registry/list"},
-                {"type": "config/area_registry/list"},
-                {"type": "config/entity_registry/list"},
-            )
+            return self._cached('devices', self._fetch_device_registries, self._devices_from_registries)
         except Exception as e:
             print("WebSocket Device Registry fehlgeschlagen: {}".format(e))
             return self._get_devices_via_rest()
 
+    def _fetch_device_registries(self):
+        return self._ws_query(
+            {"type": "config/device_registry/list"},
+            {"type": "config/area_registry/list"},
+            {"type": "config/entity_registry/list"},
+        )
+
+    def _devices_from_registries(self, registries):
+        devices_raw, areas_raw, entities_raw = registries
         area_map   = {a['area_id']: a['name'] for a in areas_raw}
-        domain_map = {}
-        for entity in entities_raw:
-            dev_id = entity.get('device_id')
-            if dev_id and dev_id not in domain_map:
-                eid = entity.get('entity_id', '')
-                domain_map[dev_id] = eid.split('.')[0] if '.' in eid else ''
+        domain_map = self._domain_map(entities_raw)
 
         devices = []
         for raw in devices_raw:
@@ -107,27 +224,87 @@ class HomeAssistantAPI:
                 continue
             if raw.get('disabled_by') is not None:
                 continue
-
-            dev_id       = raw.get('id', '')
-            name         = (raw.get('name_by_user') or raw.get('name') or 'Unbekanntes Gerät').strip()
-            manufacturer = raw.get('manufacturer') or 'Unbekannt'
-            model        = raw.get('model') or 'Unbekannt'
-            area_id      = raw.get('area_id')
-            location     = area_map.get(area_id, 'Unbekannt') if area_id else 'Unbekannt'
-            domain       = domain_map.get(dev_id, '')
-
-            devices.append({
-                'id':           dev_id,
-                'name':         name,
-                'manufacturer': manufacturer,
-                'model':        model,
-                'type':         self._device_type(domain, manufacturer, model),
-                'location':     location,
-            })
+            devices.append(self.device_from_registry(raw, area_map, domain_map))
 
         print("Physische Geräte (WebSocket): {}".format(len(devices)))
         return devices
 
+    def _fetch_area_registry(self):
+        areas_raw, = self._ws_query({"type": "config/area_registry/list"})
+        return areas_raw
+
+    @staticmethod
+    def _areas_from_registry(areas_raw):
+        areas = [{'id': a['area_id'], 'name': a['name']} for a in areas_raw]
+        return sorted(areas, key=lambda x: x['name'])
+
+    @staticmethod
+    def _domain_map(entities_raw):
+        """Geräte-ID → Domain der ersten zugehörigen Entität."""
+        domain_map = {}
+        for entity in entities_raw:
+            dev_id = entity.get('device_id')
+            if dev_id and dev_id not in domain_map:
+                eid = entity.get('entity_id', '')
+                domain_map[dev_id] = eid.split('.')[0] if '.' in eid else ''
+        return domain_map
+
+    def device_from_registry(self, raw, area_map, domain_map):
+        """Eintrag der Device Registry in das Geräteformat der App umwandeln."""
+        dev_id       = raw.get('id', '')
+        manufacturer = raw.get('manufacturer') or 'Unbekannt'
+        model        = raw.get('model') or 'Unbekannt'
+        area_id      = raw.get('area_id')
+        domain       = domain_map.get(dev_id, '')
+        return {
+            'id':           dev_id,
+            'name':         (raw.get('name_by_user') or raw.get('name') or 'Unbekanntes Gerät').strip(),
+            'manufacturer': manufacturer,
+            'model':        model,
+            'type':         self._device_type(domain, manufacturer, model),
+            'location':     area_map.get(area_id, 'Unbekannt') if area_id else 'Unbekannt',
+        }
+
+    # ------------------------------------------------------------------
+    # Registry-Abos (Hintergrund-Abgleich)
+    # ------------------------------------------------------------------
+
+    def subscribe_registry_updates(self, on_device, on_area, on_reconnect):
+        """Abonniert Änderungen an Geräte- und Bereichs-Registry.
+
+        Die Callbacks laufen im Lese-Thread der WebSocket-Sitzung und dürfen
+        nicht blockieren. on_reconnect() wird nach einem Verbindungsabbruch
+        aufgerufen, da in der Zwischenzeit Events verloren gegangen sein können.
+        """
+        if not HAS_WEBSOCKET:
+            raise RuntimeError("websocket-client nicht installiert")
+        self._ws.add_reconnect_listener(on_reconnect)
+        self._ws.subscribe('device_registry_updated', on_device)
+        self._ws.subscribe('area_registry_updated', on_area)
+
+    def get_device_registry(self):
+        """Rohe Einträge der Device Registry (ohne Bereiche und Entitäten)."""
+        devices_raw, = self._ws_query({"type": "config/device_registry/list"})
+        return devices_raw
+
+    def get_area_map(self):
+        """Bereichs-ID → Name."""
+        areas_raw, = self._ws_query({"type": "config/area_registry/list"})
+        return {a['area_id']: a['name'] for a in areas_raw}
+
+    def get_device_domains(self):
+        """Geräte-ID → Domain, über die kompakte Entity-Liste der HA-Oberfläche.
+
+        Ältere HA-Versionen ohne list_for_display erhalten die volle Liste.
+        """
+        try:
+            result, = self._ws_query({"type": "config/entity_registry/list_for_display"})
+            entities = [{'device_id': e.get('di'), 'entity_id': e.get('ei', '')}
+                        for e in result.get('entities', [])]
+        except RuntimeError:
+            entities, = self._ws_query({"type": "config/entity_registry/list"})
+        return self._domain_map(entities)
+
     # ------------------------------------------------------------------
     # REST-Fallback
     # ------------------------------------------------------------------
@@ -139,21 +316,31 @@ class HomeAssistantAPI:
         Pro Hersteller+Modell wird nur ein Gerät angelegt.
         """
         try:
-            resp = requests.get("{}/states".format(SUPERVISOR_REST),
-                                headers=self.headers, timeout=15)
-            resp.raise_for_status()
-            states = resp.json()
+            return self._cached('rest_devices', self._rest_states, self._devices_from_states)
         except Exception as e:
             print("REST-States fehlgeschlagen: {}".format(e))
             return []
 
+    def _rest_states(self):
+        """Reduzierte Zustände; ein Download versorgt Geräte und Bereiche."""
+        return self._cached('rest_states', self._fetch_states, lambda states: states)
+
+    def _fetch_states(self):
+        """/api/states streamend lesen und jeden Zustand sofort reduzieren."""
+        import requests  # nur für den REST-Fallback nötig
+        with requests.get("{}/states".format(SUPERVISOR_REST),
+                          headers=self.headers, timeout=15, stream=True) as resp:
+            resp.raise_for_status()
+            return [_slim_state(state)
+                    for state in _iter_json_array(resp.iter_content(STREAM_CHUNK_SIZE))]
+
+    def _devices_from_states(self, states):
         seen = set()
         devices = []
 
         for state in states:
-            attrs        = state.get('attributes', {})
-            manufacturer = attrs.get('manufacturer', '').strip()
-            model        = attrs.get('model', '').strip()
+            manufacturer = state.get('manufacturer', '').strip()
+            model        = state.get('model', '').strip()
 
             # Nur Entitäten mit echten Hersteller- und Modellinformationen
             if not manufacturer or not model:
@@ -166,7 +353,7 @@ class HomeAssistantAPI:
 
             entity_id = state['entity_id']
             domain    = entity_id.split('.')[0]
-            name      = attrs.get('friendly_name', entity_id)
+            name      = state.get('friendly_name', entity_id)
 
             # Bereich aus friendly_name erraten (erster Teil)
             location = 'Unbekannt'
@@ -189,17 +376,16 @@ class HomeAssistantAPI:
 
     def _get_areas_via_rest(self):
         try:
-            resp = requests.get("{}/states".format(SUPERVISOR_REST),
-                                headers=self.headers, timeout=15)
-            resp.raise_for_status()
-            states = resp.json()
+            return self._cached('rest_areas', self._rest_states, self._areas_from_states)
         except Exception as e:
             print("REST-States für Bereiche fehlgeschlagen: {}".format(e))
             return []
 
+    @staticmethod
+    def _areas_from_states(states):
         areas = set()
         for state in states:
-            name = state.get('attributes', {}).get('friendly_name', '')
+            name = state.get('friendly_name', '')
             if ' ' in name:
                 first = name.split(' ')[0]
                 if len(first) > 2 and first not in ['Der', 'Die', 'Das', 'Ein', 'Eine']:
@@ -214,32 +400,4 @@ class HomeAssistantAPI:
 
     @staticmethod
     def _device_type(domain, manufacturer, model):
-        domain_map = {
-            'light':               'Beleuchtung',
-            'switch':              'Schalter',
-            'climate':             'Klima / Heizung',
-            'media_player':        'Medienplayer',
-            'camera':              'Kamera',
-            'vacuum':              'Staubsauger',
-            'cover':               'Rollladen / Jalousie',
-            'fan':                 'Lüfter',
-            'lock':                'Schloss',
-            'sensor':              'Sensor',
-            'binary_sensor':       'Sensor',
-            'alarm_control_panel': 'Alarm',
-        }
-        if domain in domain_map:
-            return domain_map[domain]
-
-        combined = (manufacturer + ' ' + model).lower()
-        if any(k in combined for k in ['bulb', 'light', 'lamp', 'led', 'leuchte']):
-            return 'Beleuchtung'
-        if any(k in combined for k in ['plug', 'socket', 'steckdose', 'switch']):
-            return 'Schalter'
-        if any(k in combined for k in ['thermostat', 'heater', 'heizung', 'climate']):
-            return 'Klima / Heizung'
-        if any(k in combined for k in ['camera', 'cam', 'kamera']):
-            return 'Kamera'
-        if any(k in combined for k in ['sensor', 'motion', 'door', 'window', 'tür', 'fenster']):
-            return 'Sensor'
-        return 'Sonstiges'
+        return device_classifier.classify(domain, manufacturer, model)
@@ -0,0 +1,72 @@
+"""
+Schnelles Auslesen von Links aus HTML-Seiten.
+
+Für die Anleitungssuche werden nur <a href> und <iframe src> gebraucht. Statt
+einen vollständigen Dokumentbaum aufzubauen (BeautifulSoup), sucht ein
+vorkompilierter Ausdruck die Tags im Text, ein zweiter liest deren Attribute;
+die Links kommen in Dokumentreihenfolge. Kommentare sowie <script>- und
+<style>-Inhalte werden übersprungen, Attribute wie beim HTML-Parser zerlegt
+und entschlüsselt (&amp; → &).
+
+iter_links() ist ein Generator – wer nur den ersten Treffer braucht, bricht
+ab, ohne den Rest der Seite anzusehen.
+"""
+
+import html
+import re
+
+# Kommentar | script/style-Block | Beginn von <a ...> bzw. <iframe ...>
+_TAG_RE = re.compile(
+    r'<!--.*?-->'
+    r'|<(script|style)\b.*?</\1\s*>'
+    r'|<(a|iframe)(?=[\s/>])[\s/]*',
+    re.IGNORECASE | re.DOTALL,
+)
+# Ein Attribut nach dem anderen, damit "href=" in einem anderen Attributwert
+# nicht zählt. Aufbau wie bei html.parser: Name, optional "=" mit Wert (in
+# Anführungszeichen oder ohne), danach Leerraum oder "/" als Trenner – auch
+# <a/href="x">. Die Attribute werden einzeln mit match() gelesen statt in
+# einem Ausdruck für das ganze Tag, sonst wird das Zurückverfolgen bei nicht
+# geschlossenen Tags quadratisch.
+_ATTR_RE = re.compile(
+    r'((?<=[\'"\s/])[^\s/>][^\s/=>]*)'
+    r'(?:\s*=+\s*(?:\'([^\']*)\'|"([^"]*)"|(?![\'"])([^>\s]*)))?'
+    r'(?:\s|/(?!>))*'
+)
+_TAG_END_RE = re.compile(r'\s*/?>')
+
+# Welches Attribut je Tag den Link enthält
+_LINK_ATTR = {'a': 'href', 'iframe': 'src'}
+
+
+def iter_links(text):
+    """
+    Liefert (tag, url) für jedes <a href> und <iframe src> in Dokumentreihenfolge.
+
+    Wie BeautifulSoup mit html.parser: bei doppeltem Attribut gilt das
+    letzte, ein Attribut ohne Wert (<a href>) ergibt ''.
+    """
+    pos = 0
+    while True:
+        match = _TAG_RE.search(text, pos)
+        if match is None:
+            return
+        pos = match.end()
+        tag = match.group(2)
+        if tag is None:
+            continue        # Kommentar oder script/style
+        tag = tag.lower()
+        wanted = _LINK_ATTR[tag]
+        value = None
+        attr = _ATTR_RE.match(text, pos)
+        while attr is not None:
+            if attr.group(1).lower() == wanted:
+                value = next((v for v in attr.group(2, 3, 4) if v is not None), '')
+            pos = attr.end()
+            attr = _ATTR_RE.match(text, pos)
+        end = _TAG_END_RE.match(text, pos)
+        if end is None:
+            continue        # Tag nicht geschlossen (Dateiende)
+        pos = end.end()
+        if value is not None:
+            yield tag, html.unescape(value) if '&' in value else value
@@ -0,0 +1,360 @@
+"""
+Hintergrund-Jobs für die Anleitungssuche ("Alle Anleitungen suchen").
+
+Die Suche läuft nicht mehr im HTTP-Request, sondern in einem eigenen Thread.
+Jeder Job hat eine ID und hält für jedes Gerät einen Status (pending,
+running, found, not_found, error, skipped, cancelled). Der Zustand aller
+Jobs liegt in /data/devices/jobs.json und wird atomar geschrieben:
+
+- Gefundene Anleitungen werden laufend (spätestens alle SAVE_INTERVAL
+  Sekunden) per store.update_devices() gespeichert, nicht erst am Ende.
+- Ein abgebrochener Job sucht keine weiteren Geräte mehr; laufende Suchen
+  werden noch abgeschlossen.
+- Nach einem Neustart werden unfertige Jobs fortgesetzt. Geräte, die bereits
+  eine Anleitung haben, werden dabei übersprungen.
+- Geräte mit demselben Suchbegriff werden gemeinsam gesucht; die Datei wird
+  allen in derselben Speicherung zugewiesen.
+
+Jede Änderung erhöht die Version des Jobs. snapshot(since=n) liefert nur die
+Geräte, die sich nach Version n geändert haben – so bleiben Polling und der
+Server-Sent-Events-Stream auch bei vielen Geräten klein.
+"""
+
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from json_cache import write_json_atomic
+
+SAVE_INTERVAL = 1.0      # Sekunden zwischen zwei Zwischenspeicherungen
+KEEP_FINISHED = 20       # So viele abgeschlossene Jobs bleiben erhalten
+
+ACTIVE_STATES = ('queued', 'running', 'cancelling')
+DEVICE_STATUSES = ('pending', 'running', 'found', 'not_found', 'error', 'skipped', 'cancelled')
+
+
+class JobQueue:
+    def __init__(self, jobs_file, store, dest_folder, workers, downloader):
+        """downloader: Funktion, die das (eingerichtete) Modul manual_downloader liefert."""
+        self.jobs_file = jobs_file
+        self.store = store
+        self.dest_folder = dest_folder
+        self.workers = max(1, workers)
+        self.downloader = downloader
+        self._cond = threading.Condition()
+        self._jobs = {}
+        self._queue = []
+        self._thread = None
+        self._last_save = 0.0
+
+    # ------------------------------------------------------------------
+    # Öffentliche API
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """Lädt gespeicherte Jobs, stellt unfertige wieder ein und startet den Worker."""
+        if self._thread is not None:
+            return
+        data = self._load()
+        resumed = 0
+        with self._cond:
+            for job in sorted((data.get('jobs') or {}).values(), key=lambda j: j.get('created', 0)):
+                if job['id'] in self._jobs:
+                    # Schon vor start() angelegt und eingereiht – der Stand im Speicher gilt
+                    continue
+                self._jobs[job['id']] = job
+                if job['state'] not in ACTIVE_STATES:
+                    continue
+                if job['state'] == 'cancelling':
+                    self._finish(job, 'cancelled')
+                    continue
+                for entry in job['devices'].values():
+                    if entry['status'] == 'running':
+                        entry['status'] = 'pending'
+                job['state'] = 'queued'
+                self._queue.append(job['id'])
+                resumed += 1
+            self._save()
+        if resumed:
+            print("Jobs: {} unfertige(r) Job(s) werden fortgesetzt".format(resumed))
+        self._thread = threading.Thread(target=self._run, name='jobs', daemon=True)
+        self._thread.start()
+
+    def submit_manual_search(self, devices):
+        """
+        Legt einen Suchjob für die übergebenen Geräte an und gibt (job_id, neu) zurück.
+
+        Läuft bereits ein Suchjob, wird dessen ID zurückgegeben – sonst würden
+        dieselben Geräte doppelt gesucht.
+        """
+        with self._cond:
+            for job in self._jobs.values():
+                if job['state'] in ACTIVE_STATES:
+                    return job['id'], False
+            job_id = uuid.uuid4().hex[:12]
+            self._jobs[job_id] = {
+                'id':       job_id,
+                'kind':     'manual_search',
+                'state':    'queued',
+                'created':  time.time(),
+                'started':  None,
+                'finished': None,
+                'version':  1,
+                'order':    [d['id'] for d in devices],
+                'devices':  {d['id']: {
+                    'name':         d.get('name', ''),
+                    'manufacturer': d.get('manufacturer', 'Unbekannt'),
+                    'model':        d.get('model', 'Unbekannt'),
+                    'status':       'pending',
+                    'manual':       None,
+                    'error':        None,
+                    'v':            1,
+                } for d in devices},
+            }
+            self._queue.append(job_id)
+            self._prune()
+            self._save()
+            self._cond.notify_all()
+        return job_id, True
+
+    def cancel(self, job_id):
+        """Bricht einen Job ab. Gibt False zurück, wenn er nicht (mehr) aktiv ist."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job['state'] not in ACTIVE_STATES:
+                return False
+            if job['state'] == 'queued':
+                self._queue.remove(job_id)
+                self._cancel_pending(job)
+                self._finish(job, 'cancelled')
+            else:
+                job['state'] = 'cancelling'
+                self._touch(job)
+            self._save()
+            self._cond.notify_all()
+        return True
+
+    def active_job_id(self):
+        with self._cond:
+            for job in self._jobs.values():
+                if job['state'] in ACTIVE_STATES:
+                    return job['id']
+        return None
+
+    def list_jobs(self):
+        with self._cond:
+            jobs = sorted(self._jobs.values(), key=lambda j: j['created'], reverse=True)
+            return [self._summary(job) for job in jobs]
+
+    def snapshot(self, job_id, since=0):
+        """Zustand eines Jobs; Geräte nur, wenn sie sich nach Version since geändert haben."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            result = self._summary(job)
+            result['devices'] = [
+                dict(id=device_id, name=entry['name'], status=entry['status'],
+                     manual=entry['manual'], error=entry['error'])
+                for device_id, entry in ((i, job['devices'][i]) for i in job['order'])
+                if entry['v'] > since
+            ]
+            return result
+
+    def wait_for_change(self, job_id, version, timeout):
+        """Blockiert, bis der Job eine neuere Version als version hat (oder timeout)."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                job = self._jobs.get(job_id)
+                if job is None or job['version'] > version:
+                    return
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                self._cond.wait(remaining)
+
+    def stats(self):
+        with self._cond:
+            states = {}
+            for job in self._jobs.values():
+                states[job['state']] = states.get(job['state'], 0) + 1
+            return {'jobs': states, 'queued': len(self._queue), 'workers': self.workers}
+
+    # ------------------------------------------------------------------
+    # Worker
+    # ------------------------------------------------------------------
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                job = self._jobs[self._queue.pop(0)]
+                job['state'] = 'running'
+                job['started'] = job['started'] or time.time()
+                self._touch(job)
+                self._save()
+            try:
+                self._run_manual_search(job)
+            except Exception as e:
+                print("Jobs: Job {} fehlgeschlagen: {}".format(job['id'], e))
+                with self._cond:
+                    self._finish(job, 'failed')
+                    self._save()
+
+    def _run_manual_search(self, job):
+        # requests erst laden, wenn wirklich gesucht wird
+        downloader = self.downloader()
+        find_and_download_manual, search_key = downloader.find_and_download_manual, downloader.search_key
+        not_found = downloader.ManualNotFound
+
+        # Geräte mit gleichem Suchbegriff (z.B. zwölf gleiche Lampen) teilen sich eine Suche
+        groups = {}
+        for device_id in job['order']:
+            entry = job['devices'][device_id]
+            if entry['status'] == 'pending':
+                key = search_key(entry['name'], entry['manufacturer'], entry['model'])
+                groups.setdefault(key, []).append(device_id)
+        pending = list(groups.values())
+        print("Jobs: Suche Anleitungen für {} Gerät(e), {} Suchbegriff(e) (Job {})".format(
+            sum(map(len, pending)), len(pending), job['id']))
+
+        changes = {}
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='manual-search') as pool:
+            running = {}
+            while pending or running:
+                # Nur so viele Suchen einreihen, wie Worker frei sind – ein Abbruch greift so sofort
+                while pending and len(running) < self.workers and job['state'] == 'running':
+                    group = self._start_group(job, pending.pop(0))
+                    if not group:
+                        continue
+                    entry = job['devices'][group[0]]
+                    future = pool.submit(find_and_download_manual, entry['name'], entry['manufacturer'],
+                                         entry['model'], self.dest_folder)
+                    running[future] = group
+
+                if job['state'] != 'running' and not running:
+                    break
+                if running:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                else:
+                    done = ()
+
+                with self._cond:
+                    for future in done:
+                        group = running.pop(future)
+                        try:
+                            filename, error = future.result()
+                        except Exception as e:
+                            filename, error = None, "Suche fehlgeschlagen: {}".format(e)
+                        for device_id in group:
+                            if filename:
+                                changes[device_id] = {'manual': filename}
+                                self._set_status(job, device_id, 'found', manual=filename)
+                            elif isinstance(error, not_found):
+                                self._set_status(job, device_id, 'not_found', error=error)
+                            else:
+                                self._set_status(job, device_id, 'error', error=error)
+                    changes = self._checkpoint(changes)
+
+        with self._cond:
+            if job['state'] == 'cancelling':
+                self._cancel_pending(job)
+                self._finish(job, 'cancelled')
+            else:
+                self._finish(job, 'done')
+            self._checkpoint(changes, force=True)
+        counts = self._counts(job)
+        print("Jobs: Job {} {}: {} gefunden, {} nicht gefunden, {} Fehler".format(
+            job['id'], job['state'], counts['found'], counts['not_found'], counts['error']))
+
+    def _start_group(self, job, group):
+        """Markiert die Geräte einer Gruppe als laufend; erledigte/gelöschte werden übersprungen."""
+        devices = {device_id: self.store.get_device(device_id) for device_id in group}
+        with self._cond:
+            active = []
+            for device_id, device in devices.items():
+                if device is None or device.get('manual'):
+                    self._set_status(job, device_id, 'skipped', manual=device and device.get('manual'))
+                else:
+                    self._set_status(job, device_id, 'running')
+                    active.append(device_id)
+            return active
+
+    def _checkpoint(self, changes, force=False):
+        """Speichert gefundene Anleitungen und den Jobzustand (höchstens alle SAVE_INTERVAL s)."""
+        if not force and time.monotonic() - self._last_save < SAVE_INTERVAL:
+            return changes
+        # Erst die Geräte, dann der Job: nach einem Absturz dazwischen wird das
+        # Gerät beim Fortsetzen übersprungen, weil es schon eine Anleitung hat
+        if changes:
+            self.store.update_devices(changes)
+        self._save()
+        return {}
+
+    # ------------------------------------------------------------------
+    # Hilfsfunktionen (Aufrufer hält self._cond)
+    # ------------------------------------------------------------------
+
+    def _touch(self, job):
+        job['version'] += 1
+        self._cond.notify_all()
+
+    def _set_status(self, job, device_id, status, manual=None, error=None):
+        self._touch(job)
+        entry = job['devices'][device_id]
+        entry.update(status=status, manual=manual, error=error, v=job['version'])
+
+    def _cancel_pending(self, job):
+        for device_id, entry in job['devices'].items():
+            if entry['status'] == 'pending':
+                self._set_status(job, device_id, 'cancelled')
+
+    def _finish(self, job, state):
+        job['state'] = state
+        job['finished'] = time.time()
+        self._touch(job)
+
+    @staticmethod
+    def _counts(job):
+        counts = dict.fromkeys(DEVICE_STATUSES, 0)
+        for entry in job['devices'].values():
+            counts[entry['status']] += 1
+        return counts
+
+    def _summary(self, job):
+        return {
+            'id':       job['id'],
+            'kind':     job['kind'],
+            'state':    job['state'],
+            'created':  job['created'],
+            'started':  job['started'],
+            'finished': job['finished'],
+            'version':  job['version'],
+            'total':    len(job['order']),
+            'counts':   self._counts(job),
+        }
+
+    def _prune(self):
+        finished = sorted((j for j in self._jobs.values() if j['state'] not in ACTIVE_STATES),
+                          key=lambda j: j['created'])
+        for job in finished[:max(0, len(finished) - KEEP_FINISHED)]:
+            del self._jobs[job['id']]
+
+    def _load(self):
+        try:
+            with open(self.jobs_file, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print("Jobs: {} nicht lesbar ({}), beginne ohne Jobs".format(self.jobs_file, e))
+            return {}
+
+    def _save(self):
+        data = {'version': 1, 'jobs': self._jobs}
+        write_json_atomic(self.jobs_file, data)
+        self._last_save = time.monotonic()
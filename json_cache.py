@@ -0,0 +1,105 @@
+"""
+Lesen und Schreiben der JSON-Datendateien.
+
+JsonFileCache: prozessweiter Lese-Cache. Eine Datei wird nur neu geparst,
+wenn sich mtime, Größe oder Inode seit dem letzten Lesen geändert haben – ein
+stat() pro Zugriff statt open() + json.load(). Schreibende Aufrufer melden
+ihre Änderung per put() bzw. invalidate().
+
+write_json_atomic(): schreibt kompaktes JSON in eine temporäre Datei, fsynct
+sie und ersetzt das Ziel per rename – Leser sehen nie eine halbe Datei.
+"""
+
+import json
+import os
+import tempfile
+import threading
+
+
+def write_json_atomic(path, data):
+    """Schreibt data als kompaktes JSON atomar nach path."""
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+    # Verzeichniseintrag ebenfalls dauerhaft machen
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    except OSError:
+        pass
+
+
+def _signature(path):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+class JsonFileCache:
+    def __init__(self):
+        self._entries = {}   # Pfad → (Signatur, Daten)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, path, default):
+        """Gibt den geparsten Inhalt zurück (geteilter Snapshot, nicht verändern)."""
+        try:
+            sig = _signature(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._entries.pop(path, None)
+            return default
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == sig:
+                self.hits += 1
+                return entry[1]
+
+        with open(path, 'r') as f:
+            data = json.load(f)
+        with self._lock:
+            self.misses += 1
+            self._entries[path] = (sig, data)
+        return data
+
+    def put(self, path, data):
+        """Nach dem Schreiben: data als aktuellen Inhalt von path übernehmen."""
+        try:
+            sig = _signature(path)
+        except FileNotFoundError:
+            self.invalidate(path)
+            return data
+        with self._lock:
+            self._entries[path] = (sig, data)
+        return data
+
+    def invalidate(self, path):
+        with self._lock:
+            self._entries.pop(path, None)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits':     self.hits,
+                'misses':   self.misses,
+                'hit_rate': round(self.hits / total, 3) if total else None,
+                'files':    len(self._entries),
+            }
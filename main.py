@@ -1,13 +1,20 @@
-from flask import Flask, request, render_template, redirect, url_for, flash, send_from_directory
+from flask import Flask, request, render_template, redirect, url_for, flash, send_from_directory, jsonify, Response, stream_with_context
 import os
 import json
 import time
 import datetime
-import PyPDF2
+import threading
 from werkzeug.utils import secure_filename
-from home_assistant_api import HomeAssistantAPI  # Importieren Sie die HomeAssistantAPI-Klasse
+from home_assistant_api import HomeAssistantAPI, HAS_WEBSOCKET  # Importieren Sie die HomeAssistantAPI-Klasse
+from ha_sync import HASync
 from urllib.parse import urljoin
-from manual_downloader import find_and_download_manual
+from manual_index import ManualIndex
+from manual_watcher import ManualWatcher
+from pdf_pages import count_pages, PdfPagesError
+from storage import create_storage, FILE_CACHE
+from jobs import JobQueue
+import device_classifier
+import search_cache
 
 app = Flask(__name__,
             static_folder='static',  # Ordner mit statischen Dateien
@@ -156,6 +163,10 @@ def _slice(iterable, start, end=None, step=None):
 UPLOAD_FOLDER = '/data/manuals'
 DEVICES_FILE = '/data/devices/devices.json'
 MANUAL_MAPPING_FILE = '/data/devices/manual_mapping.json'
+MANUAL_INDEX_FILE = '/data/devices/manual_index.json'
+JOBS_FILE = '/data/devices/jobs.json'
+SEARCH_CACHE_FILE = '/data/devices/search_cache.json'
+MANUAL_POLL_INTERVAL = 30  # Sekunden, nur ohne inotify
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(os.path.dirname(DEVICES_FILE), exist_ok=True)
 
@@ -164,9 +175,11 @@ if not os.path.isdir('static'):
     os.makedirs('static', exist_ok=True)
     print("Static-Verzeichnis erstellt")
 
-# Stelle sicher, dass die CSS-Datei existiert
-css_path = os.path.join('static', 'styles.css')
-if not os.path.isfile(css_path):
+# Stelle sicher, dass die CSS-Datei existiert (läuft im Start-Thread, nicht beim Import)
+def _ensure_default_css():
+    css_path = os.path.join('static', 'styles.css')
+    if os.path.isfile(css_path):
+        return
     with open(css_path, 'w') as f:
         f.write("""
 /* Basis-Stil */
@@ -450,20 +463,59 @@ h1, h2, h3 {
         """)
     print("Standard CSS-Datei erstellt")
 
-# Home Assistant API initialisieren
-ha_api = HomeAssistantAPI()
+# Add-on-Optionen (von Home Assistant nach /data/options.json geschrieben)
+OPTIONS_FILE = '/data/options.json'
+
+def _load_addon_options():
+    try:
+        with open(OPTIONS_FILE, 'r') as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+addon_options = _load_addon_options()
+
+# Parallele Anleitungssuchen bei "Alle suchen"
+SEARCH_WORKERS = addon_options.get('search_workers', 4)
+
+# Suchergebnisse (auch erfolglose) search_cache_hours Stunden wiederverwenden; 0 = aus
+search_cache.configure(search_cache.SearchCache(
+    SEARCH_CACHE_FILE, addon_options.get('search_cache_hours', 168) * 3600))
+
+# Speicher-Backend für Geräte, Standorte und Zuordnungen (json oder sqlite)
+LOCATIONS_FILE = '/data/locations.json'
+STORAGE_DB_FILE = '/data/devices/pdf_manuals.db'
+store = create_storage(addon_options.get('storage_backend', 'json'),
+                       DEVICES_FILE, LOCATIONS_FILE, MANUAL_MAPPING_FILE, STORAGE_DB_FILE)
+print(f"Speicher-Backend: {store.name}")
+
+# Eigene Regeln für die Geräteart (optional, im HA-Konfigurationsordner)
+DEVICE_TYPES_FILE = '/config/pdf_manuals/device_types.json'
+device_classifier.configure(device_classifier.load_classifier(DEVICE_TYPES_FILE))
+
+
+# Home Assistant API erst bei Bedarf anlegen (Registry-Antworten werden ha_cache_ttl Sekunden wiederverwendet)
+_ha_api = None
+_ha_api_lock = threading.Lock()
+
+def get_ha_api():
+    global _ha_api
+    with _ha_api_lock:
+        if _ha_api is None:
+            _ha_api = HomeAssistantAPI(cache_ttl=addon_options.get('ha_cache_ttl', 60))
+        return _ha_api
 
 # ---------------------------------
 # HA-Bereiche beim Start übernehmen
 # ---------------------------------
-LOCATIONS_FILE = '/data/locations.json'
 
 def _merge_locations_with_ha():
-    """Lädt Bereiche aus Home Assistant und merged sie in locations.json (keine Duplikate).
-    Wird beim Start einmalig versucht. Fehler führen nur zu Logausgabe, kein Crash.
+    """Lädt Bereiche aus Home Assistant und merged sie in die Standorte (keine Duplikate).
+    Wird beim Start einmalig im Hintergrund versucht. Fehler führen nur zu Logausgabe, kein Crash.
+    Gibt True zurück, wenn HA geantwortet hat.
     """
     try:
-        ha_areas = ha_api.get_areas() or []
+        ha_areas = get_ha_api().get_areas() or []
         ha_names = []
         for a in ha_areas:
             n = (a.get('name') or '').strip()
@@ -472,17 +524,10 @@ def _merge_locations_with_ha():
 
         if not ha_names:
             print("HA-Area-Refresh: Keine Bereiche erhalten – überspringe Merge (verwende bestehenden Cache)")
-            return
+            return False
 
         # Bestehende Locations laden
-        existing = []
-        if os.path.exists(LOCATIONS_FILE):
-            try:
-                with open(LOCATIONS_FILE, 'r') as f:
-                    existing = json.load(f)
-            except Exception as e:
-                print(f"HA-Area-Refresh: Konnte {LOCATIONS_FILE} nicht lesen: {e}")
-                existing = []
+        existing = store.load_locations()
 
         # Set für schnellen Vergleich
         exist_names_lower = { (l.get('name') or '').strip().lower() for l in existing }
@@ -497,36 +542,61 @@ def _merge_locations_with_ha():
 
         if added:
             try:
-                os.makedirs(os.path.dirname(LOCATIONS_FILE), exist_ok=True)
-                with open(LOCATIONS_FILE, 'w') as f:
-                    json.dump(existing, f, indent=4, ensure_ascii=False)
+                store.save_locations(existing)
                 print(f"HA-Area-Refresh: {added} Bereich(e) aus HA hinzugefügt")
             except Exception as e:
-                print(f"HA-Area-Refresh: Speichern von {LOCATIONS_FILE} fehlgeschlagen: {e}")
+                print(f"HA-Area-Refresh: Speichern der Standorte fehlgeschlagen: {e}")
         else:
             print("HA-Area-Refresh: Keine neuen Bereiche – Cache unverändert")
+        return True
     except Exception as e:
         print(f"HA-Area-Refresh: Fehler beim Abruf aus HA: {e}")
+        return False
+
+# Beim Start die HA-Bereiche im Hintergrund mergen, damit Flask sofort antwortet.
+# Nach Ablauf der Frist gilt der Start als abgeschlossen, auch wenn HA noch nicht geantwortet hat.
+HA_STARTUP_DEADLINE = 45  # Sekunden
+ha_startup = {'state': 'pending', 'started': time.monotonic(), 'duration': None}
+
+def _startup_background():
+    """Arbeiten, die den Start nicht aufhalten sollen."""
+    try:
+        _ensure_default_css()
+    except OSError as e:
+        print(f"Standard CSS-Datei konnte nicht erstellt werden: {e}")
+    # Unfertige Suchjobs sofort fortsetzen, nicht erst nach dem HA-Abgleich
+    jobs.start()
+    _startup_ha_merge()
+    _start_ha_sync()
+
+def _startup_ha_merge():
+    try:
+        ok = _merge_locations_with_ha()
+    except Exception as e:
+        print(f"HA-Area-Refresh (Startup) fehlgeschlagen: {e}")
+        ok = False
+    ha_startup['duration'] = round(time.monotonic() - ha_startup['started'], 3)
+    ha_startup['state'] = 'done' if ok else 'failed'
+    if ha_startup['duration'] > HA_STARTUP_DEADLINE:
+        print(f"HA-Area-Refresh: erst nach {ha_startup['duration']} s abgeschlossen (Frist {HA_STARTUP_DEADLINE} s)")
+
+def ha_startup_status():
+    """Zustand des Start-Abgleichs: pending, done, failed oder timeout."""
+    state = ha_startup['state']
+    elapsed = time.monotonic() - ha_startup['started']
+    if state == 'pending' and elapsed > HA_STARTUP_DEADLINE:
+        state = 'timeout'
+    return {'state': state, 'duration': ha_startup['duration'], 'deadline': HA_STARTUP_DEADLINE}
 
-# Beim Start versuchen, die HA-Bereiche zu mergen
-try:
-    _merge_locations_with_ha()
-except Exception as _e:
-    print(f"HA-Area-Refresh (Startup) fehlgeschlagen: {_e}")
 
 # Hilfsfunktion zum Laden der Geräte
 def load_devices():
-    if os.path.exists(DEVICES_FILE):
-        with open(DEVICES_FILE, 'r') as f:
-            return json.load(f)
-    return []
+    return store.load_devices()
 
 # ------------------------------
 # Standorte (Räume) Verwaltung
 # ------------------------------
 
-# Hinweis: LOCATIONS_FILE wurde weiter oben definiert
-
 def _slugify(name: str) -> str:
     """Einfache Slug-Funktion für URL/IDs der Standorte."""
     import re
@@ -539,32 +609,21 @@ def _slugify(name: str) -> str:
     return s or 'unbenannt'
 
 def load_locations():
-    """Lädt die Liste der Standorte. Falls Datei fehlt, wird sie aus Geräten befüllt."""
-    # Seed aus Geräten falls nötig
-    if not os.path.exists(LOCATIONS_FILE):
+    """Lädt die Liste der Standorte. Ist sie leer, wird sie aus Geräten befüllt."""
+    locations = store.load_locations()
+    if not locations:
         seed_locations_from_devices()
-
-    if os.path.exists(LOCATIONS_FILE):
-        try:
-            with open(LOCATIONS_FILE, 'r') as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"Fehler beim Laden von {LOCATIONS_FILE}: {e}")
-    return []
+        locations = store.load_locations()
+    return locations
 
 def save_locations(locations):
-    with open(LOCATIONS_FILE, 'w') as f:
-        json.dump(locations, f, indent=4, ensure_ascii=False)
+    store.save_locations(locations)
 
 def ensure_location_exists(name: str):
     """Stellt sicher, dass ein Standort mit Namen existsiert, sonst wird er angelegt."""
     if not name:
         return
-    locations = load_locations()
-    names_lower = {l['name'].strip().lower() for l in locations}
-    if name.strip().lower() not in names_lower:
-        locations.append({'name': name.strip(), 'slug': _slugify(name)})
-        save_locations(locations)
+    store.ensure_location(name, _slugify(name))
 
 def seed_locations_from_devices():
     """Erzeugt eine Startliste der Standorte aus den vorhandenen Geräten."""
@@ -582,31 +641,35 @@ def seed_locations_from_devices():
         unique.append({'name': loc, 'slug': _slugify(loc)})
     if unique:
         try:
-            os.makedirs(os.path.dirname(LOCATIONS_FILE), exist_ok=True)
             save_locations(unique)
         except Exception as e:
             print(f"Konnte Standorte nicht initial speichern: {e}")
 
 # Hilfsfunktion zum Speichern der Geräte
 def save_devices(devices):
-    with open(DEVICES_FILE, 'w') as f:
-        json.dump(devices, f, indent=4)
+    store.save_devices(devices)
 
 # Hilfsfunktion zum Laden der manuellen Mappings
 def load_manual_mapping():
-    if os.path.exists(MANUAL_MAPPING_FILE):
-        with open(MANUAL_MAPPING_FILE, 'r') as f:
-            return json.load(f)
-    return {}
+    return store.load_manual_mapping()
 
 # Hilfsfunktion zum Speichern der manuellen Mappings
 def save_manual_mapping(mapping):
-    with open(MANUAL_MAPPING_FILE, 'w') as f:
-        json.dump(mapping, f, indent=4)
+    store.save_manual_mapping(mapping)
 
 # Hilfsfunktion zum Abrufen von PDF-Informationen
 def get_pdf_info(filepath):
+    # Schneller Weg: nur Xref/Trailer/Pages lesen, PyPDF2 nur für defekte oder verschlüsselte Dateien
+    try:
+        return count_pages(filepath)
+    except PdfPagesError as e:
+        print(f"Schnelle Seitenzählung für {os.path.basename(filepath)} nicht möglich ({e}), nutze PyPDF2")
+    except OSError as e:
+        print(f"Fehler beim Lesen der PDF-Datei: {e}")
+        return 0
+
     try:
+        import PyPDF2  # erst hier laden – wird nur für Sonderfälle gebraucht
         with open(filepath, 'rb') as f:
             pdf = PyPDF2.PdfReader(f)
             num_pages = len(pdf.pages)
@@ -615,22 +678,53 @@ def get_pdf_info(filepath):
         print(f"Fehler beim Lesen der PDF-Datei: {e}")
         return 0
 
+# Persistenter Metadaten-Index: PDFs werden nur bei Änderungen neu geparst
+manual_index = ManualIndex(UPLOAD_FOLDER, MANUAL_INDEX_FILE, get_pdf_info)
+
+# Ordner im Hintergrund überwachen (share, Samba, automatischer Download)
+manual_watcher = ManualWatcher(manual_index, poll_interval=MANUAL_POLL_INTERVAL)
+manual_watcher.start()
+
+# manual_downloader (requests) erst bei der ersten Suche laden
+MAX_DOWNLOAD_MB = addon_options.get('max_download_mb', 200)
+_downloader = None
+_downloader_lock = threading.Lock()
+
+def get_downloader():
+    global _downloader
+    with _downloader_lock:
+        if _downloader is None:
+            import manual_downloader
+            # Neue Downloads mit bereits berechnetem Hash und Seitenzahl in den Index eintragen
+            manual_downloader.configure(MAX_DOWNLOAD_MB * 1024 * 1024, manual_index.put, SEARCH_WORKERS)
+            _downloader = manual_downloader
+        return _downloader
+
+# Hintergrund-Jobs (Anleitungssuche für viele Geräte); Zustand liegt in JOBS_FILE
+jobs = JobQueue(JOBS_FILE, store, UPLOAD_FOLDER, SEARCH_WORKERS, get_downloader)
+
+# Optional: HA-Geräte und -Bereiche per Registry-Events laufend abgleichen
+HA_SYNC_ENABLED = bool(addon_options.get('ha_sync', False))
+ha_sync = None
+
+def _start_ha_sync():
+    global ha_sync
+    if not HA_SYNC_ENABLED:
+        return
+    if not HAS_WEBSOCKET:
+        print("HA-Sync: benötigt websocket-client, bleibt deaktiviert")
+        return
+    ha_sync = HASync(get_ha_api(), store, _slugify)
+    ha_sync.start()
+
+threading.Thread(target=_startup_background, name='startup', daemon=True).start()
+
 # Hilfsfunktion zum Laden der Anleitungen
 def load_manuals():
-    manuals = []
-    for filename in os.listdir(UPLOAD_FOLDER):
-        if filename.lower().endswith('.pdf'):
-            filepath = os.path.join(UPLOAD_FOLDER, filename)
-            filesize = os.path.getsize(filepath)
-            pages = get_pdf_info(filepath)
-            timestamp = os.path.getctime(filepath)
-            manuals.append({
-                'name': filename,
-                'size': filesize,
-                'pages': pages,
-                'timestamp': timestamp
-            })
-    return sorted(manuals, key=lambda x: x['timestamp'])
+    # Nach dem ersten Abgleich hält der Watcher den Snapshot aktuell
+    if manual_watcher.ready:
+        return manual_index.manuals()
+    return manual_index.refresh()
 
 # Direkter Zugriff auf statische Dateien
 @app.route('/static/<path:filename>')
@@ -657,9 +751,37 @@ def serve_static(filename):
 def healthcheck():
     return "OK", 200
 
+# Bereitschaft: HA-Abgleich und Anleitungs-Index sind geladen (503 solange nicht)
+@app.route('/readiness')
+def readiness():
+    ha = ha_startup_status()
+    checks = {
+        'ha_startup': ha,
+        'ha_sync': {'enabled': HA_SYNC_ENABLED, 'ready': ha_sync.ready if ha_sync else None},
+        'manual_index': {'ready': manual_watcher.ready, 'mode': manual_watcher.mode},
+    }
+    ready = (ha['state'] != 'pending'
+             and (not HA_SYNC_ENABLED or not HAS_WEBSOCKET or (ha_sync is not None and ha_sync.ready))
+             and manual_watcher.ready)
+    return jsonify(dict(checks, ready=ready)), 200 if ready else 503
+
+# Laufzeit-Statistiken (Cache-Zähler) als JSON
+@app.route('/stats')
+def stats():
+    return jsonify({
+        'storage': store.name,
+        'json_cache': FILE_CACHE.stats(),
+        'ha_cache': _ha_api.cache_stats() if _ha_api else None,
+        'device_classifier': device_classifier.cache_info()._asdict(),
+        'ha_sync': ha_sync.stats() if ha_sync else None,
+        'jobs': jobs.stats(),
+        'search_cache': search_cache.get_cache().stats(),
+        'manual_search': _downloader.stats() if _downloader else None,
+    })
+
 @app.route('/')
 def index():
-    devices = load_devices()
+    devices = store.list_devices()
     manuals = load_manuals()
     manual_mapping = load_manual_mapping()
     return render_template('index.html', devices=devices, manuals=manuals, manual_mapping=manual_mapping)
@@ -671,28 +793,22 @@ def list_manuals():
 
 @app.route('/devices')
 def list_devices():
-    all_devices = load_devices()
-
     # Flag, ob irgendein Gerät aus HA importiert wurde (für Spaltenanzeige)
-    any_ha = any(d.get('ha_imported') for d in all_devices)
+    any_ha = store.has_ha_devices()
 
     # Query-Parameter: location-Filter und Sortierung
     selected_location = request.args.get('location')
     sort_by = request.args.get('sort', 'name')  # 'name' oder 'location'
 
-    # Liste der verfügbaren Standorte (alphabetisch) aus locations.json (Fallback: aus Geräten)
+    # Liste der verfügbaren Standorte (alphabetisch) aus dem Speicher (Fallback: aus Geräten)
     loc_entries = load_locations()
     if loc_entries:
         locations = [l['name'] for l in loc_entries]
     else:
-        locations = sorted({(d.get('location') or '').strip() for d in all_devices if d.get('location')})
-
-    # View-Model erstellen: originale Indizes beibehalten
-    view_devices = [{'idx': i, **d} for i, d in enumerate(all_devices)]
+        locations = sorted(store.location_counts())
 
-    # Filtern nach Standort
-    if selected_location:
-        view_devices = [d for d in view_devices if (d.get('location') or '') == selected_location]
+    # Filter nach Standort im Backend
+    view_devices = store.list_devices(selected_location or None)
 
     # Sortieren
     if sort_by == 'location':
@@ -707,24 +823,18 @@ def list_devices():
         locations=locations,
         selected_location=selected_location,
         sort_by=sort_by,
-        any_ha=any_ha
+        any_ha=any_ha,
+        job_id=request.args.get('job') or jobs.active_job_id()
     )
 
 @app.route('/locations')
 def list_locations_view():
-    """Verwaltet Standorte: zeigt Liste aus locations.json inkl. Geräteanzahl und Aktionen."""
-    # sicherstellen, dass initiale Standorte vorhanden sind
-    seed_locations_from_devices()
-    devices = load_devices()
+    """Verwaltet Standorte: zeigt Liste der Standorte inkl. Geräteanzahl und Aktionen."""
+    # load_locations() legt initiale Standorte aus den Geräten an, falls noch keine existieren
     locations = load_locations()
 
-    # Anzahl Geräte pro Standort berechnen
-    counts = {}
-    for d in devices:
-        loc_name = (d.get('location') or '').strip()
-        if not loc_name:
-            continue
-        counts[loc_name] = counts.get(loc_name, 0) + 1
+    # Anzahl Geräte pro Standort
+    counts = store.location_counts()
 
     # Liste mit count anreichern
     enriched = []
@@ -739,9 +849,7 @@ def list_locations_view():
 @app.route('/locations/<path:location>')
 def list_devices_by_location(location):
     """Zeigt Geräte eines einzelnen Standorts"""
-    all_devices = load_devices()
-    # View-Model mit Original-Index
-    view_devices = [{'idx': i, **d} for i, d in enumerate(all_devices) if (d.get('location') or '') == location]
+    view_devices = store.list_devices(location)
 
     # Spaltenanzeige-Flag
     any_ha = any(d.get('ha_imported') for d in view_devices)
@@ -805,18 +913,12 @@ def edit_location(slug):
         old_name = loc['name']
         loc['name'] = new_name
         loc['slug'] = new_slug
-        save_locations(locations)
+        with store.batch():
+            save_locations(locations)
 
-        if cascade and old_name != new_name:
-            # Geräte umziehen
-            devices = load_devices()
-            changed = False
-            for d in devices:
-                if (d.get('location') or '') == old_name:
-                    d['location'] = new_name
-                    changed = True
-            if changed:
-                save_devices(devices)
+            if cascade and old_name != new_name:
+                # Geräte umziehen
+                store.rename_location(old_name, new_name)
         flash('Standort wurde aktualisiert')
         return redirect(custom_url_for('list_locations_view'))
 
@@ -832,9 +934,7 @@ def delete_location(slug):
         return redirect(custom_url_for('list_locations_view'))
 
     # Prüfen, ob genutzt
-    devices = load_devices()
-    used = any((d.get('location') or '').strip().lower() == loc['name'].strip().lower() for d in devices)
-    if used:
+    if store.location_in_use(loc['name']):
         flash('Standort kann nicht gelöscht werden, da ihm Geräte zugeordnet sind')
         return redirect(custom_url_for('list_locations_view'))
 
@@ -849,7 +949,7 @@ def delete_location(slug):
 def import_locations_from_ha():
     """Importiert Bereiche aus Home Assistant als Standorte (Merge, keine Duplikate)."""
     try:
-        ha_areas = ha_api.get_areas()
+        ha_areas = get_ha_api().get_areas()
         names = [a['name'] for a in ha_areas if a.get('name')]
         if not names:
             flash('Keine Bereiche aus Home Assistant gefunden')
@@ -893,6 +993,7 @@ def upload_manual():
                 return redirect(custom_url_for('upload_manual'))
             
             file.save(filepath)
+            manual_index.update(filename)
             flash('Anleitung erfolgreich hochgeladen')
             return redirect(custom_url_for('list_manuals'))
         else:
@@ -909,15 +1010,12 @@ def view_manual(filename):
 def delete_manual(filename):
     filepath = os.path.join(UPLOAD_FOLDER, filename)
     if os.path.exists(filepath):
-        # Überprüfen, ob die Anleitung einem Gerät zugeordnet ist
-        devices = load_devices()
-        for device in devices:
-            if device.get('manual') == filename:
-                device['manual'] = None
-        save_devices(devices)
+        # Zuordnung bei allen Geräten mit dieser Anleitung entfernen
+        store.clear_manual(filename)
         
         # Löschen der Datei
         os.remove(filepath)
+        manual_index.remove(filename)
         flash(f'Anleitung {filename} wurde gelöscht')
     else:
         flash(f'Anleitung {filename} wurde nicht gefunden')
@@ -936,9 +1034,6 @@ def add_device():
             flash('Bitte füllen Sie alle Pflichtfelder aus')
             return redirect(custom_url_for('add_device'))
 
-        # Standort sicherstellen/anlegen
-        ensure_location_exists(location)
-
         # Neues Gerät erstellen
         new_device = {
             'name': name,
@@ -947,10 +1042,12 @@ def add_device():
             'manual': manual if manual else None
         }
 
-        # Gerät zur Liste hinzufügen
-        devices = load_devices()
-        devices.append(new_device)
-        save_devices(devices)
+        with store.batch():
+            # Standort sicherstellen/anlegen
+            ensure_location_exists(location)
+
+            # Gerät hinzufügen
+            store.add_devices([new_device])
 
         flash('Gerät erfolgreich hinzugefügt')
         return redirect(custom_url_for('list_devices'))
@@ -964,11 +1061,11 @@ def add_device():
 
     return render_template('add_device.html', manuals=manuals, locations=locations)
 
-@app.route('/edit_device/<int:device_id>', methods=['GET', 'POST'])
+@app.route('/edit_device/<device_id>', methods=['GET', 'POST'])
 def edit_device(device_id):
-    devices = load_devices()
+    device = store.get_device(device_id)
 
-    if device_id < 0 or device_id >= len(devices):
+    if device is None:
         flash('Gerät nicht gefunden')
         return redirect(custom_url_for('list_devices'))
 
@@ -982,16 +1079,17 @@ def edit_device(device_id):
             flash('Bitte füllen Sie alle Pflichtfelder aus')
             return redirect(custom_url_for('edit_device', device_id=device_id))
 
-        # Standort sicherstellen/anlegen
-        ensure_location_exists(location)
-
-        # Gerät aktualisieren
-        devices[device_id]['name'] = name
-        devices[device_id]['type'] = device_type
-        devices[device_id]['location'] = location
-        devices[device_id]['manual'] = manual if manual else None
-
-        save_devices(devices)
+        with store.batch():
+            # Standort sicherstellen/anlegen
+            ensure_location_exists(location)
+
+            # Gerät aktualisieren
+            store.update_devices({device_id: {
+                'name': name,
+                'type': device_type,
+                'location': location,
+                'manual': manual if manual else None
+            }})
         flash('Gerät erfolgreich aktualisiert')
         return redirect(custom_url_for('list_devices'))
 
@@ -1002,18 +1100,14 @@ def edit_device(device_id):
     loc_entries = load_locations()
     locations = [l['name'] for l in loc_entries] if loc_entries else []
 
-    return render_template('edit_device.html', device=devices[device_id], device_id=device_id, manuals=manuals, locations=locations)
+    return render_template('edit_device.html', device=device, device_id=device_id, manuals=manuals, locations=locations)
 
-@app.route('/delete_device/<int:device_id>')
+@app.route('/delete_device/<device_id>')
 def delete_device(device_id):
-    devices = load_devices()
-
-    if device_id < 0 or device_id >= len(devices):
-        flash('Gerät nicht gefunden')
-    else:
-        devices.pop(device_id)
-        save_devices(devices)
+    if store.delete_devices([device_id]):
         flash('Gerät erfolgreich gelöscht')
+    else:
+        flash('Gerät nicht gefunden')
 
     return redirect(custom_url_for('list_devices'))
 
@@ -1021,53 +1115,55 @@ def delete_device(device_id):
 def import_ha_devices():
     """Importiert Geräte aus Home Assistant"""
     try:
-        # Aktuelle Geräte laden
-        current_devices = load_devices()
-        
         # Vorhandene Geräte-IDs abrufen, um Duplikate zu vermeiden
-        existing_ids = {device.get('id') for device in current_devices if 'id' in device}
+        existing_ids = store.device_ids()
+        new_devices = []
         
         # Bereiche aus Home Assistant abrufen (für Standortzuordnung)
-        ha_areas = ha_api.get_areas()
+        ha_areas = get_ha_api().get_areas()
         area_names = [area['name'] for area in ha_areas]
 
         # Geräte aus Home Assistant abrufen
-        ha_devices = ha_api.get_devices()
+        ha_devices = get_ha_api().get_devices()
         imported_count = 0
 
-        for device in ha_devices:
-            if device['id'] not in existing_ids:
-                # Standort des Geräts verarbeiten
-                location = device['location']
-
-                # Prüfen, ob der Standort in den bekannten Bereichen existiert
-                # Wenn nicht, behalten wir ihn trotzdem bei
-                if location == 'Unbekannt' and 'friendly_name' in device and ' ' in device['name']:
-                    # Versuchen, den Standort aus dem Namen zu extrahieren
-                    possible_location = device['name'].split(' ')[0]
-                    if len(possible_location) > 3 and possible_location not in ['Der', 'Die', 'Das']:
-                        location = possible_location
-
-                # Standort in Locations-Datei sicherstellen
-                ensure_location_exists(location)
-
-                # Erstellen Sie ein neues Gerät im Format Ihrer Anwendung
-                new_device = {
-                    'id': device['id'],
-                    'name': device['name'],
-                    'type': device['type'],
-                    'location': location,  # Verwende den extrahierten oder originalen Standort
-                    'manual': None,  # Keine Anleitung zugewiesen
-                    'manufacturer': device['manufacturer'],
-                    'model': device['model'],
-                    'ha_imported': True  # Markieren als aus HA importiert
-                }
-                current_devices.append(new_device)
-                imported_count += 1
-        
-        # Speichern der aktualisierten Geräteliste
-        save_devices(current_devices)
-        
+        # Alle Standorte und Geräte in einem Schreibvorgang speichern statt einmal pro Gerät
+        with store.batch():
+            for device in ha_devices:
+                if device['id'] not in existing_ids:
+                    # Standort des Geräts verarbeiten
+                    location = device['location']
+
+                    # Prüfen, ob der Standort in den bekannten Bereichen existiert
+                    # Wenn nicht, behalten wir ihn trotzdem bei
+                    if location == 'Unbekannt' and 'friendly_name' in device and ' ' in device['name']:
+                        # Versuchen, den Standort aus dem Namen zu extrahieren
+                        possible_location = device['name'].split(' ')[0]
+                        if len(possible_location) > 3 and possible_location not in ['Der', 'Die', 'Das']:
+                            location = possible_location
+
+                    # Standort in Locations-Datei sicherstellen
+                    ensure_location_exists(location)
+
+                    # Erstellen Sie ein neues Gerät im Format Ihrer Anwendung
+                    new_device = {
+                        'id': device['id'],
+                        'name': device['name'],
+                        'type': device['type'],
+                        'location': location,  # Verwende den extrahierten oder originalen Standort
+                        'manual': None,  # Keine Anleitung zugewiesen
+                        'manufacturer': device['manufacturer'],
+                        'model': device['model'],
+                        'ha_imported': True  # Markieren als aus HA importiert
+                    }
+                    new_devices.append(new_device)
+                    existing_ids.add(device['id'])
+                    imported_count += 1
+
+            # Neue Geräte speichern
+            if new_devices:
+                store.add_devices(new_devices)
+
         flash(f'{imported_count} Geräte aus Home Assistant importiert.')
         return redirect(custom_url_for('list_devices'))
     
@@ -1078,8 +1174,6 @@ def import_ha_devices():
 @app.route('/delete_multiple_devices', methods=['POST'])
 def delete_multiple_devices():
     """Löscht mehrere ausgewählte Geräte"""
-    devices = load_devices()
-
     # Ausgewählte Geräte-IDs aus dem Formular erhalten
     device_ids = request.form.getlist('device_ids')
 
@@ -1087,21 +1181,8 @@ def delete_multiple_devices():
         flash('Keine Geräte zum Löschen ausgewählt')
         return redirect(custom_url_for('list_devices'))
 
-    # In Zahlen umwandeln und absteigend sortieren (wichtig für korrektes Löschen)
-    device_ids = [int(device_id) for device_id in device_ids]
-    device_ids.sort(reverse=True)
-
-    # Zähler für gelöschte Geräte
-    deleted_count = 0
-
-    # Geräte aus der Liste entfernen (von hinten nach vorne)
-    for device_id in device_ids:
-        if 0 <= device_id < len(devices):
-            devices.pop(device_id)
-            deleted_count += 1
-
-    # Geräteliste speichern
-    save_devices(devices)
+    # Über die stabilen IDs löschen
+    deleted_count = store.delete_devices(device_ids)
 
     flash(f'{deleted_count} Gerät(e) erfolgreich gelöscht')
     return redirect(custom_url_for('list_devices'))
@@ -1109,16 +1190,12 @@ def delete_multiple_devices():
 @app.route('/delete_all_devices')
 def delete_all_devices():
     """Löscht alle Geräte"""
-    devices = load_devices()
-    count = len(devices)
+    count = store.delete_all_devices()
 
     if count == 0:
         flash('Keine Geräte zum Löschen vorhanden')
         return redirect(custom_url_for('list_devices'))
 
-    # Leere Geräteliste speichern
-    save_devices([])
-
     flash(f'Alle {count} Geräte wurden gelöscht')
     return redirect(custom_url_for('list_devices'))
 
@@ -1127,23 +1204,22 @@ def debug_ha():
     """Zeigt rohe HA-Gerätedaten zur Fehlersuche."""
     import json as _json
     try:
-        devices = ha_api.get_devices()
-        areas   = ha_api.get_areas()
+        devices = get_ha_api().get_devices()
+        areas   = get_ha_api().get_areas()
         return f"<pre>Geräte ({len(devices)}):\n{_json.dumps(devices[:10], indent=2, ensure_ascii=False)}\n\nBereiche ({len(areas)}):\n{_json.dumps(areas, indent=2, ensure_ascii=False)}</pre>"
     except Exception as e:
         return f"<pre>Fehler: {e}</pre>", 500
 
 
-@app.route('/search_manual/<int:device_id>')
+@app.route('/search_manual/<device_id>')
 def search_manual_for_device(device_id):
     """Sucht und lädt automatisch eine Anleitung für ein einzelnes Gerät herunter."""
-    devices = load_devices()
-    if device_id < 0 or device_id >= len(devices):
+    device = store.get_device(device_id)
+    if device is None:
         flash('Gerät nicht gefunden')
         return redirect(custom_url_for('list_devices'))
 
-    device = devices[device_id]
-    filename, error = find_and_download_manual(
+    filename, error = get_downloader().find_and_download_manual(
         device.get('name', ''),
         device.get('manufacturer', 'Unbekannt'),
         device.get('model', 'Unbekannt'),
@@ -1151,8 +1227,7 @@ def search_manual_for_device(device_id):
     )
 
     if filename:
-        devices[device_id]['manual'] = filename
-        save_devices(devices)
+        store.update_devices({device_id: {'manual': filename}})
         flash(f'Anleitung "{filename}" erfolgreich gefunden und heruntergeladen')
     else:
         flash(f'Anleitung nicht gefunden: {error}')
@@ -1162,34 +1237,62 @@ def search_manual_for_device(device_id):
 
 @app.route('/auto_search_manuals')
 def auto_search_manuals():
-    """Sucht und lädt Anleitungen für alle Geräte ohne zugewiesene Anleitung."""
-    devices = load_devices()
-    success_count = 0
-    fail_count = 0
-
-    for i, device in enumerate(devices):
-        if device.get('manual'):
-            continue  # Bereits eine Anleitung vorhanden
-
-        filename, error = find_and_download_manual(
-            device.get('name', ''),
-            device.get('manufacturer', 'Unbekannt'),
-            device.get('model', 'Unbekannt'),
-            UPLOAD_FOLDER
-        )
-
-        if filename:
-            devices[i]['manual'] = filename
-            success_count += 1
-        else:
-            fail_count += 1
-            print(f"Kein Manual für '{device.get('name')}': {error}")
+    """Startet einen Hintergrund-Job für alle Geräte ohne zugewiesene Anleitung."""
+    pending = [d for d in store.list_devices() if not d.get('manual')]
+    if not pending:
+        flash('Alle Geräte haben bereits eine Anleitung')
+        return redirect(custom_url_for('list_devices'))
 
-        time.sleep(1)  # Rate-Limiting
+    job_id, created = jobs.submit_manual_search(pending)
+    if created:
+        flash(f'Suche für {len(pending)} Gerät(e) gestartet')
+    else:
+        flash('Es läuft bereits eine Suche')
+    return redirect(custom_url_for('list_devices', job=job_id))
+
+
+# Fortschritt der Hintergrund-Jobs
+@app.route('/jobs')
+def list_jobs():
+    return jsonify(jobs.list_jobs())
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Zustand eines Jobs; mit ?since=<version> nur die seitdem geänderten Geräte."""
+    snapshot = jobs.snapshot(job_id, request.args.get('since', 0, type=int))
+    if snapshot is None:
+        return jsonify({'error': 'Job nicht gefunden'}), 404
+    return jsonify(snapshot)
+
+@app.route('/jobs/<job_id>/events')
+def job_events(job_id):
+    """Server-Sent Events: ein Event pro Änderung, bis der Job abgeschlossen ist."""
+    since = request.headers.get('Last-Event-ID', request.args.get('since', 0, type=int), type=int)
+    if jobs.snapshot(job_id, since) is None:
+        return jsonify({'error': 'Job nicht gefunden'}), 404
+
+    def stream(since):
+        while True:
+            snapshot = jobs.snapshot(job_id, since)
+            if snapshot is None:
+                return
+            if snapshot['version'] > since:
+                since = snapshot['version']
+                yield f"id: {since}\ndata: {json.dumps(snapshot, ensure_ascii=False)}\n\n"
+            else:
+                yield ": keepalive\n\n"
+            if snapshot['state'] not in ('queued', 'running', 'cancelling'):
+                return
+            jobs.wait_for_change(job_id, since, 15)
 
-    save_devices(devices)
-    flash(f'{success_count} Anleitung(en) heruntergeladen, {fail_count} nicht gefunden')
-    return redirect(custom_url_for('list_devices'))
+    return Response(stream_with_context(stream(since)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    if not jobs.cancel(job_id):
+        return jsonify({'cancelled': False, 'error': 'Job nicht aktiv'}), 409
+    return jsonify({'cancelled': True})
 
 
 if __name__ == '__main__':
@@ -1197,4 +1300,6 @@ if __name__ == '__main__':
     # In Produktion würde man hier einen WSGI-Server wie Gunicorn verwenden
     port = int(os.environ.get('PORT', 8099))
     print(f"Starting Flask app on port {port}")
-    app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
+    # Ohne Reloader: er würde main.py in einem zweiten Prozess erneut importieren
+    # und alle Hintergrund-Threads doppelt starten
+    app.run(host='0.0.0.0', port=port, debug=True, use_reloader=False)
\ No newline at end of file
@@ -1,16 +1,58 @@
 """
 Automatische Anleitung-Suche und -Download.
 
-Strategie (in dieser Reihenfolge):
+Quellen (in dieser Reihenfolge bevorzugt):
   1. manualslib.com  – größte Handbuch-Datenbank
   2. DuckDuckGo Lite – sucht nach direkten PDF-Links im Web
+
+Die Quellen laufen gestaffelt parallel: manualslib.com startet sofort,
+DuckDuckGo spätestens nach HEDGE_DELAY Sekunden (oder sobald manualslib
+erfolglos zurückkommt). Der erste gefundene PDF-Link gewinnt, die übrigen
+Suchen werden abgebrochen. Pro Gerät gilt eine Gesamtfrist von
+SEARCH_DEADLINE Sekunden.
+
+Jede Quelle hat einen Circuit Breaker: nach BREAKER_FAILURES Fehlern bzw.
+BREAKER_EMPTY leeren Ergebnissen in Folge (z.B. Rate-Limit oder geändertes
+Seitenlayout) wird sie BREAKER_COOLDOWN Sekunden übersprungen und danach
+mit einer einzelnen Probe-Anfrage (half-open) erneut getestet.
+
+Downloads werden schon beim Empfang geprüft (Content-Length, %PDF- im
+ersten Block, Höchstgröße) und sofort abgebrochen, wenn etwas nicht passt.
+Die Datei entsteht als .part-Datei und wird erst nach erfolgreicher
+Prüfung umbenannt; SHA-256 wird dabei mitgerechnet. Bricht die Verbindung
+ab, bleibt die .part-Datei samt ETag/Last-Modified (.part.json) liegen und
+der nächste Versuch setzt per Range-Anfrage fort – sofern der Server das
+unterstützt und die Datei sich nicht geändert hat, sonst beginnt er neu.
+
+Für viele Geräte ruft die Job-Queue (jobs.py) find_and_download_manual()
+aus einer begrenzten Zahl von Threads auf. Jede Anfrage holt vorher ein
+Token aus dem Token-Bucket ihres Hosts, sodass die Last pro Seite begrenzt
+bleibt, egal wie viele Threads laufen. Gleichzeitige Suchen nach demselben Begriff
+teilen sich eine Netzwerkoperation (Single-Flight); Suchen, die auf
+denselben Dateinamen führen, laufen nacheinander.
+
+Ergebnisse werden im Such-Cache (search_cache.py) gemerkt – auch
+erfolglose Suchen. Wiederholte Läufe fragen das Netz nur für neue oder
+abgelaufene Suchbegriffe.
 """
 
+import contextlib
+import hashlib
+import json
 import os
 import re
+import threading
 import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
 import requests
-from bs4 import BeautifulSoup
+
+import search_cache
+from html_links import iter_links
+from json_cache import write_json_atomic
+from pdf_pages import count_pages, PdfPagesError
 
 HEADERS = {
     'User-Agent': (
@@ -22,11 +64,326 @@ HEADERS = {
     'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
 }
 
-SESSION = requests.Session()
-SESSION.headers.update(HEADERS)
-
 MANUALSLIB = 'https://www.manualslib.com'
 
+# Anfragen pro Sekunde und Burst je Host
+HOST_RATE_LIMITS = {
+    'www.manualslib.com':  (1.0, 2),
+    'pdf.manualslib.com':  (1.0, 2),
+    'lite.duckduckgo.com': (0.5, 1),
+}
+DEFAULT_RATE_LIMIT = (2.0, 4)
+DEFAULT_WORKERS = 4
+
+HEDGE_DELAY = 4.0        # Sekunden, bis die nächste Quelle parallel startet
+SEARCH_DEADLINE = 60.0   # Sekunden Gesamtfrist für die Suche eines Geräts
+LATENCY_SAMPLES = 200
+
+BREAKER_FAILURES = 5     # Fehler in Folge bis zum Öffnen
+BREAKER_EMPTY = 20       # leere Ergebnisse in Folge bis zum Öffnen
+BREAKER_COOLDOWN = 300   # Sekunden, die eine geöffnete Quelle übersprungen wird
+
+CHUNK_SIZE = 64 * 1024
+MIN_PDF_SIZE = 5120                  # kleiner → Fehlerseite statt PDF
+DEFAULT_MAX_DOWNLOAD = 200 * 1024 * 1024
+PDF_MAGIC = b'%PDF-'
+
+_MANUAL_PATH_RE = re.compile(r'/manual-\d+/')
+_PDF_LINK_RE = re.compile(r'\.pdf(\?|$)', re.IGNORECASE)
+MAGIC_WINDOW = 1024                  # %PDF- darf laut Spezifikation etwas später stehen
+
+# Von main.py per configure() gesetzt
+_max_download = DEFAULT_MAX_DOWNLOAD
+_on_download = None
+_search_workers = DEFAULT_WORKERS
+
+# Quellen-Pool, wird beim ersten Zugriff passend zu _search_workers angelegt
+_provider_pool = None
+_provider_pool_lock = threading.Lock()
+
+
+def configure(max_download=DEFAULT_MAX_DOWNLOAD, on_download=None, search_workers=DEFAULT_WORKERS):
+    """
+    max_download:   Höchstgröße einer PDF in Bytes.
+    on_download:    Callback (dateiname, seiten, sha256) nach jedem erfolgreichen Download.
+    search_workers: Zahl gleichzeitiger Suchen; bestimmt die Größe des Quellen-Pools.
+    """
+    global _max_download, _on_download, _search_workers, _provider_pool
+    _max_download = max_download
+    _on_download = on_download
+    with _provider_pool_lock:
+        _search_workers = max(1, search_workers)
+        if _provider_pool is not None:
+            # Wird beim nächsten Zugriff in passender Größe neu angelegt
+            _provider_pool.shutdown(wait=False)
+            _provider_pool = None
+
+
+class SearchError(Exception):
+    """Eine Quelle war nicht erreichbar – das ist kein "nicht gefunden"."""
+
+
+class ManualNotFound(str):
+    """
+    Fehlermeldung für "alle Quellen haben geantwortet, aber nichts gefunden".
+
+    Als str-Unterklasse bleibt die Rückgabe (filename, error_message)
+    unverändert; Aufrufer unterscheiden per isinstance() zwischen "nicht
+    gefunden" und Fehlern (Timeout, Quelle nicht erreichbar, Download).
+    """
+
+
+class TokenBucket:
+    """Klassischer Token-Bucket: rate Tokens pro Sekunde, höchstens burst auf Vorrat."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Blockiert, bis ein Token verfügbar ist."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """Circuit Breaker einer Quelle: closed → open → half_open → closed/open."""
+
+    def __init__(self, name, failures=BREAKER_FAILURES, empty=BREAKER_EMPTY, cooldown=BREAKER_COOLDOWN):
+        self.name = name
+        self.failure_threshold = failures
+        self.empty_threshold = empty
+        self.cooldown = cooldown
+        self.state = 'closed'
+        self.reason = None
+        self.failures = 0
+        self.empty = 0
+        self.trips = 0
+        self.rejected = 0
+        self._opened = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """True, wenn die Quelle angefragt werden darf (im half-open-Zustand nur eine Probe)."""
+        with self._lock:
+            if self.state == 'open' and time.monotonic() - self._opened >= self.cooldown:
+                self.state = 'half_open'
+                print("Circuit Breaker {}: half-open, teste mit einer Anfrage".format(self.name))
+            if self.state == 'closed' or (self.state == 'half_open' and not self._probing):
+                self._probing = self.state == 'half_open'
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, outcome):
+        """Ergebnis einer erlaubten Anfrage: hit, empty, error oder cancelled."""
+        with self._lock:
+            probe, self._probing = self._probing, False
+            if outcome == 'hit':
+                self.failures = self.empty = 0
+                if self.state != 'closed':
+                    print("Circuit Breaker {}: geschlossen".format(self.name))
+                self.state, self.reason = 'closed', None
+            elif outcome == 'error':
+                self.failures += 1
+                if probe or self.failures >= self.failure_threshold:
+                    self._trip('error')
+            elif outcome == 'empty':
+                self.failures = 0
+                self.empty += 1
+                if probe and self.reason == 'error':
+                    # Quelle antwortet wieder; leere Treffer allein sagen nichts Schlechtes
+                    self.state, self.reason = 'closed', None
+                    print("Circuit Breaker {}: geschlossen".format(self.name))
+                elif (probe and self.reason == 'empty') or self.empty >= self.empty_threshold:
+                    self._trip('empty')
+
+    def _trip(self, reason):
+        if self.state != 'open':
+            self.trips += 1
+            print("Circuit Breaker {}: geöffnet ({}), Pause {} s".format(self.name, reason, self.cooldown))
+        self.state, self.reason = 'open', reason
+        self._opened = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            retry_in = None
+            if self.state == 'open':
+                retry_in = max(0, round(self.cooldown - (time.monotonic() - self._opened)))
+            return {
+                'state':    self.state,
+                'reason':   self.reason,
+                'failures': self.failures,
+                'empty':    self.empty,
+                'trips':    self.trips,
+                'rejected': self.rejected,
+                'retry_in': retry_in,
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def _breaker(provider):
+    with _breakers_lock:
+        breaker = _breakers.get(provider)
+        if breaker is None:
+            breaker = _breakers[provider] = CircuitBreaker(provider)
+        return breaker
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+_local = threading.local()
+
+
+def _bucket(host):
+    with _buckets_lock:
+        bucket = _buckets.get(host)
+        if bucket is None:
+            bucket = _buckets[host] = TokenBucket(*HOST_RATE_LIMITS.get(host, DEFAULT_RATE_LIMIT))
+        return bucket
+
+
+def _session():
+    """Eine requests.Session pro Thread (Session ist nicht threadsicher)."""
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = _local.session = requests.Session()
+        session.headers.update(HEADERS)
+    return session
+
+
+def _get(url, **kwargs):
+    """GET mit Rate-Limit des Ziel-Hosts.
+
+    Innerhalb einer Quellen-Suche wird abgebrochen, sobald eine andere Quelle
+    gewonnen hat, und der Timeout auf die restliche Frist gekürzt.
+    """
+    _check_cancelled()
+    _bucket(urlsplit(url).hostname or '').acquire()
+    _check_cancelled()
+    deadline = getattr(_local, 'deadline', None)
+    if deadline is not None:
+        kwargs['timeout'] = min(kwargs.get('timeout', SEARCH_DEADLINE), max(deadline - time.monotonic(), 0.1))
+    return _session().get(url, **kwargs)
+
+
+def _check_cancelled():
+    cancel = getattr(_local, 'cancel', None)
+    if cancel is not None and cancel.is_set():
+        raise SearchError("Suche abgebrochen")
+    deadline = getattr(_local, 'deadline', None)
+    if deadline is not None and time.monotonic() >= deadline:
+        raise SearchError("Frist für die Suche abgelaufen")
+
+
+# Single-Flight: gleichzeitige Suchen nach demselben Begriff teilen sich eine
+# Netzwerkoperation, statt nacheinander dieselbe Suche zu wiederholen
+_inflight = {}              # Suchschlüssel → Future des laufenden Aufrufs
+_inflight_lock = threading.Lock()
+_coalesced = 0
+
+
+def _single_flight(key, func, *args):
+    """Führt func nur einmal pro key gleichzeitig aus; weitere Aufrufer erhalten dasselbe Ergebnis."""
+    global _coalesced
+    with _inflight_lock:
+        future = _inflight.get(key)
+        owner = future is None
+        if owner:
+            future = _inflight[key] = Future()
+        else:
+            _coalesced += 1
+    if not owner:
+        return future.result()
+    try:
+        result = func(*args)
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        with _inflight_lock:
+            del _inflight[key]
+
+
+# Verschiedene Suchbegriffe können auf denselben Dateinamen führen
+# ("Philips Hue" / "philips-hue"); Ziel- und .part-Datei gehören dann immer
+# nur einem Aufruf
+_file_locks = {}            # Dateiname → [Lock, Anzahl Nutzer]
+_file_locks_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def _file_lock(filename):
+    with _file_locks_lock:
+        entry = _file_locks.setdefault(filename, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _file_locks_lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del _file_locks[filename]
+
+
+# Latenzen und Ergebnisse je Quelle
+_provider_stats = {}
+_provider_stats_lock = threading.Lock()
+
+
+def _record(provider, outcome, seconds):
+    _breaker(provider).record(outcome)
+    with _provider_stats_lock:
+        entry = _provider_stats.get(provider)
+        if entry is None:
+            entry = _provider_stats[provider] = {
+                'hit': 0, 'empty': 0, 'error': 0, 'cancelled': 0,
+                'latencies': deque(maxlen=LATENCY_SAMPLES),
+            }
+        entry[outcome] += 1
+        if outcome != 'cancelled':
+            entry['latencies'].append(seconds)
+
+
+def stats():
+    with _inflight_lock:
+        result = {'inflight': len(_inflight), 'coalesced': _coalesced}
+    providers = {}
+    with _provider_stats_lock:
+        for provider, entry in _provider_stats.items():
+            latencies = sorted(entry['latencies'])
+            providers[provider] = {k: v for k, v in entry.items() if k != 'latencies'}
+            if latencies:
+                providers[provider].update(
+                    avg_ms=round(1000 * sum(latencies) / len(latencies)),
+                    p50_ms=round(1000 * latencies[len(latencies) // 2]),
+                    p95_ms=round(1000 * latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]),
+                )
+    result['providers'] = providers
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    result['breakers'] = {b.name: b.stats() for b in breakers}
+    return result
+
 
 # -----------------------------------------------------------------------
 # Öffentliche API
@@ -37,7 +394,8 @@ def find_and_download_manual(device_name, manufacturer, model, dest_folder):
     Sucht und lädt eine Anleitung für ein Gerät herunter.
 
     Gibt (filename, error_message) zurück.
-    Bei Erfolg ist error_message None.
+    Bei Erfolg ist error_message None; wurde nichts gefunden, ist sie ein
+    ManualNotFound.
     """
     query = _build_query(device_name, manufacturer, model)
     if not query:
@@ -45,30 +403,147 @@ def find_and_download_manual(device_name, manufacturer, model, dest_folder):
 
     print("Suche Anleitung für: '{}'".format(query))
 
+    return _single_flight(search_cache.normalize_query(query), _find_and_download,
+                          query, _safe_filename(query), dest_folder)
+
+
+def search_key(device_name, manufacturer, model):
+    """Schlüssel, unter dem Geräte dieselbe Suche teilen (normalisierter Suchbegriff)."""
+    return search_cache.normalize_query(_build_query(device_name, manufacturer, model))
+
+
+def _find_and_download(query, filename, dest_folder):
+    with _file_lock(filename):
+        return _find_and_download_locked(query, filename, dest_folder)
+
+
+def _find_and_download_locked(query, filename, dest_folder):
     # Bereits heruntergeladene Datei?
-    filename = _safe_filename(query)
     dest_path = os.path.join(dest_folder, filename)
     if os.path.exists(dest_path):
         print("Datei bereits vorhanden: {}".format(filename))
         return filename, None
 
-    # Strategie 1: manualslib.com
-    pdf_url = _search_manualslib(query)
+    # Früheres Ergebnis für denselben Suchbegriff?
+    cache = search_cache.get_cache()
+    cached = cache.get(query)
+    if cached is not None:
+        if not cached['url']:
+            print("Such-Cache: '{}' zuletzt nicht gefunden".format(query))
+            return None, ManualNotFound("Keine Anleitung für '{}' gefunden (zwischengespeichert)".format(query))
+        print("Such-Cache: '{}' → {}".format(query, cached['url']))
+        if _download_pdf(cached['url'], dest_path):
+            return filename, None
+        print("Such-Cache: URL nicht mehr abrufbar, suche neu")
 
-    # Strategie 2: DuckDuckGo → direkter PDF-Link
-    if not pdf_url:
-        pdf_url = _search_duckduckgo_pdf(query)
+    pdf_url, failed, timed_out = _search_providers(query)
 
     if not pdf_url:
-        return None, "Keine Anleitung für '{}' gefunden".format(query)
+        if timed_out:
+            return None, "Suche nach '{}' nach {:.0f} s abgebrochen".format(query, SEARCH_DEADLINE)
+        if len(set(failed)) == len(PROVIDERS):
+            return None, "Keine Quelle erreichbar für '{}'".format(query)
+        # Nur ein echtes "nicht gefunden" merken, keine Netzwerkfehler
+        if not failed:
+            cache.put_miss(query)
+        return None, ManualNotFound("Keine Anleitung für '{}' gefunden".format(query))
 
     # PDF herunterladen
     if _download_pdf(pdf_url, dest_path):
+        cache.put_hit(query, pdf_url, filename)
         return filename, None
 
     return None, "Download von '{}' fehlgeschlagen".format(pdf_url)
 
 
+# -----------------------------------------------------------------------
+# Quellen-Kette: gestaffelt parallel, erster Treffer gewinnt
+# -----------------------------------------------------------------------
+
+def _pool():
+    """
+    Quellen-Pool mit einem Thread je Quelle und gleichzeitiger Suche (Job-Worker
+    plus eine Einzelsuche aus der Oberfläche) – sonst warten Aufgaben in der
+    Warteschlange, und die Wartezeit zehrt Frist und Staffelung auf.
+    """
+    global _provider_pool
+    with _provider_pool_lock:
+        if _provider_pool is None:
+            _provider_pool = ThreadPoolExecutor(max_workers=(_search_workers + 1) * len(PROVIDERS),
+                                                thread_name_prefix='manual-provider')
+        return _provider_pool
+
+
+def _search_providers(query):
+    """
+    Fragt die Quellen aus PROVIDERS gestaffelt ab.
+
+    Gibt (pdf_url, failed, timed_out) zurück; failed enthält die Quellen,
+    die nicht erreichbar waren oder nicht rechtzeitig geantwortet haben.
+    """
+    deadline = time.monotonic() + SEARCH_DEADLINE
+    cancel = threading.Event()
+    waiting = list(PROVIDERS)
+    running = {}
+    failed = []
+    next_start = time.monotonic()
+    try:
+        while waiting or running:
+            now = time.monotonic()
+            if now >= deadline:
+                failed.extend(name for name, _ in waiting)
+                failed.extend(running.values())
+                print("Suche nach '{}': Frist von {:.0f} s abgelaufen".format(query, SEARCH_DEADLINE))
+                return None, failed, True
+
+            # Nächste Quelle starten: sofort, wenn keine mehr läuft, sonst nach HEDGE_DELAY
+            if waiting and (not running or now >= next_start):
+                name, strategy = waiting.pop(0)
+                if not _breaker(name).allow():
+                    failed.append(name)     # übersprungen – kein sicheres "nicht gefunden"
+                    continue
+                running[_pool().submit(_run_provider, name, strategy, query, cancel, deadline)] = name
+                next_start = now + HEDGE_DELAY
+                continue
+
+            timeout = deadline - now
+            if waiting:
+                timeout = min(timeout, next_start - now)
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                pdf_url, error = future.result()
+                if error:
+                    failed.append(name)
+                elif pdf_url:
+                    return pdf_url, failed, False
+        return None, failed, False
+    finally:
+        # Verlierer bzw. zu langsame Quellen beenden sich bei ihrer nächsten Anfrage
+        cancel.set()
+
+
+def _run_provider(name, strategy, query, cancel, deadline):
+    """Läuft im Quellen-Pool; gibt (pdf_url, fehler) zurück."""
+    _local.cancel, _local.deadline = cancel, deadline
+    start = time.monotonic()
+    try:
+        pdf_url = strategy(query)
+    except SearchError as e:
+        _record(name, 'cancelled' if cancel.is_set() else 'error', time.monotonic() - start)
+        if not cancel.is_set():
+            print(e)
+        return None, str(e)
+    except Exception as e:
+        _record(name, 'error', time.monotonic() - start)
+        print("{}: unerwarteter Fehler: {}".format(name, e))
+        return None, str(e)
+    finally:
+        _local.cancel = _local.deadline = None
+    _record(name, 'hit' if pdf_url else 'empty', time.monotonic() - start)
+    return pdf_url, None
+
+
 # -----------------------------------------------------------------------
 # Strategie 1: manualslib.com
 # -----------------------------------------------------------------------
@@ -79,22 +554,12 @@ def _search_manualslib(query):
         MANUALSLIB, requests.utils.quote(query)
     )
     try:
-        resp = SESSION.get(search_url, timeout=15)
+        resp = _get(search_url, timeout=15)
         resp.raise_for_status()
     except Exception as e:
-        print("manualslib.com Suche fehlgeschlagen: {}".format(e))
-        return None
-
-    soup = BeautifulSoup(resp.text, 'html.parser')
-
-    # Ersten Treffer finden: Link mit /manual-XXXX/ Muster
-    manual_path = None
-    for a in soup.find_all('a', href=True):
-        href = a['href']
-        if re.match(r'^/manual-\d+/', href):
-            manual_path = href
-            break
+        raise SearchError("manualslib.com Suche fehlgeschlagen: {}".format(e))
 
+    manual_path = _parse_manualslib_search(resp.text)
     if not manual_path:
         print("manualslib.com: Keine Treffer für '{}'".format(query))
         return None
@@ -109,24 +574,15 @@ def _search_manualslib(query):
 def _extract_pdf_url_manualslib(manual_page_url):
     """Extrahiert die direkte PDF-URL von einer manualslib.com Seite."""
     try:
-        resp = SESSION.get(manual_page_url, timeout=15)
+        resp = _get(manual_page_url, timeout=15)
         resp.raise_for_status()
     except Exception as e:
-        print("manualslib.com Seite nicht abrufbar: {}".format(e))
-        return None
-
-    soup = BeautifulSoup(resp.text, 'html.parser')
+        raise SearchError("manualslib.com Seite nicht abrufbar: {}".format(e))
 
-    # Variante 1: iframe mit pdf.manualslib.com
-    for iframe in soup.find_all('iframe', src=True):
-        if 'manualslib' in iframe['src']:
-            return iframe['src']
-
-    # Variante 2: Direkter Download-Link (.pdf)
-    for a in soup.find_all('a', href=True):
-        href = a['href']
-        if re.search(r'\.pdf(\?|$)', href, re.I):
-            return href if href.startswith('http') else MANUALSLIB + href
+    # Variante 1 und 2: iframe mit pdf.manualslib.com bzw. direkter Download-Link (.pdf)
+    pdf_url = _parse_manualslib_page(resp.text)
+    if pdf_url:
+        return pdf_url
 
     # Variante 3: URL-Schema ableiten
     # /manual-12345/brand-model.html → pdf.manualslib.com/manual-12345/brand-model.pdf
@@ -152,66 +608,281 @@ def _search_duckduckgo_pdf(query):
     ddg_url = "https://lite.duckduckgo.com/lite/"
 
     try:
-        resp = SESSION.get(ddg_url, params={'q': search_query}, timeout=15)
+        resp = _get(ddg_url, params={'q': search_query}, timeout=15)
         resp.raise_for_status()
     except Exception as e:
-        print("DuckDuckGo-Suche fehlgeschlagen: {}".format(e))
-        return None
+        raise SearchError("DuckDuckGo-Suche fehlgeschlagen: {}".format(e))
 
-    soup = BeautifulSoup(resp.text, 'html.parser')
+    pdf_link, manualslib_link = _parse_duckduckgo(resp.text)
+    if pdf_link:
+        print("DuckDuckGo PDF-Link: {}".format(pdf_link))
+        return pdf_link
 
-    # DuckDuckGo Lite gibt Ergebnisse als <a class="result-link"> zurück
-    for a in soup.find_all('a', href=True):
-        href = a['href']
-        # Direkte PDF-Links bevorzugen
-        if re.search(r'\.pdf(\?|$)', href, re.I) and href.startswith('http'):
-            print("DuckDuckGo PDF-Link: {}".format(href))
-            return href
-
-    # Zweiter Durchlauf: manualslib-Links aus DDG-Ergebnissen
-    for a in soup.find_all('a', href=True):
-        href = a['href']
-        if 'manualslib.com/manual-' in href:
-            return _extract_pdf_url_manualslib(href)
+    # Sonst: manualslib-Link aus den DDG-Ergebnissen
+    if manualslib_link:
+        return _extract_pdf_url_manualslib(manualslib_link)
 
     print("DuckDuckGo: Kein PDF-Link für '{}'".format(query))
     return None
 
 
 # -----------------------------------------------------------------------
-# Download
+# Auswertung der Seiten (je ein Durchlauf über die Links, siehe html_links.py)
 # -----------------------------------------------------------------------
 
-def _download_pdf(url, dest_path):
-    """Lädt eine PDF-Datei herunter. Gibt True bei Erfolg zurück."""
-    try:
-        resp = SESSION.get(url, timeout=60, stream=True, allow_redirects=True)
-        resp.raise_for_status()
+def _parse_manualslib_search(text):
+    """Erster Treffer der Suchseite: Link mit /manual-XXXX/ Muster."""
+    for tag, href in iter_links(text):
+        if tag == 'a' and _MANUAL_PATH_RE.match(href):
+            return href
+    return None
 
-        content_type = resp.headers.get('content-type', '').lower()
-        is_pdf_url   = re.search(r'\.pdf(\?|$)', url, re.I)
-        if 'pdf' not in content_type and not is_pdf_url:
-            print("Kein PDF: Content-Type='{}', URL={}".format(content_type, url))
-            return False
 
-        with open(dest_path, 'wb') as f:
-            for chunk in resp.iter_content(chunk_size=8192):
-                f.write(chunk)
+def _parse_manualslib_page(text):
+    """PDF-URL einer Manual-Seite: iframe mit manualslib hat Vorrang vor dem ersten .pdf-Link."""
+    pdf_link = None
+    for tag, url in iter_links(text):
+        if tag == 'iframe':
+            if 'manualslib' in url:
+                return url
+        elif pdf_link is None and _PDF_LINK_RE.search(url):
+            pdf_link = url
+    if pdf_link is None:
+        return None
+    return pdf_link if pdf_link.startswith('http') else MANUALSLIB + pdf_link
 
-        size = os.path.getsize(dest_path)
-        if size < 5120:  # < 5 KB → Fehlerseite statt PDF
-            os.remove(dest_path)
-            print("Download zu klein ({} Bytes), verworfen".format(size))
-            return False
+
+def _parse_duckduckgo(text):
+    """(erster direkter PDF-Link, erster manualslib-Link) der DDG-Ergebnisseite."""
+    manualslib_link = None
+    for tag, href in iter_links(text):
+        if tag != 'a':
+            continue
+        if _PDF_LINK_RE.search(href) and href.startswith('http'):
+            return href, None
+        if manualslib_link is None and 'manualslib.com/manual-' in href:
+            manualslib_link = href
+    return None, manualslib_link
+
+
+# Reihenfolge = Priorität beim gestaffelten Start
+PROVIDERS = (
+    ('manualslib', _search_manualslib),
+    ('duckduckgo', _search_duckduckgo_pdf),
+)
+
+
+# -----------------------------------------------------------------------
+# Download
+# -----------------------------------------------------------------------
+
+class DownloadRejected(Exception):
+    """Die Antwort ist keine brauchbare PDF – Download abbrechen."""
+
+
+def _download_pdf(url, dest_path):
+    """Lädt eine PDF-Datei herunter (ggf. fortgesetzt). Gibt True bei Erfolg zurück."""
+    part_path, meta_path = _part_paths(dest_path)
+    offset, meta = _resume_state(url, part_path, meta_path)
+    headers = {}
+    if offset:
+        headers['Range'] = 'bytes={}-'.format(offset)
+        headers['If-Range'] = _if_range(meta)
+
+    # Ein vorhandener Teil bleibt, solange der Server ihn nicht ablehnt (200, 416)
+    # oder der Inhalt die Prüfung nicht besteht – Timeouts und 5xx verwerfen ihn nicht
+    keep_part = bool(offset)
+    done = False
+    try:
+        with _get(url, timeout=60, stream=True, allow_redirects=True, headers=headers) as resp:
+            if resp.status_code == 416 and offset:
+                # Teil passt nicht (mehr) zur Datei auf dem Server → neu beginnen
+                _remove(part_path, meta_path)
+                keep_part = True    # Aufräumen übernimmt der neue Versuch
+                return _download_pdf(url, dest_path)
+            resp.raise_for_status()
+
+            if offset and resp.status_code == 206 and _range_start(resp) == offset:
+                print("Setze Download bei {} KB fort: {}".format(offset // 1024, url))
+                mode = 'ab'
+            else:
+                if offset:
+                    print("Fortsetzen nicht möglich (HTTP {}), lade neu: {}".format(resp.status_code, url))
+                offset = 0
+                mode = 'wb'
+                keep_part = False
+            _check_headers(resp, offset)
+
+            # Nur mit Validator (ETag/Last-Modified) und Range-Unterstützung lohnt es, den Teil aufzuheben
+            meta = {
+                'url':           url,
+                'etag':          resp.headers.get('etag'),
+                'last_modified': resp.headers.get('last-modified'),
+            }
+            resumable = bool(meta['etag'] or meta['last_modified']) and (
+                resp.status_code == 206 or resp.headers.get('accept-ranges', '').lower() == 'bytes')
+            if resumable:
+                write_json_atomic(meta_path, meta)
+            elif os.path.exists(meta_path):
+                os.remove(meta_path)
+
+            digest = hashlib.sha256()
+            head = _hash_existing(part_path, digest) if offset else b''
+            size = offset
+            with open(part_path, mode) as f:
+                keep_part = resumable
+                for chunk in _iter_body(resp):
+                    if len(head) < MAGIC_WINDOW:
+                        head += chunk[:MAGIC_WINDOW]
+                        if len(head) >= MAGIC_WINDOW and PDF_MAGIC not in head[:MAGIC_WINDOW]:
+                            raise DownloadRejected("keine PDF-Signatur, Anfang: {!r}".format(head[:40]))
+                    size += len(chunk)
+                    if size > _max_download:
+                        raise DownloadRejected("größer als {} MB".format(_max_download // (1024 * 1024)))
+                    digest.update(chunk)
+                    f.write(chunk)
+            _check_complete(resp, size)
+
+        if PDF_MAGIC not in head[:MAGIC_WINDOW]:
+            raise DownloadRejected("keine PDF-Signatur, Anfang: {!r}".format(head[:40]))
+        if size < MIN_PDF_SIZE:
+            raise DownloadRejected("zu klein ({} Bytes)".format(size))
+
+        # Seitenzahl über Xref/Trailer am Dateiende – der Inhalt wird dafür nicht erneut gelesen
+        try:
+            pages = count_pages(part_path)
+        except PdfPagesError:
+            pages = None
+        os.chmod(part_path, 0o644)
+        os.replace(part_path, dest_path)
+        done = True
 
         print("PDF heruntergeladen: {} ({} KB)".format(dest_path, size // 1024))
+        if _on_download is not None:
+            try:
+                _on_download(os.path.basename(dest_path), pages, digest.hexdigest())
+            except Exception as e:
+                print("Anleitungs-Index nach Download nicht aktualisiert: {}".format(e))
         return True
 
+    except DownloadRejected as e:
+        keep_part = False
+        print("Download verworfen ({}): {}".format(e, url))
+        return False
     except Exception as e:
-        print("PDF-Download fehlgeschlagen: {}".format(e))
-        if os.path.exists(dest_path):
-            os.remove(dest_path)
+        if keep_part:
+            print("PDF-Download unterbrochen, Teil wird beim nächsten Versuch fortgesetzt: {}".format(e))
+        else:
+            print("PDF-Download fehlgeschlagen: {}".format(e))
         return False
+    finally:
+        if done:
+            _remove(meta_path)
+        elif not keep_part:
+            _remove(part_path, meta_path)
+
+
+def _iter_body(resp):
+    """
+    Liefert den Inhalt so, wie er ankommt. iter_content() sammelt unter
+    urllib3 2.x jeweils volle CHUNK_SIZE-Blöcke – bricht die Verbindung davor
+    ab, gehen die schon empfangenen Bytes verloren und es bleibt nichts zum
+    Fortsetzen. read1() gibt sie sofort heraus, der Fehler kommt erst beim
+    nächsten Aufruf.
+    """
+    read1 = getattr(resp.raw, 'read1', None)
+    if read1 is None:
+        # urllib3 1.x liefert kurze Reads ohnehin sofort
+        yield from resp.iter_content(chunk_size=CHUNK_SIZE)
+        return
+    while True:
+        chunk = read1(CHUNK_SIZE, decode_content=True)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _part_paths(dest_path):
+    """Teil-Datei und Metadaten; beginnen mit '.' und enden nicht auf .pdf – der Index ignoriert sie."""
+    directory, name = os.path.split(dest_path)
+    part_path = os.path.join(directory, '.' + name + '.part')
+    return part_path, part_path + '.json'
+
+
+def _resume_state(url, part_path, meta_path):
+    """(Offset, Metadaten) eines fortsetzbaren Teils für url, sonst (0, None)."""
+    try:
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+        offset = os.path.getsize(part_path)
+    except (OSError, ValueError):
+        _remove(part_path, meta_path)
+        return 0, None
+    if meta.get('url') != url or not (meta.get('etag') or meta.get('last_modified')) or not offset:
+        _remove(part_path, meta_path)
+        return 0, None
+    return offset, meta
+
+
+def _if_range(meta):
+    # Schwache ETags sind für If-Range nicht erlaubt
+    etag = meta.get('etag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return meta.get('last_modified') or etag
+
+
+def _range_start(resp):
+    """Startbyte aus 'Content-Range: bytes START-END/TOTAL'."""
+    match = re.match(r'bytes\s+(\d+)-\d+/(?:\d+|\*)', resp.headers.get('content-range', ''))
+    return int(match.group(1)) if match else None
+
+
+def _hash_existing(part_path, digest):
+    """Bereits geladenen Teil in den Hash einrechnen; gibt dessen Anfang zurück."""
+    head = b''
+    with open(part_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            if len(head) < MAGIC_WINDOW:
+                head += block[:MAGIC_WINDOW]
+            digest.update(block)
+    return head
+
+
+def _remove(*paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _check_headers(resp, offset=0):
+    """Prüft Content-Type und Content-Length, bevor der Inhalt gelesen wird."""
+    content_type = resp.headers.get('content-type', '').lower()
+    if content_type.startswith('text/'):
+        raise DownloadRejected("Content-Type '{}'".format(content_type))
+
+    length = resp.headers.get('content-length', '')
+    # Bei komprimierter Übertragung zählt Content-Length die komprimierten Bytes
+    if length.isdigit() and not resp.headers.get('content-encoding'):
+        total = offset + int(length)
+        if total > _max_download:
+            raise DownloadRejected("Content-Length {} MB, erlaubt sind {} MB".format(
+                total // (1024 * 1024), _max_download // (1024 * 1024)))
+        if total < MIN_PDF_SIZE:
+            raise DownloadRejected("Content-Length nur {} Bytes".format(total))
+
+
+def _check_complete(resp, size):
+    """Eine vorzeitig geschlossene Verbindung ist ein Abbruch, keine fertige Datei."""
+    length = resp.headers.get('content-length', '')
+    if length.isdigit() and not resp.headers.get('content-encoding'):
+        expected = int(length)
+        if resp.status_code == 206:
+            expected += _range_start(resp) or 0
+        if size < expected:
+            raise IOError("Verbindung nach {} von {} Bytes beendet".format(size, expected))
 
 
 # -----------------------------------------------------------------------
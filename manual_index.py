@@ -0,0 +1,174 @@
+"""
+Persistenter Metadaten-Index für den Anleitungs-Ordner.
+
+Seitenanzahl, Größe, Erstellzeit und Inhalts-Hash jeder PDF werden in einer
+JSON-Datei zwischengespeichert. Ein Eintrag bleibt gültig, solange
+Dateiname, Größe, mtime und Inode unverändert sind – nur neue oder
+geänderte Dateien werden erneut geparst.
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+from json_cache import write_json_atomic
+from pdf_pages import PdfPagesError
+
+INDEX_VERSION = 1
+
+
+def _file_hash(path):
+    """SHA-256 einer Datei blockweise berechnen."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _signature(st):
+    """Schlüssel, an dem Änderungen an einer Datei erkannt werden."""
+    return [st.st_size, st.st_mtime_ns, st.st_ino]
+
+
+class ManualIndex:
+    def __init__(self, folder, index_file, page_counter):
+        self.folder = folder
+        self.index_file = index_file
+        self.page_counter = page_counter
+        self._lock = threading.RLock()
+        self._entries = None
+        self._snapshot = None
+
+    # ------------------------------------------------------------------
+    # Persistenz
+    # ------------------------------------------------------------------
+
+    def _load(self):
+        if self._entries is not None:
+            return self._entries
+        entries = {}
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, 'r') as f:
+                    data = json.load(f)
+                if data.get('version') == INDEX_VERSION:
+                    entries = data.get('files', {})
+            except Exception as e:
+                print("Manual-Index: Konnte {} nicht lesen: {}".format(self.index_file, e))
+        self._entries = entries
+        return entries
+
+    def _save(self):
+        self._snapshot = None
+        try:
+            os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+            write_json_atomic(self.index_file, {'version': INDEX_VERSION, 'files': self._entries})
+        except Exception as e:
+            print("Manual-Index: Speichern fehlgeschlagen: {}".format(e))
+
+    # ------------------------------------------------------------------
+    # Einträge
+    # ------------------------------------------------------------------
+
+    def _build_entry(self, path, st):
+        return {
+            'signature': _signature(st),
+            'size':      st.st_size,
+            'timestamp': st.st_ctime,
+            'pages':     self.page_counter(path),
+            'sha256':    _file_hash(path),
+        }
+
+    def _is_current(self, entry, st):
+        return entry is not None and entry.get('signature') == _signature(st)
+
+    def refresh(self):
+        """Gleicht den Index mit dem Ordner ab und gibt die Anleitungen zurück."""
+        with self._lock:
+            entries = self._load()
+            seen = set()
+            changed = False
+
+            for dirent in os.scandir(self.folder):
+                if not dirent.name.lower().endswith('.pdf') or not dirent.is_file():
+                    continue
+                try:
+                    # Datei kann zwischen scandir und stat gelöscht worden sein
+                    st = dirent.stat()
+                    seen.add(dirent.name)
+                    if self._is_current(entries.get(dirent.name), st):
+                        continue
+                    entries[dirent.name] = self._build_entry(dirent.path, st)
+                    changed = True
+                except (OSError, PdfPagesError, ValueError) as e:
+                    print("Manual-Index: {} übersprungen: {}".format(dirent.name, e))
+
+            for name in [n for n in entries if n not in seen]:
+                del entries[name]
+                changed = True
+
+            if changed:
+                self._save()
+            return self.manuals()
+
+    def update(self, filename):
+        """Einzelne Datei (neu) indizieren, z.B. nach einem Upload."""
+        path = os.path.join(self.folder, filename)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            self.remove(filename)
+            return
+        with self._lock:
+            if self._is_current(self._load().get(filename), st):
+                return
+        # Parsen außerhalb der Sperre, damit Leser den alten Snapshot weiter erhalten
+        entry = self._build_entry(path, st)
+        with self._lock:
+            self._load()[filename] = entry
+            self._save()
+
+    def put(self, filename, pages, sha256):
+        """Datei mit bereits bekannter Seitenanzahl und Hash eintragen (z.B. nach einem Download)."""
+        path = os.path.join(self.folder, filename)
+        st = os.stat(path)
+        entry = {
+            'signature': _signature(st),
+            'size':      st.st_size,
+            'timestamp': st.st_ctime,
+            'pages':     pages if pages is not None else self.page_counter(path),
+            'sha256':    sha256,
+        }
+        with self._lock:
+            self._load()[filename] = entry
+            self._save()
+
+    def remove(self, filename):
+        """Eintrag einer gelöschten Datei entfernen."""
+        with self._lock:
+            entries = self._load()
+            if entries.pop(filename, None) is not None:
+                self._save()
+
+    def manuals(self):
+        """Anleitungen im Format von load_manuals(), sortiert nach Erstellzeit.
+
+        Die Liste wird bis zur nächsten Änderung zwischengespeichert und darf
+        vom Aufrufer nicht verändert werden.
+        """
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+        with self._lock:
+            entries = self._load()
+            manuals = [{
+                'name':      name,
+                'size':      e['size'],
+                'pages':     e['pages'],
+                'timestamp': e['timestamp'],
+                'sha256':    e['sha256'],
+            } for name, e in entries.items()]
+            self._snapshot = sorted(manuals, key=lambda x: x['timestamp'])
+            return self._snapshot
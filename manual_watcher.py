@@ -0,0 +1,161 @@
+"""
+Hintergrund-Überwachung des Anleitungs-Ordners.
+
+PDFs landen nicht nur über den Upload in /data/manuals, sondern auch über
+die share-Freigabe, Samba oder den automatischen Download. Der Watcher hält
+den ManualIndex inkrementell aktuell, damit Request-Handler nur noch den
+fertigen Snapshot lesen müssen.
+
+Unter Linux wird inotify (per ctypes, ohne Zusatzpaket) verwendet; steht es
+nicht zur Verfügung, wird der Ordner periodisch per stat() abgeglichen.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+import time
+
+# inotify-Konstanten aus <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM  = 0x00000040
+IN_MOVED_TO    = 0x00000080
+IN_DELETE      = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF   = 0x00000800
+IN_Q_OVERFLOW  = 0x00004000
+IN_IGNORED     = 0x00008000
+IN_ISDIR       = 0x40000000
+IN_NONBLOCK    = 0o4000
+IN_CLOEXEC     = 0o2000000
+
+_WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+_EVENT_HEADER = struct.Struct('iIII')
+
+# Auch mit inotify gelegentlich vollständig abgleichen (verpasste Events)
+RESYNC_INTERVAL = 600
+
+
+def _load_inotify():
+    """Gibt die libc mit inotify-Funktionen zurück oder None."""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+class ManualWatcher:
+    def __init__(self, index, poll_interval=30):
+        self.index = index
+        self.poll_interval = poll_interval
+        self.mode = None
+        self.ready = False
+        self._thread = None
+
+    def start(self):
+        """Startet den Hintergrund-Thread (idempotent)."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='manual-watcher', daemon=True)
+        self._thread.start()
+
+    # ------------------------------------------------------------------
+    # Ablauf
+    # ------------------------------------------------------------------
+
+    def _run(self):
+        fd = self._open_inotify()
+        self._resync()
+        self.ready = True
+
+        if fd is not None:
+            self.mode = 'inotify'
+            print("Manual-Watcher: inotify aktiv für {}".format(self.index.folder))
+            try:
+                self._inotify_loop(fd)
+            except Exception as e:
+                print("Manual-Watcher: inotify-Fehler ({}), wechsle zu Polling".format(e))
+            finally:
+                os.close(fd)
+
+        self.mode = 'poll'
+        print("Manual-Watcher: Polling alle {} s für {}".format(self.poll_interval, self.index.folder))
+        while True:
+            time.sleep(self.poll_interval)
+            self._resync()
+
+    def _resync(self):
+        try:
+            self.index.refresh()
+        except Exception as e:
+            print("Manual-Watcher: Abgleich fehlgeschlagen: {}".format(e))
+
+    # ------------------------------------------------------------------
+    # inotify
+    # ------------------------------------------------------------------
+
+    def _open_inotify(self):
+        libc = _load_inotify()
+        if libc is None:
+            return None
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            print("Manual-Watcher: inotify_init1 fehlgeschlagen: {}".format(os.strerror(ctypes.get_errno())))
+            return None
+        wd = libc.inotify_add_watch(fd, os.fsencode(self.index.folder), _WATCH_MASK)
+        if wd < 0:
+            print("Manual-Watcher: inotify_add_watch fehlgeschlagen: {}".format(os.strerror(ctypes.get_errno())))
+            os.close(fd)
+            return None
+        return fd
+
+    def _inotify_loop(self, fd):
+        last_resync = time.monotonic()
+        while True:
+            readable, _, _ = select.select([fd], [], [], RESYNC_INTERVAL)
+            if time.monotonic() - last_resync >= RESYNC_INTERVAL:
+                self._resync()
+                last_resync = time.monotonic()
+            if not readable:
+                continue
+
+            try:
+                data = os.read(fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+
+            for mask, name in self._parse_events(data):
+                if mask & IN_Q_OVERFLOW:
+                    print("Manual-Watcher: Event-Warteschlange übergelaufen, vollständiger Abgleich")
+                    self._resync()
+                    last_resync = time.monotonic()
+                elif mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                    raise RuntimeError("Ordner {} nicht mehr überwacht".format(self.index.folder))
+                elif mask & IN_ISDIR or not name.lower().endswith('.pdf'):
+                    continue
+                elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                    self._apply(self.index.update, name)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._apply(self.index.remove, name)
+
+    @staticmethod
+    def _parse_events(data):
+        pos = 0
+        while pos + _EVENT_HEADER.size <= len(data):
+            _wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, pos)
+            pos += _EVENT_HEADER.size
+            name = os.fsdecode(data[pos:pos + length].rstrip(b'\0'))
+            pos += length
+            yield mask, name
+
+    @staticmethod
+    def _apply(func, name):
+        try:
+            func(name)
+        except Exception as e:
+            print("Manual-Watcher: {} konnte nicht verarbeitet werden: {}".format(name, e))
@@ -0,0 +1,406 @@
+"""
+Schnelles Auslesen der Seitenanzahl einer PDF-Datei.
+
+Statt den kompletten Dokumentbaum mit PyPDF2 aufzubauen, wird die Datei per
+mmap eingeblendet und nur das Nötigste gelesen:
+
+  1. startxref am Dateiende
+  2. Querverweistabelle (klassisch oder als Xref-Stream, inkl. /Prev-Kette)
+  3. Trailer → /Root → /Pages → /Count
+
+Verschlüsselte oder beschädigte Dateien lösen PdfPagesError aus; der
+Aufrufer fällt dann auf PyPDF2 zurück.
+"""
+
+import mmap
+import os
+import re
+import zlib
+
+_WS_RE       = re.compile(rb'(?:[\x00\t\n\x0c\r ]+|%[^\r\n]*)*')
+_TOKEN_RE    = re.compile(rb'[^\x00\t\n\x0c\r ()<>\[\]{}/%]+')
+_NUMBER_RE   = re.compile(rb'[+-]?(?:\d+\.?\d*|\.\d+)$')
+_REF_RE      = re.compile(rb'(\d+)[\x00\t\n\x0c\r ]+(\d+)[\x00\t\n\x0c\r ]+R(?![^\x00\t\n\x0c\r ()<>\[\]{}/%])')
+_OBJ_RE      = re.compile(rb'(\d+)[\x00\t\n\x0c\r ]+(\d+)[\x00\t\n\x0c\r ]+obj')
+_SUBSECT_RE  = re.compile(rb'[\x00\t\n\x0c\r ]*(\d+)[\x00\t\n\x0c\r ]+(\d+)[\x00\t\n\x0c\r ]*')
+_ENTRY_RE    = re.compile(rb'(\d{10})[\x00\t\n\x0c\r ](\d{5})[\x00\t\n\x0c\r ]([nf])[\x00\t\n\x0c\r ]*')
+_STARTXREF_RE = re.compile(rb'startxref[\x00\t\n\x0c\r ]+(\d+)')
+
+# Wie weit vom Dateiende nach "startxref" gesucht wird
+_TAIL_SIZE = 2048
+# Schutz vor zirkulären /Prev-Ketten
+_MAX_XREF_SECTIONS = 256
+
+
+class PdfPagesError(Exception):
+    """Die Seitenanzahl konnte nicht schnell ermittelt werden."""
+
+
+class _Ref:
+    __slots__ = ('num', 'gen')
+
+    def __init__(self, num, gen):
+        self.num = num
+        self.gen = gen
+
+
+def count_pages(path):
+    """Gibt die Seitenanzahl der PDF-Datei unter path zurück."""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise PdfPagesError("Leere Datei")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            try:
+                return _Reader(buf).page_count()
+            except PdfPagesError:
+                raise
+            except (ValueError, IndexError, KeyError, TypeError, AttributeError, zlib.error) as e:
+                raise PdfPagesError("Ungültige Struktur: {}".format(e))
+            except RecursionError:
+                # z.B. tief verschachtelte Arrays/Dictionaries
+                raise PdfPagesError("Zu tief verschachtelte Struktur")
+
+
+class _Reader:
+    def __init__(self, buf):
+        self.buf = buf
+        self.offsets = {}   # Objektnummer → ('n', offset) | ('c', stream_num, index)
+        self.trailer = {}
+        self._objstm_cache = {}
+        self._resolving = set()     # gerade aufgelöste Objekte, gegen Zyklen über /Length o.ä.
+
+    # ------------------------------------------------------------------
+    # Einstieg
+    # ------------------------------------------------------------------
+
+    def page_count(self):
+        self._read_xref_chain(self._startxref())
+
+        if 'Encrypt' in self.trailer:
+            raise PdfPagesError("Verschlüsselte Datei")
+
+        root = self._resolve(self.trailer.get('Root'))
+        if not isinstance(root, dict):
+            raise PdfPagesError("Kein /Root-Katalog")
+        pages = self._resolve(root.get('Pages'))
+        if not isinstance(pages, dict):
+            raise PdfPagesError("Kein /Pages-Knoten")
+        count = self._resolve(pages.get('Count'))
+        if not isinstance(count, int) or count < 0:
+            raise PdfPagesError("Ungültiges /Count: {!r}".format(count))
+        return count
+
+    def _startxref(self):
+        tail_start = max(0, len(self.buf) - _TAIL_SIZE)
+        tail = self.buf[tail_start:]
+        pos = tail.rfind(b'startxref')
+        if pos < 0:
+            raise PdfPagesError("startxref nicht gefunden")
+        m = _STARTXREF_RE.match(tail, pos)
+        if not m:
+            raise PdfPagesError("startxref ohne Offset")
+        return int(m.group(1))
+
+    # ------------------------------------------------------------------
+    # Querverweistabellen
+    # ------------------------------------------------------------------
+
+    def _read_xref_chain(self, offset):
+        visited = set()
+        pending = [offset]
+        while pending:
+            offset = pending.pop(0)
+            if offset in visited or len(visited) >= _MAX_XREF_SECTIONS:
+                continue
+            visited.add(offset)
+
+            if self.buf[offset:offset + 4] == b'xref':
+                trailer = self._read_xref_table(offset + 4)
+            else:
+                trailer = self._read_xref_stream(offset)
+
+            # Der jüngste Trailer gewinnt, ältere ergänzen nur fehlende Schlüssel
+            for key, value in trailer.items():
+                self.trailer.setdefault(key, value)
+
+            # Hybrid-Dateien: zusätzlicher Xref-Stream vor /Prev auswerten
+            if isinstance(trailer.get('XRefStm'), int):
+                pending.insert(0, trailer['XRefStm'])
+            if isinstance(trailer.get('Prev'), int):
+                pending.append(trailer['Prev'])
+
+    def _read_xref_table(self, pos):
+        buf = self.buf
+        while True:
+            pos = self._skip_ws(pos)
+            if buf[pos:pos + 7] == b'trailer':
+                trailer, _ = self._parse(pos + 7)
+                if not isinstance(trailer, dict):
+                    raise PdfPagesError("Ungültiger Trailer")
+                return trailer
+
+            m = _SUBSECT_RE.match(buf, pos)
+            if not m:
+                raise PdfPagesError("Ungültige Xref-Tabelle bei {}".format(pos))
+            start, count = int(m.group(1)), int(m.group(2))
+            pos = m.end()
+            for num in range(start, start + count):
+                e = _ENTRY_RE.match(buf, pos)
+                if not e:
+                    raise PdfPagesError("Ungültiger Xref-Eintrag bei {}".format(pos))
+                pos = e.end()
+                if e.group(3) == b'n' and num not in self.offsets:
+                    self.offsets[num] = ('n', int(e.group(1)))
+
+    def _read_xref_stream(self, offset):
+        num, obj, data = self._read_indirect(offset, expect=None)
+        if not isinstance(obj, dict) or obj.get('Type') != 'XRef' or data is None:
+            raise PdfPagesError("Kein Xref-Stream bei {}".format(offset))
+
+        widths = obj['W']
+        row_len = sum(widths)
+        index = obj.get('Index') or [0, obj['Size']]
+        pos = 0
+        for i in range(0, len(index), 2):
+            start, count = index[i], index[i + 1]
+            for num in range(start, start + count):
+                row = data[pos:pos + row_len]
+                pos += row_len
+                if len(row) < row_len:
+                    raise PdfPagesError("Xref-Stream zu kurz")
+                fields = []
+                p = 0
+                for w in widths:
+                    fields.append(int.from_bytes(row[p:p + w], 'big'))
+                    p += w
+                kind = fields[0] if widths[0] else 1
+                if num in self.offsets:
+                    continue
+                if kind == 1:
+                    self.offsets[num] = ('n', fields[1])
+                elif kind == 2:
+                    self.offsets[num] = ('c', fields[1], fields[2])
+        return obj
+
+    # ------------------------------------------------------------------
+    # Objekte auflösen
+    # ------------------------------------------------------------------
+
+    def _resolve(self, value, depth=0):
+        if not isinstance(value, _Ref):
+            return value
+        if depth > 32:
+            raise PdfPagesError("Zu tiefe Referenzkette")
+        entry = self.offsets.get(value.num)
+        if entry is None:
+            raise PdfPagesError("Objekt {} fehlt in der Xref-Tabelle".format(value.num))
+        if value.num in self._resolving:
+            raise PdfPagesError("Zirkuläre Referenz auf Objekt {}".format(value.num))
+        self._resolving.add(value.num)
+        try:
+            if entry[0] == 'n':
+                _, obj, _ = self._read_indirect(entry[1], expect=value.num)
+            else:
+                obj = self._from_object_stream(entry[1], entry[2])
+            return self._resolve(obj, depth + 1)
+        finally:
+            self._resolving.discard(value.num)
+
+    def _read_indirect(self, offset, expect):
+        """Liest "n g obj ... [stream]" und gibt (num, objekt, streamdaten) zurück."""
+        m = _OBJ_RE.match(self.buf, offset)
+        if not m:
+            raise PdfPagesError("Kein Objekt bei Offset {}".format(offset))
+        num = int(m.group(1))
+        if expect is not None and num != expect:
+            raise PdfPagesError("Objekt {} erwartet, {} gefunden".format(expect, num))
+
+        obj, pos = self._parse(m.end())
+        data = None
+        if isinstance(obj, dict):
+            pos = self._skip_ws(pos)
+            if self.buf[pos:pos + 6] == b'stream':
+                data = self._stream_data(obj, pos + 6)
+        return num, obj, data
+
+    def _stream_data(self, obj, pos):
+        if self.buf[pos:pos + 2] == b'\r\n':
+            pos += 2
+        elif self.buf[pos:pos + 1] in (b'\n', b'\r'):
+            pos += 1
+        length = self._resolve(obj.get('Length'))
+        if not isinstance(length, int) or length < 0:
+            raise PdfPagesError("Ungültige Stream-Länge")
+        raw = self.buf[pos:pos + length]
+        return _decode(raw, obj.get('Filter'), self._resolve(obj.get('DecodeParms')))
+
+    def _from_object_stream(self, stream_num, index):
+        cached = self._objstm_cache.get(stream_num)
+        if cached is None:
+            entry = self.offsets.get(stream_num)
+            if entry is None or entry[0] != 'n':
+                raise PdfPagesError("Objekt-Stream {} nicht gefunden".format(stream_num))
+            _, obj, data = self._read_indirect(entry[1], expect=stream_num)
+            if data is None:
+                raise PdfPagesError("Objekt-Stream {} ohne Daten".format(stream_num))
+            cached = (obj, data)
+            self._objstm_cache[stream_num] = cached
+
+        obj, data = cached
+        count, first = obj['N'], obj['First']
+        if index >= count:
+            raise PdfPagesError("Index {} außerhalb des Objekt-Streams".format(index))
+        header = _Reader(data)
+        pos = 0
+        offsets = []
+        for _ in range(count):
+            _num, pos = header._parse(pos)
+            off, pos = header._parse(pos)
+            offsets.append(off)
+        value, _ = header._parse(first + offsets[index])
+        return value
+
+    # ------------------------------------------------------------------
+    # Minimaler Objekt-Parser
+    # ------------------------------------------------------------------
+
+    def _skip_ws(self, pos):
+        return _WS_RE.match(self.buf, pos).end()
+
+    def _parse(self, pos):
+        buf = self.buf
+        pos = self._skip_ws(pos)
+        c = buf[pos:pos + 1]
+
+        if c == b'<':
+            if buf[pos + 1:pos + 2] == b'<':
+                return self._parse_dict(pos + 2)
+            end = buf.find(b'>', pos)
+            if end < 0:
+                raise PdfPagesError("Hex-String ohne Ende")
+            return bytes(buf[pos + 1:end]), end + 1
+        if c == b'[':
+            return self._parse_array(pos + 1)
+        if c == b'/':
+            m = _TOKEN_RE.match(buf, pos + 1)
+            return (m.group(0).decode('latin-1') if m else ''), (m.end() if m else pos + 1)
+        if c == b'(':
+            return self._parse_literal(pos + 1)
+
+        m = _REF_RE.match(buf, pos)
+        if m:
+            return _Ref(int(m.group(1)), int(m.group(2))), m.end()
+        m = _TOKEN_RE.match(buf, pos)
+        if not m:
+            raise PdfPagesError("Unerwartetes Zeichen bei {}".format(pos))
+        token = m.group(0)
+        if _NUMBER_RE.match(token):
+            value = float(token) if b'.' in token else int(token)
+        elif token == b'true':
+            value = True
+        elif token == b'false':
+            value = False
+        elif token == b'null':
+            value = None
+        else:
+            raise PdfPagesError("Unbekanntes Token {!r}".format(token[:20]))
+        return value, m.end()
+
+    def _parse_dict(self, pos):
+        result = {}
+        while True:
+            pos = self._skip_ws(pos)
+            if self.buf[pos:pos + 2] == b'>>':
+                return result, pos + 2
+            if self.buf[pos:pos + 1] != b'/':
+                raise PdfPagesError("Dictionary-Schlüssel erwartet bei {}".format(pos))
+            key, pos = self._parse(pos)
+            value, pos = self._parse(pos)
+            result[key] = value
+
+    def _parse_array(self, pos):
+        result = []
+        while True:
+            pos = self._skip_ws(pos)
+            if self.buf[pos:pos + 1] == b']':
+                return result, pos + 1
+            value, pos = self._parse(pos)
+            result.append(value)
+
+    def _parse_literal(self, pos):
+        buf = self.buf
+        start = pos
+        depth = 1
+        size = len(buf)
+        while pos < size:
+            c = buf[pos]
+            if c == 0x5c:      # Backslash: nächstes Zeichen überspringen
+                pos += 2
+                continue
+            if c == 0x28:      # (
+                depth += 1
+            elif c == 0x29:    # )
+                depth -= 1
+                if depth == 0:
+                    return bytes(buf[start:pos]), pos + 1
+            pos += 1
+        raise PdfPagesError("String ohne Ende")
+
+
+# ----------------------------------------------------------------------
+# Stream-Filter
+# ----------------------------------------------------------------------
+
+def _decode(raw, filters, parms):
+    if filters is None:
+        return bytes(raw)
+    if not isinstance(filters, list):
+        filters = [filters]
+        parms = [parms]
+    elif not isinstance(parms, list):
+        parms = [parms] * len(filters)
+
+    data = bytes(raw)
+    for name, parm in zip(filters, parms):
+        if name not in ('FlateDecode', 'Fl'):
+            raise PdfPagesError("Filter /{} nicht unterstützt".format(name))
+        data = zlib.decompress(data)
+        if isinstance(parm, dict) and parm.get('Predictor', 1) >= 10:
+            data = _png_unpredict(data, parm.get('Columns', 1))
+        elif isinstance(parm, dict) and parm.get('Predictor', 1) not in (1, None):
+            raise PdfPagesError("Predictor {} nicht unterstützt".format(parm.get('Predictor')))
+    return data
+
+
+def _png_unpredict(data, columns):
+    """PNG-Prädiktoren (Bytes pro Pixel = 1) rückgängig machen."""
+    row_len = columns + 1
+    prev = bytearray(columns)
+    out = bytearray()
+    for start in range(0, len(data) - columns, row_len):
+        kind = data[start]
+        row = bytearray(data[start + 1:start + row_len])
+        if kind == 1:
+            for i in range(1, columns):
+                row[i] = (row[i] + row[i - 1]) & 0xff
+        elif kind == 2:
+            for i in range(columns):
+                row[i] = (row[i] + prev[i]) & 0xff
+        elif kind == 3:
+            for i in range(columns):
+                left = row[i - 1] if i else 0
+                row[i] = (row[i] + ((left + prev[i]) >> 1)) & 0xff
+        elif kind == 4:
+            for i in range(columns):
+                a = row[i - 1] if i else 0
+                b = prev[i]
+                c = prev[i - 1] if i else 0
+                p = a + b - c
+                pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+                pred = a if pa <= pb and pa <= pc else (b if pb <= pc else c)
+                row[i] = (row[i] + pred) & 0xff
+        elif kind != 0:
+            raise PdfPagesError("Unbekannter PNG-Filter {}".format(kind))
+        out += row
+        prev = row
+    return bytes(out)
@@ -5,24 +5,44 @@ mkdir -p /data/manuals /data/devices /app/templates /app/static /run/nginx
 chmod 777 -R /data /app/templates /app/static /run/nginx
 rm -f /run/nginx/nginx.pid
 
+# Startup-Profiling (Option startup_profile): Importzeiten und Zeit bis zum ersten Healthcheck
+PROFILE=false
+if grep -q '"startup_profile": *true' /data/options.json 2>/dev/null; then
+  PROFILE=true
+fi
+IMPORTTIME_LOG=/data/startup_importtime.log
+STARTUP_REPORT=/data/startup_report.txt
+
 echo "Starte Flask..."
+START=$EPOCHREALTIME
 # Starte Flask im Hintergrund
-python3 -u main.py &
+if [ "$PROFILE" = true ]; then
+  echo "Startup-Profiling aktiv, Bericht: $STARTUP_REPORT"
+  PYTHONPROFILEIMPORTTIME=1 python3 -u main.py 2> >(tee "$IMPORTTIME_LOG" >&2) &
+  INTERVAL=0.05
+else
+  python3 -u main.py &
+  INTERVAL=1
+fi
 FLASK_PID=$!
 
 echo "Warte auf Flask-Start..."
-# Warte auf den Start von Flask (mit Timeout)
-for i in {1..30}; do
+# Warte auf den Start von Flask (mit Timeout von 30 s)
+while [ $SECONDS -lt 30 ]; do
   # Versuche auf beiden Ports (8099 und 5000)
   if curl -s http://127.0.0.1:8099/healthcheck > /dev/null || curl -s http://127.0.0.1:5000/healthcheck > /dev/null; then
     echo "Anwendung erfolgreich gestartet"
+    if [ "$PROFILE" = true ]; then
+      HEALTHCHECK_MS=$(awk "BEGIN { printf \"%d\", ($EPOCHREALTIME - $START) * 1000 }")
+      python3 /app/startup_profile.py "$IMPORTTIME_LOG" "$HEALTHCHECK_MS" "$STARTUP_REPORT" &
+    fi
     # Halte das Skript am Laufen
     wait $FLASK_PID
     exit 0
   fi
-  sleep 1
+  sleep $INTERVAL
 done
 
 echo "FEHLER: Flask ist nicht erreichbar! Logs:"
 ps aux
-exit 1
\ No newline at end of file
+exit 1
@@ -0,0 +1,111 @@
+"""
+Dauerhafter Cache für die Ergebnisse der Anleitungssuche.
+
+Schlüssel ist der normalisierte Suchbegriff aus _build_query() (klein
+geschrieben, Leerzeichen zusammengefasst). Gespeichert werden
+
+- Treffer:  {'url': PDF-URL, 'file': Dateiname, 'time': Zeitpunkt}
+- Fehlschläge: {'url': None, 'file': None, 'time': Zeitpunkt}
+
+in /data/devices/search_cache.json. Einträge gelten ttl Sekunden; danach wird
+wieder im Netz gesucht. Ein Fehlschlag wird nur gespeichert, wenn alle Quellen
+geantwortet und nichts gefunden haben – Timeouts und Verbindungsfehler landen
+nicht im Cache.
+
+main.py richtet den prozessweiten Cache per configure() ein; ohne Aufruf
+(oder mit ttl 0) ist der Cache abgeschaltet.
+"""
+
+import json
+import threading
+import time
+
+from json_cache import write_json_atomic
+
+
+def normalize_query(query):
+    return ' '.join((query or '').lower().split())
+
+
+class SearchCache:
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        self._entries = None        # erst beim ersten Zugriff laden
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    def get(self, query):
+        """Gültiger Eintrag für query oder None."""
+        if self.ttl <= 0:
+            return None
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._load().get(key)
+            if entry is None or time.time() - entry.get('time', 0) > self.ttl:
+                self.misses += 1
+                return None
+            if entry.get('url'):
+                self.hits += 1
+            else:
+                self.negative_hits += 1
+            return dict(entry)
+
+    def put_hit(self, query, url, filename):
+        self._put(query, {'url': url, 'file': filename, 'time': time.time()})
+
+    def put_miss(self, query):
+        self._put(query, {'url': None, 'file': None, 'time': time.time()})
+
+    def stats(self):
+        with self._lock:
+            entries = len(self._entries) if self._entries is not None else None
+        return {
+            'ttl':           self.ttl,
+            'entries':       entries,
+            'hits':          self.hits,
+            'negative_hits': self.negative_hits,
+            'misses':        self.misses,
+        }
+
+    def _put(self, query, entry):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            entries = self._load()
+            entries[normalize_query(query)] = entry
+            # Abgelaufene Einträge beim Schreiben gleich entfernen
+            now = time.time()
+            for key in [k for k, e in entries.items() if now - e.get('time', 0) > self.ttl]:
+                del entries[key]
+            try:
+                write_json_atomic(self.path, {'version': 1, 'entries': entries})
+            except OSError as e:
+                print("Such-Cache: {} nicht speicherbar: {}".format(self.path, e))
+
+    def _load(self):
+        if self._entries is None:
+            try:
+                with open(self.path, 'r') as f:
+                    self._entries = json.load(f).get('entries') or {}
+            except FileNotFoundError:
+                self._entries = {}
+            except (OSError, ValueError, AttributeError) as e:
+                print("Such-Cache: {} nicht lesbar ({}), beginne leer".format(self.path, e))
+                self._entries = {}
+        return self._entries
+
+
+# Prozessweiter Cache; main.py ersetzt ihn per configure()
+_cache = SearchCache(None, 0)
+
+
+def configure(cache):
+    global _cache
+    _cache = cache
+
+
+def get_cache():
+    return _cache
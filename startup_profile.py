@@ -0,0 +1,76 @@
+"""
+Auswertung des Startup-Profilings (Option startup_profile).
+
+run.sh startet main.py dann mit PYTHONPROFILEIMPORTTIME=1, schreibt stderr
+nach /data/startup_importtime.log und misst die Zeit bis zum ersten
+erfolgreichen /healthcheck. Dieses Skript fasst beides in einem Bericht
+zusammen:
+
+    python3 startup_profile.py LOG HEALTHCHECK_MS BERICHT
+"""
+
+import sys
+import time
+
+TOP_N = 20
+
+
+def parse_importtime(lines):
+    """Zeilen von -X importtime → Liste (modul, tiefe, self_us, kumuliert_us)."""
+    entries = []
+    for line in lines:
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3:
+            continue
+        try:
+            self_us = int(parts[0])
+            cumulative_us = int(parts[1])
+        except ValueError:
+            continue    # Kopfzeile
+        name = parts[2].rstrip('\n')
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        entries.append((name.strip(), depth, self_us, cumulative_us))
+    return entries
+
+
+def build_report(entries, healthcheck_ms):
+    total_ms = sum(e[2] for e in entries) / 1000
+    top_level = sorted((e for e in entries if e[1] == 0), key=lambda e: e[3], reverse=True)
+    by_self = sorted(entries, key=lambda e: e[2], reverse=True)
+
+    lines = [
+        "Startup-Profil vom {}".format(time.strftime('%Y-%m-%d %H:%M:%S')),
+        "",
+        "Zeit bis zum ersten /healthcheck: {:.0f} ms".format(healthcheck_ms),
+        "Importzeit gesamt:               {:.0f} ms ({} Module)".format(total_ms, len(entries)),
+        "Rest (Modulcode, Flask-Start):   {:.0f} ms".format(max(healthcheck_ms - total_ms, 0)),
+        "",
+        "Direkte Importe nach kumulierter Zeit:",
+    ]
+    for name, _depth, _self_us, cumulative_us in top_level[:TOP_N]:
+        lines.append("  {:>8.1f} ms  {}".format(cumulative_us / 1000, name))
+    lines += ["", "Teuerste Einzelmodule (ohne Unterimporte):"]
+    for name, _depth, self_us, _cumulative_us in by_self[:TOP_N]:
+        lines.append("  {:>8.1f} ms  {}".format(self_us / 1000, name))
+    return "\n".join(lines) + "\n"
+
+
+def main(argv):
+    if len(argv) != 4:
+        print(__doc__)
+        return 2
+    log_file, healthcheck_ms, report_file = argv[1], float(argv[2]), argv[3]
+    with open(log_file, 'r', errors='replace') as f:
+        entries = parse_importtime(f)
+    report = build_report(entries, healthcheck_ms)
+    with open(report_file, 'w') as f:
+        f.write(report)
+    print(report)
+    print("Startup-Bericht gespeichert: {}".format(report_file))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,627 @@
+"""
+Speicher-Backends für Geräte, Standorte und Anleitungs-Zuordnungen.
+
+  JsonStorage   – bisheriges Format (devices.json, locations.json,
+                  manual_mapping.json), Standard
+  SqliteStorage – optional (Option storage_backend: sqlite), WAL-Modus mit
+                  Indizes auf Standort, Anleitung und HA-ID; übernimmt beim
+                  ersten Start automatisch die vorhandenen JSON-Dateien
+
+Beide Backends bieten dieselbe Schnittstelle. Jedes Gerät hat eine stabile
+ID im Feld 'id' (HA-Geräte-ID bzw. eine generierte UUID), über die es
+angesprochen wird. Geräte ohne ID erhalten beim Laden automatisch eine.
+
+Mehrere Änderungen lassen sich mit `with store.batch():` zu einem einzigen
+Schreibvorgang zusammenfassen.
+"""
+
+import contextlib
+import copy
+import json
+import os
+import sqlite3
+import threading
+import uuid
+
+from json_cache import JsonFileCache, write_json_atomic
+
+# Geteilter Lese-Cache für alle JSON-Datendateien
+FILE_CACHE = JsonFileCache()
+
+
+def create_storage(backend, devices_file, locations_file, mapping_file, db_file):
+    """Erzeugt das konfigurierte Backend ('json' oder 'sqlite')."""
+    if backend == 'sqlite':
+        try:
+            return SqliteStorage(db_file, devices_file, locations_file, mapping_file)
+        except sqlite3.Error as e:
+            print("SQLite-Backend nicht verfügbar ({}), nutze JSON-Dateien".format(e))
+    return JsonStorage(devices_file, locations_file, mapping_file)
+
+
+def new_device_id():
+    return uuid.uuid4().hex
+
+
+def _index_by_id(devices):
+    """Baut den ID-Index auf; fehlende oder doppelte IDs werden neu vergeben."""
+    by_id = {}
+    assigned = 0
+    for d in devices:
+        if not d.get('id') or d['id'] in by_id:
+            d['id'] = new_device_id()
+            assigned += 1
+        by_id[d['id']] = d
+    return by_id, assigned
+
+
+def _location_key(name):
+    """Vergleichsschlüssel für Standortnamen – wie überall in der App per lower()."""
+    return (name or '').strip().lower()
+
+
+def _read_json(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+# ----------------------------------------------------------------------
+# JSON-Dateien
+# ----------------------------------------------------------------------
+
+class JsonStorage:
+    name = 'json'
+
+    def __init__(self, devices_file, locations_file, mapping_file):
+        self.devices_file = devices_file
+        self.locations_file = locations_file
+        self.mapping_file = mapping_file
+        self._lock = threading.RLock()
+        self._source = None      # zuletzt indizierter Snapshot von devices.json
+        self._by_id = None       # ID → Gerät, in Dateireihenfolge
+        self._by_location = {}   # Standort → {ID: Gerät}
+        self._by_manual = {}     # Anleitung → {ID: Gerät}
+        self._ha_ids = set()     # IDs der aus HA importierten Geräte
+        self._batch_depth = 0
+        self._dirty_devices = False
+        self._pending_locations = None
+
+    # Sammel-Schreibvorgänge --------------------------------------------
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Fasst alle Änderungen im Block zu je einem Schreibvorgang pro Datei zusammen."""
+        with self._lock:
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    self._write_pending()
+
+    def _write_pending(self):
+        if self._dirty_devices:
+            self._dirty_devices = False
+            self._flush()
+        if self._pending_locations is not None:
+            locations, self._pending_locations = self._pending_locations, None
+            self._write_locations(locations)
+
+    # Geräte-Indizes ----------------------------------------------------
+
+    def _devices(self):
+        """ID-Index der Geräte; wird neu aufgebaut, sobald sich devices.json geändert hat."""
+        with self._lock:
+            # Innerhalb eines Batches gilt der Stand im Speicher
+            if self._batch_depth and self._by_id is not None:
+                return self._by_id
+            data = FILE_CACHE.load(self.devices_file, [])
+            if data is not self._source:
+                by_id, assigned = _index_by_id(data)
+                self._source = data
+                self._rebuild(by_id)
+                if assigned:
+                    print("Geräte-IDs vergeben: {}".format(assigned))
+                    self._flush()
+            return self._by_id
+
+    def _rebuild(self, by_id):
+        self._by_id = by_id
+        self._by_location = {}
+        self._by_manual = {}
+        self._ha_ids = set()
+        for d in by_id.values():
+            self._index(d)
+
+    def _index(self, device):
+        """Gerät in die Sekundär-Indizes aufnehmen."""
+        self._by_location.setdefault(device.get('location') or '', {})[device['id']] = device
+        if device.get('manual'):
+            self._by_manual.setdefault(device['manual'], {})[device['id']] = device
+        if device.get('ha_imported'):
+            self._ha_ids.add(device['id'])
+
+    def _unindex(self, device):
+        """Gerät aus den Sekundär-Indizes entfernen (vor jeder Änderung aufrufen)."""
+        for index, key in ((self._by_location, device.get('location') or ''),
+                           (self._by_manual, device.get('manual'))):
+            bucket = index.get(key)
+            if bucket is not None:
+                bucket.pop(device['id'], None)
+                if not bucket:
+                    del index[key]
+        self._ha_ids.discard(device['id'])
+
+    def _set_fields(self, device, fields):
+        self._unindex(device)
+        device.update(fields)
+        self._index(device)
+
+    def _flush(self):
+        if self._batch_depth:
+            self._dirty_devices = True
+            return
+        devices = list(self._by_id.values())
+        write_json_atomic(self.devices_file, devices)
+        self._source = FILE_CACHE.put(self.devices_file, devices)
+
+    # Gesamtlisten ------------------------------------------------------
+
+    def load_devices(self):
+        return list(self._devices().values())
+
+    def save_devices(self, devices):
+        with self._lock:
+            self._rebuild(_index_by_id(devices)[0])
+            self._flush()
+
+    def load_locations(self):
+        try:
+            with self._lock:
+                locations = self._pending_locations
+                if locations is None:
+                    locations = FILE_CACHE.load(self.locations_file, [])
+                # Kopie, da Aufrufer die Einträge vor save_locations() verändern
+                return [dict(l) for l in locations]
+        except Exception as e:
+            print(f"Fehler beim Laden von {self.locations_file}: {e}")
+            return []
+
+    def save_locations(self, locations):
+        # Wie die UNIQUE-Spalte beim SQLite-Backend: pro Schlüssel gilt der erste Name
+        unique = {}
+        for l in locations:
+            unique.setdefault(_location_key(l['name']), l)
+        locations = list(unique.values())
+        with self._lock:
+            if self._batch_depth:
+                self._pending_locations = [dict(l) for l in locations]
+                return
+            self._write_locations(locations)
+
+    def _write_locations(self, locations):
+        os.makedirs(os.path.dirname(self.locations_file), exist_ok=True)
+        FILE_CACHE.invalidate(self.locations_file)
+        write_json_atomic(self.locations_file, locations)
+
+    def load_manual_mapping(self):
+        return copy.deepcopy(FILE_CACHE.load(self.mapping_file, {}))
+
+    def save_manual_mapping(self, mapping):
+        FILE_CACHE.invalidate(self.mapping_file)
+        write_json_atomic(self.mapping_file, mapping)
+
+    # Einzelne Geräte ---------------------------------------------------
+
+    def list_devices(self, location=None):
+        """Gibt die Geräte zurück, optional nach Standort gefiltert."""
+        devices = self._devices()
+        if location is None:
+            return list(devices.values())
+        return list(self._by_location.get(location, {}).values())
+
+    def get_device(self, device_id):
+        return self._devices().get(device_id)
+
+    def add_devices(self, new_devices):
+        with self._lock:
+            devices = self._devices()
+            for d in new_devices:
+                if not d.get('id') or d['id'] in devices:
+                    d['id'] = new_device_id()
+                devices[d['id']] = d
+                self._index(d)
+            self._flush()
+
+    def update_devices(self, changes):
+        """changes: {id: {feld: wert}}. Gibt die Anzahl geänderter Geräte zurück."""
+        with self._lock:
+            devices = self._devices()
+            updated = 0
+            for device_id, fields in changes.items():
+                device = devices.get(device_id)
+                if device is not None:
+                    self._set_fields(device, fields)
+                    updated += 1
+            if updated:
+                self._flush()
+            return updated
+
+    def delete_devices(self, device_ids):
+        with self._lock:
+            devices = self._devices()
+            deleted = 0
+            for device_id in set(device_ids):
+                device = devices.pop(device_id, None)
+                if device is not None:
+                    self._unindex(device)
+                    deleted += 1
+            if deleted:
+                self._flush()
+            return deleted
+
+    def delete_all_devices(self):
+        with self._lock:
+            count = len(self._devices())
+            self.save_devices([])
+            return count
+
+    def device_ids(self):
+        with self._lock:
+            return set(self._devices())
+
+    def has_ha_devices(self):
+        self._devices()
+        return bool(self._ha_ids)
+
+    # Abfragen über Standort / Anleitung -------------------------------
+    # Laufzeit abhängig von der Zahl der Standorte bzw. betroffenen Geräte,
+    # nicht vom Gesamtbestand.
+
+    def location_counts(self):
+        with self._lock:
+            self._devices()
+            counts = {}
+            for location, bucket in self._by_location.items():
+                name = location.strip()
+                if name:
+                    counts[name] = counts.get(name, 0) + len(bucket)
+            return counts
+
+    def location_in_use(self, name):
+        needle = _location_key(name)
+        with self._lock:
+            self._devices()
+            return any(_location_key(location) == needle for location in self._by_location)
+
+    def rename_location(self, old_name, new_name):
+        return self._set_field_where(self._by_location, old_name, 'location', new_name)
+
+    def clear_manual(self, filename):
+        return self._set_field_where(self._by_manual, filename, 'manual', None)
+
+    def _set_field_where(self, index, key, field, value):
+        with self._lock:
+            self._devices()
+            affected = list(index.get(key, {}).values())
+            for d in affected:
+                self._set_fields(d, {field: value})
+            if affected:
+                self._flush()
+            return len(affected)
+
+    def ensure_location(self, name, slug):
+        with self._lock:
+            locations = self.load_locations()
+            keys = {_location_key(l['name']) for l in locations}
+            if _location_key(name) not in keys:
+                locations.append({'name': name.strip(), 'slug': slug})
+                self.save_locations(locations)
+
+
+# ----------------------------------------------------------------------
+# SQLite
+# ----------------------------------------------------------------------
+
+SCHEMA_VERSION = 3
+
+_SCHEMA_V1 = """
+CREATE TABLE IF NOT EXISTS devices (
+    pk          INTEGER PRIMARY KEY AUTOINCREMENT,
+    ha_id       TEXT,
+    location    TEXT,
+    manual      TEXT,
+    ha_imported INTEGER NOT NULL DEFAULT 0,
+    data        TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_devices_location ON devices(location COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_devices_manual   ON devices(manual);
+CREATE INDEX IF NOT EXISTS idx_devices_ha_id    ON devices(ha_id);
+
+CREATE TABLE IF NOT EXISTS locations (
+    pos  INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE COLLATE NOCASE,
+    slug TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS manual_mapping (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# v2: stabile Geräte-IDs – ha_id wird zu device_id, fehlende oder doppelte
+# IDs werden vor dem Anlegen des UNIQUE-Index neu vergeben. Einzelne
+# Anweisungen statt executescript(), das vorher selbst COMMIT ausführt und die
+# Migration damit nicht mehr in einer Transaktion hielte.
+_SCHEMA_V2 = (
+    "ALTER TABLE devices RENAME COLUMN ha_id TO device_id",
+    "DROP INDEX IF EXISTS idx_devices_ha_id",
+)
+_SCHEMA_V2_INDEX = "CREATE UNIQUE INDEX IF NOT EXISTS idx_devices_device_id ON devices(device_id)"
+
+# v3: COLLATE NOCASE faltet nur ASCII ('Küche' ≠ 'KÜCHE'). Standorte werden
+# stattdessen über eine Schlüsselspalte mit _location_key() verglichen – wie
+# beim JSON-Backend. Die Standort-Tabelle wird dafür neu angelegt, weil sich
+# die UNIQUE-Bedingung auf name nicht entfernen lässt.
+_SCHEMA_V3 = (
+    "ALTER TABLE devices ADD COLUMN location_key TEXT",
+    "DROP INDEX IF EXISTS idx_devices_location",
+    "CREATE INDEX idx_devices_location     ON devices(location)",
+    "CREATE INDEX idx_devices_location_key ON devices(location_key)",
+    """CREATE TABLE locations_v3 (
+        pos  INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        slug TEXT NOT NULL,
+        key  TEXT NOT NULL UNIQUE
+    )""",
+)
+
+
+def _columns(device):
+    """Indizierte Spalten aus einem Geräte-Datensatz ableiten."""
+    return (
+        device.get('id'),
+        device.get('location'),
+        device.get('manual'),
+        1 if device.get('ha_imported') else 0,
+        json.dumps(device, ensure_ascii=False),
+        _location_key(device.get('location')),
+    )
+
+
+class SqliteStorage:
+    name = 'sqlite'
+
+    def __init__(self, db_file, devices_file, locations_file, mapping_file):
+        self.db_file = db_file
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(db_file), exist_ok=True)
+
+        conn = self._conn()
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < 1:
+            with conn:
+                conn.executescript(_SCHEMA_V1)
+                self._migrate_from_json(conn, devices_file, locations_file, mapping_file)
+                conn.execute("PRAGMA user_version = 1")
+        if version < 2:
+            # Umbenennen, IDs vergeben, Index und Versionsnummer: alles oder nichts
+            with conn:
+                conn.execute("BEGIN")
+                for statement in _SCHEMA_V2:
+                    conn.execute(statement)
+                self._assign_ids(conn)
+                conn.execute(_SCHEMA_V2_INDEX)
+                conn.execute("PRAGMA user_version = 2")
+        if version < 3:
+            with conn:
+                conn.execute("BEGIN")
+                for statement in _SCHEMA_V3:
+                    conn.execute(statement)
+                self._fill_location_keys(conn)
+                conn.execute("PRAGMA user_version = 3")
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Jede Operation ist bereits eine eigene Transaktion; nichts zu sammeln."""
+        yield self
+
+    def _conn(self):
+        """Eine Verbindung pro Thread (sqlite3-Objekte sind nicht threadsicher)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _migrate_from_json(self, conn, devices_file, locations_file, mapping_file):
+        try:
+            devices = _read_json(devices_file, [])
+            locations = _read_json(locations_file, [])
+            mapping = _read_json(mapping_file, {})
+        except Exception as e:
+            print("SQLite-Migration: JSON-Dateien nicht lesbar: {}".format(e))
+            return
+
+        # Schema v1: noch ohne location_key, die Spalte füllt die v3-Migration
+        conn.executemany(
+            "INSERT INTO devices (ha_id, location, manual, ha_imported, data) VALUES (?, ?, ?, ?, ?)",
+            [_columns(d)[:5] for d in devices])
+        conn.executemany(
+            "INSERT OR IGNORE INTO locations (name, slug) VALUES (?, ?)",
+            [(l['name'], l.get('slug') or '') for l in locations if l.get('name')])
+        conn.executemany(
+            "INSERT OR REPLACE INTO manual_mapping (key, value) VALUES (?, ?)",
+            [(k, json.dumps(v)) for k, v in mapping.items()])
+        print("SQLite-Migration: {} Geräte, {} Standorte, {} Zuordnungen übernommen".format(
+            len(devices), len(locations), len(mapping)))
+
+    def _assign_ids(self, conn):
+        """Fehlende und doppelte IDs neu vergeben – wie _index_by_id() beim JSON-Backend."""
+        rows = conn.execute("SELECT pk, device_id, data FROM devices ORDER BY pk").fetchall()
+        devices = [json.loads(data) for _, _, data in rows]
+        _, assigned = _index_by_id(devices)
+        for (pk, old_id, _), device in zip(rows, devices):
+            if device['id'] != old_id:
+                conn.execute("UPDATE devices SET device_id = ?, data = ? WHERE pk = ?",
+                             (device['id'], json.dumps(device, ensure_ascii=False), pk))
+        if assigned:
+            print("SQLite-Migration: {} Geräte-IDs vergeben".format(assigned))
+
+    def _fill_location_keys(self, conn):
+        conn.executemany("UPDATE devices SET location_key = ? WHERE pk = ?",
+                         [(_location_key(location), pk) for pk, location in
+                          conn.execute("SELECT pk, location FROM devices").fetchall()])
+        # Bei Namen, die sich nur in Groß-/Kleinschreibung unterscheiden, bleibt der erste
+        conn.executemany("INSERT OR IGNORE INTO locations_v3 (pos, name, slug, key) VALUES (?, ?, ?, ?)",
+                         [(pos, name, slug, _location_key(name)) for pos, name, slug in
+                          conn.execute("SELECT pos, name, slug FROM locations ORDER BY pos").fetchall()])
+        conn.execute("DROP TABLE locations")
+        conn.execute("ALTER TABLE locations_v3 RENAME TO locations")
+
+    def _rows(self, sql, params=()):
+        return [json.loads(data) for (data,) in self._conn().execute(sql, params)]
+
+    # Gesamtlisten ------------------------------------------------------
+
+    def load_devices(self):
+        return self._rows("SELECT data FROM devices ORDER BY pk")
+
+    def save_devices(self, devices):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM devices")
+            self._insert(conn, devices)
+
+    def _insert(self, conn, devices):
+        # Vorhandene IDs nicht überschreiben, sondern – wie beim JSON-Backend – neu vergeben
+        seen = set()
+        for d in devices:
+            if (not d.get('id') or d['id'] in seen or
+                    conn.execute("SELECT 1 FROM devices WHERE device_id = ?", (d['id'],)).fetchone()):
+                d['id'] = new_device_id()
+            seen.add(d['id'])
+        conn.executemany(
+            "INSERT INTO devices (device_id, location, manual, ha_imported, data, location_key) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [_columns(d) for d in devices])
+
+    def load_locations(self):
+        return [{'name': name, 'slug': slug} for name, slug in
+                self._conn().execute("SELECT name, slug FROM locations ORDER BY pos")]
+
+    def save_locations(self, locations):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM locations")
+            conn.executemany(
+                "INSERT OR IGNORE INTO locations (name, slug, key) VALUES (?, ?, ?)",
+                [(l['name'], l.get('slug') or '', _location_key(l['name'])) for l in locations])
+
+    def load_manual_mapping(self):
+        return {k: json.loads(v) for k, v in self._conn().execute("SELECT key, value FROM manual_mapping")}
+
+    def save_manual_mapping(self, mapping):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM manual_mapping")
+            conn.executemany("INSERT INTO manual_mapping (key, value) VALUES (?, ?)",
+                             [(k, json.dumps(v)) for k, v in mapping.items()])
+
+    # Einzelne Geräte ---------------------------------------------------
+
+    def list_devices(self, location=None):
+        if location is None:
+            return self._rows("SELECT data FROM devices ORDER BY pk")
+        return self._rows("SELECT data FROM devices WHERE location = ? ORDER BY pk", (location,))
+
+    def get_device(self, device_id):
+        row = self._conn().execute("SELECT data FROM devices WHERE device_id = ?", (device_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def add_devices(self, new_devices):
+        conn = self._conn()
+        with conn:
+            self._insert(conn, new_devices)
+
+    def update_devices(self, changes):
+        conn = self._conn()
+        updated = 0
+        with conn:
+            for device_id, fields in changes.items():
+                row = conn.execute("SELECT pk, data FROM devices WHERE device_id = ?", (device_id,)).fetchone()
+                if not row:
+                    continue
+                device = json.loads(row[1])
+                device.update(fields)
+                self._write(conn, row[0], device)
+                updated += 1
+        return updated
+
+    def _write(self, conn, pk, device):
+        conn.execute(
+            "UPDATE devices SET device_id = ?, location = ?, manual = ?, ha_imported = ?, data = ?, location_key = ? "
+            "WHERE pk = ?",
+            _columns(device) + (pk,))
+
+    def delete_devices(self, device_ids):
+        conn = self._conn()
+        with conn:
+            cur = conn.executemany("DELETE FROM devices WHERE device_id = ?", [(i,) for i in set(device_ids)])
+        return cur.rowcount
+
+    def delete_all_devices(self):
+        conn = self._conn()
+        with conn:
+            cur = conn.execute("DELETE FROM devices")
+        return cur.rowcount
+
+    def device_ids(self):
+        return {row[0] for row in self._conn().execute("SELECT device_id FROM devices")}
+
+    def has_ha_devices(self):
+        return self._conn().execute("SELECT 1 FROM devices WHERE ha_imported = 1 LIMIT 1").fetchone() is not None
+
+    # Abfragen über Standort / Anleitung -------------------------------
+
+    def location_counts(self):
+        counts = {}
+        for location, count in self._conn().execute(
+                "SELECT location, COUNT(*) FROM devices WHERE location IS NOT NULL GROUP BY location"):
+            name = location.strip()
+            if name:
+                counts[name] = counts.get(name, 0) + count
+        return counts
+
+    def location_in_use(self, name):
+        row = self._conn().execute(
+            "SELECT 1 FROM devices WHERE location_key = ? LIMIT 1", (_location_key(name),)).fetchone()
+        return row is not None
+
+    def rename_location(self, old_name, new_name):
+        return self._set_field_where('location', new_name, "location = ?", (old_name,))
+
+    def clear_manual(self, filename):
+        return self._set_field_where('manual', None, "manual = ?", (filename,))
+
+    def _set_field_where(self, field, new, where, params):
+        conn = self._conn()
+        with conn:
+            rows = conn.execute("SELECT pk, data FROM devices WHERE " + where, params).fetchall()
+            for pk, data in rows:
+                device = json.loads(data)
+                device[field] = new
+                self._write(conn, pk, device)
+        return len(rows)
+
+    def ensure_location(self, name, slug):
+        conn = self._conn()
+        with conn:
+            conn.execute("INSERT OR IGNORE INTO locations (name, slug, key) VALUES (?, ?, ?)",
+                         (name.strip(), slug, _location_key(name)))